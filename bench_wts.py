@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""Benchmarks for wts hot paths.
+
+Each benchmark runs against a private tmux server (TMUX_TMPDIR points at a
+temp dir) and reports tmux process spawns and wall-clock time per iteration.
+
+    python3 bench_wts.py [name ...] [--iterations N]
+"""
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+from contextlib import contextmanager, redirect_stdout
+from pathlib import Path
+from unittest.mock import patch
+
+from lib.utils import run_command
+from lib.wts import SessionIndex, SessionLayout, TmuxClient, WtsManager
+
+
+@contextmanager
+def private_tmux():
+    """Points tmux at a throwaway server for the duration of the block."""
+    tmpdir = tempfile.mkdtemp(prefix='wts-bench-')
+    saved = {k: os.environ.get(k) for k in ('TMUX_TMPDIR', 'TMUX', 'WTS_AGENT_CMD')}
+    os.environ['TMUX_TMPDIR'] = tmpdir
+    os.environ.pop('TMUX', None)
+    os.environ['WTS_AGENT_CMD'] = 'true'
+    subprocess.run(['tmux', '-f', '/dev/null', 'new-session', '-d', '-s', 'keepalive', ';',
+                    'set-option', '-g', 'default-command', '/bin/sh'], check=True)
+    try:
+        yield tmpdir
+    finally:
+        subprocess.run(['tmux', 'kill-server'], stderr=subprocess.DEVNULL)
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+@contextmanager
+def count_spawns():
+    """Counts spawned processes by argv[0] (subprocess.run goes through Popen)."""
+    counts = {}
+    real_popen = subprocess.Popen
+
+    def tally(argv):
+        name = os.path.basename(argv[0]) if isinstance(argv, (list, tuple)) else str(argv).split()[0]
+        counts[name] = counts.get(name, 0) + 1
+
+    class Popen(real_popen):
+        def __init__(self, argv, *a, **kw):
+            tally(argv)
+            super().__init__(argv, *a, **kw)
+
+    with patch.object(subprocess, 'Popen', Popen):
+        yield counts
+
+
+def report(label, counts, seconds, iterations):
+    per_iter = {k: v / iterations for k, v in sorted(counts.items())}
+    spawns = ', '.join(f'{k}={v:g}' for k, v in per_iter.items()) or 'none'
+    print(f'  {label:<12} {seconds / iterations * 1000:8.2f} ms/iter   spawns/iter: {spawns}')
+
+
+def measure(label, fn, iterations, cleanup=None):
+    """Times fn(i) per iteration; cleanup(i) runs untimed and uncounted."""
+    counts, elapsed = {}, 0.0
+    for i in range(iterations):
+        with count_spawns() as c, redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn(i)
+            elapsed += time.perf_counter() - start
+        for k, v in c.items():
+            counts[k] = counts.get(k, 0) + v
+        if cleanup:
+            cleanup(i)
+    report(label, counts, elapsed, iterations)
+
+
+# ----------------------------------------------------------------------
+# tmux layout: one process per command vs one chained invocation
+# ----------------------------------------------------------------------
+
+def _legacy_layout(manager):
+    """The pre-batching _ensure_tmux_session body: one tmux client per command."""
+    for command in manager._layout_commands():
+        run_command(['tmux'] + command)
+
+
+def bench_tmux_layout(iterations):
+    print('tmux layout (new session with Agent + Editor panes)')
+
+    def run(label, layout):
+        with private_tmux() as tmpdir:
+            manager = WtsManager.__new__(WtsManager)
+            manager.target_dir = tmpdir
+            manager.repo_root = None
+
+            def create(i):
+                manager.session_name = f'bench-{i}'
+                with TmuxClient() as manager.tmux:
+                    layout(manager)
+
+            def kill(i):
+                subprocess.run(['tmux', 'kill-session', '-t', f'bench-{i}'])
+
+            measure(label, create, iterations, cleanup=kill)
+
+    run('per-command', _legacy_layout)
+    run('batched', lambda manager: manager._ensure_tmux_session())
+
+
+# ----------------------------------------------------------------------
+# declarative layouts: a busy layout file, per command vs one source-file
+# ----------------------------------------------------------------------
+
+LAYOUT_FILE = '''
+[[layout.windows]]
+name = "Code"
+panes = [
+  { title = "Agent", agent = true },
+  { title = "Editor", command = "true", split = "h", size = "60%" },
+  { title = "Tests", command = "true", split = "v", size = 10 },
+]
+
+[[layout.windows]]
+name = "Server"
+panes = [
+  { title = "Server", command = "true" },
+  { title = "Logs", command = "true", split = "v" },
+]
+'''
+
+
+def bench_layout_file(iterations):
+    print('layout file (2 windows, 5 panes)')
+    with private_tmux() as tmpdir:
+        saved_home = os.environ.get('HOME')
+        os.environ['HOME'] = tmpdir
+        try:
+            with open(os.path.join(tmpdir, '.wts.toml'), 'w') as f:
+                f.write(LAYOUT_FILE)
+            layout = SessionLayout(tomllib.loads(LAYOUT_FILE)['layout'])
+            manager = WtsManager.__new__(WtsManager)
+            manager.target_dir = tmpdir
+
+            def run(label, create):
+                def build(i):
+                    manager.session_name = f'{label}-{i}'
+                    with TmuxClient() as manager.tmux:
+                        create()
+
+                def kill(i):
+                    subprocess.run(['tmux', 'kill-session', '-t', f'{label}-{i}'])
+
+                measure(label, build, iterations, cleanup=kill)
+
+            def per_command():
+                for command in layout.commands(manager.session_name, tmpdir, 'true'):
+                    run_command(['tmux'] + command)
+
+            run('per-command', per_command)
+            run('batched', lambda: manager.tmux.batch(layout.commands(manager.session_name, tmpdir, 'true')))
+            run('source-file', lambda: manager._source_layout(SessionLayout.compiled(tmpdir, 'true')))
+        finally:
+            os.environ['HOME'] = saved_home
+
+
+# ----------------------------------------------------------------------
+# worktree creation: full checkout vs a one-directory sparse profile
+# ----------------------------------------------------------------------
+
+SPARSE_DIRS = 100
+SPARSE_FILES_PER_DIR = 1000
+
+
+def _synthetic_repo(path, dirs, files_per_dir):
+    """A repo with dirs x files_per_dir small files, written with fast-import."""
+    subprocess.run(['git', 'init', '-q', '-b', 'main', path], check=True)
+    lines = []
+    for d in range(dirs):
+        for f in range(files_per_dir):
+            data = f'{d}/{f}\n'
+            lines.append(f'blob\nmark :{d * files_per_dir + f + 1}\ndata {len(data)}\n{data}')
+    lines.append('commit refs/heads/main\ncommitter bench <bench@example.com> 0 +0000\ndata 4\ninit\n')
+    for d in range(dirs):
+        for f in range(files_per_dir):
+            lines.append(f'M 100644 :{d * files_per_dir + f + 1} pkg{d:03}/file{f:04}.txt\n')
+    subprocess.run(['git', '-C', path, 'fast-import', '--quiet'], input=''.join(lines).encode(), check=True)
+
+
+def _disk_use(path):
+    """(files, bytes on disk) under path, not counting the .git link."""
+    files, size = 0, 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            if name != '.git':
+                files += 1
+                size += os.lstat(os.path.join(root, name)).st_blocks * 512
+    return files, size
+
+
+def bench_sparse_worktree(iterations):
+    total = SPARSE_DIRS * SPARSE_FILES_PER_DIR
+    print(f'worktree creation ({total} files in {SPARSE_DIRS} top-level dirs)')
+    iterations = min(iterations, 3)
+    tmpdir = tempfile.mkdtemp(prefix='wts-bench-')
+    repo = os.path.join(tmpdir, 'repo')
+    disk = {}
+    try:
+        _synthetic_repo(repo, SPARSE_DIRS, SPARSE_FILES_PER_DIR)
+
+        def run(label):
+            paths = [os.path.join(tmpdir, f'{label}-{i}') for i in range(iterations)]
+
+            def create(i):
+                WtsManager._add_worktree(repo, paths[i], ['--detach', 'main'], quiet=True)
+
+            def remove(i):
+                shutil.rmtree(paths[i])
+                subprocess.run(['git', '-C', repo, 'worktree', 'prune'], check=True)
+
+            def cleanup(i):
+                if i == iterations - 1:
+                    disk[label] = _disk_use(paths[i])
+                remove(i)
+
+            measure(label, create, iterations, cleanup=cleanup)
+            files, size = disk[label]
+            print(f'  {"":<12} {files} files, {size / 2**20:.1f} MiB on disk')
+
+        run('full')
+        subprocess.run(['git', '-C', repo, 'config', 'wts.sparse', 'pkg000'], check=True)
+        run('sparse')
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# ----------------------------------------------------------------------
+# session listing: the index vs asking git in every repo
+# ----------------------------------------------------------------------
+
+LIST_REPOS = 20
+LIST_WORKTREES_PER_REPO = 25
+
+
+def bench_list_sessions(iterations):
+    total = LIST_REPOS * LIST_WORKTREES_PER_REPO
+    print(f'session listing ({total} sessions across {LIST_REPOS} repos)')
+    with private_tmux() as tmpdir:
+        saved_home = os.environ.get('HOME')
+        os.environ['HOME'] = tmpdir
+        try:
+            index = SessionIndex()
+            repos = []
+            for r in range(LIST_REPOS):
+                repo = os.path.join(tmpdir, f'repo{r:02}')
+                subprocess.run(['git', 'init', '-q', repo], check=True)
+                subprocess.run(['git', '-C', repo, '-c', 'user.name=bench', '-c', 'user.email=bench@example.com',
+                                'commit', '-q', '--allow-empty', '-m', 'init'], check=True)
+                repos.append(repo)
+                for w in range(LIST_WORKTREES_PER_REPO):
+                    worktree = os.path.join(tmpdir, 'worktrees', f'repo{r:02}', f'wt{w:02}')
+                    subprocess.run(['git', '-C', repo, 'worktree', 'add', '-q', '-b', f'wt{w:02}', worktree],
+                                   check=True)
+                    index.record(f'repo{r:02}-wt{w:02}', worktree, [(repo, worktree)])
+            index.reconcile()
+
+            def per_repo(i):
+                subprocess.run(['tmux', 'list-sessions'], capture_output=True)
+                for repo in repos:
+                    subprocess.run(['git', '-C', repo, 'worktree', 'list', '--porcelain'],
+                                   capture_output=True, check=True)
+
+            measure('per-repo', per_repo, iterations)
+            measure('index', lambda i: WtsManager.list_sessions(), iterations)
+        finally:
+            os.environ['HOME'] = saved_home
+
+
+# ----------------------------------------------------------------------
+# shared object store: N clones with their own objects vs borrowing from one
+# ----------------------------------------------------------------------
+
+STORE_CLONES = 5
+
+
+def bench_shared_store(iterations):
+    print(f'object storage ({STORE_CLONES} clones of one project)')
+    tmpdir = tempfile.mkdtemp(prefix='wts-bench-')
+    saved_home = os.environ.get('HOME')
+    os.environ['HOME'] = tmpdir
+    try:
+        origin = os.path.join(tmpdir, 'origin')
+        _synthetic_repo(origin, 20, 500)
+        clones = [os.path.join(tmpdir, f'clone{i}') for i in range(STORE_CLONES)]
+        for clone in clones:
+            subprocess.run(['git', 'clone', '-q', '--no-local', '--no-checkout', origin, clone], check=True)
+
+        def objects():
+            return sum(_disk_use(os.path.join(c, '.git', 'objects'))[1] for c in clones) + \
+                _disk_use(os.path.join(tmpdir, 'worktrees', '.objects'))[1]
+
+        separate = objects()
+        measure('share', lambda i: WtsManager.share_objects(clones), 1)
+        print(f'  {"":<12} objects on disk: {separate / 2**20:.1f} MiB separate, '
+              f'{objects() / 2**20:.1f} MiB shared')
+    finally:
+        os.environ['HOME'] = saved_home
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# ----------------------------------------------------------------------
+# time to first build: a cold build vs one seeded from a sibling's cache
+# ----------------------------------------------------------------------
+
+BUILD_SOURCES = 200
+BUILD_SCRIPT = '''import hashlib, os, sys
+os.makedirs('.cache/build', exist_ok=True)
+for name in sorted(os.listdir('src')):
+    data = open(os.path.join('src', name), 'rb').read()
+    out = os.path.join('.cache/build', hashlib.sha256(data).hexdigest())
+    if os.path.exists(out):
+        continue
+    digest = data
+    for _ in range(20000):  # the "compile"
+        digest = hashlib.sha256(digest).digest()
+    with open(out, 'wb') as f:
+        f.write(digest)
+'''
+
+
+@contextmanager
+def quiet_children():
+    """Sends fds 1 and 2, and so the chatter of subprocesses, to /dev/null."""
+    sys.stdout.flush()
+    saved = [os.dup(1), os.dup(2)]
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+    try:
+        yield
+    finally:
+        os.dup2(saved[0], 1)
+        os.dup2(saved[1], 2)
+        for fd in saved + [devnull]:
+            os.close(fd)
+
+
+def bench_first_build(iterations):
+    print(f'time to first build (new worktree + incremental build of {BUILD_SOURCES} files)')
+    iterations = min(iterations, 5)
+    tmpdir = tempfile.mkdtemp(prefix='wts-bench-')
+    saved_home = os.environ.get('HOME')
+    os.environ['HOME'] = tmpdir
+    try:
+        repo = os.path.join(tmpdir, 'project')
+        os.makedirs(os.path.join(repo, 'src'))
+        with open(os.path.join(repo, 'build.py'), 'w') as f:
+            f.write(BUILD_SCRIPT)
+        with open(os.path.join(repo, '.gitignore'), 'w') as f:
+            f.write('.cache/\n')
+        for i in range(BUILD_SOURCES):
+            with open(os.path.join(repo, 'src', f'mod{i:03}.c'), 'w') as f:
+                f.write(f'int mod{i}(void) {{ return {i}; }}\n')
+        subprocess.run(['git', 'init', '-q', '-b', 'main', repo], check=True)
+        subprocess.run(['git', '-C', repo, 'add', '.'], check=True)
+        subprocess.run(['git', '-C', repo, '-c', 'user.name=bench', '-c', 'user.email=bench@example.com',
+                        'commit', '-q', '-m', 'init'], check=True)
+        base = Path(tmpdir) / 'worktrees' / 'project'
+        with redirect_stdout(io.StringIO()), quiet_children():
+            WtsManager._create_worktree(repo, base / 'warm', 'warm', 'warm')
+        subprocess.run([sys.executable, 'build.py'], cwd=base / 'warm', check=True)
+
+        def run(label):
+            paths = [base / f'{label}-{i}' for i in range(iterations)]
+
+            def first_build(i):
+                with quiet_children():
+                    WtsManager._create_worktree(repo, paths[i], f'{label}-{i}', f'{label}-{i}')
+                    subprocess.run([sys.executable, 'build.py'], cwd=paths[i], check=True)
+
+            def remove(i):
+                subprocess.run(['git', '-C', repo, 'worktree', 'remove', '--force', str(paths[i])], check=True)
+
+            measure(label, first_build, iterations, cleanup=remove)
+
+        run('cold')
+        subprocess.run(['git', '-C', repo, 'config', 'wts.seed', '.cache/build'], check=True)
+        run('seeded')
+    finally:
+        os.environ['HOME'] = saved_home
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+# ----------------------------------------------------------------------
+# whole invocations: a fresh process per call vs the daemon serving it
+# ----------------------------------------------------------------------
+
+WTS_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'wts')
+
+
+def bench_daemon(iterations):
+    print('wts --list, end to end (python start-up included)')
+    with private_tmux() as tmpdir:
+        saved_home = os.environ.get('HOME')
+        os.environ['HOME'] = tmpdir
+        env = dict(os.environ, WTS_NO_DAEMON='1')
+        env.pop('XDG_CACHE_HOME', None)
+        try:
+            def wts(i, env=env):
+                subprocess.run([sys.executable, WTS_SCRIPT, '--list'], env=env, check=True,
+                               stdout=subprocess.DEVNULL)
+
+            measure('in-process', wts, iterations)
+            env = dict(env)
+            del env['WTS_NO_DAEMON']
+            sock = os.path.join(tmpdir, '.cache', 'wts', 'daemon.sock')
+            daemon = subprocess.Popen([sys.executable, WTS_SCRIPT, '--daemon'], env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                while not os.path.exists(sock):
+                    time.sleep(0.05)
+                measure('daemon', lambda i: wts(i, env), iterations)
+            finally:
+                daemon.terminate()
+                daemon.wait()
+        finally:
+            os.environ['HOME'] = saved_home
+
+
+BENCHMARKS = {
+    'tmux': bench_tmux_layout,
+    'layout': bench_layout_file,
+    'sparse': bench_sparse_worktree,
+    'list': bench_list_sessions,
+    'store': bench_shared_store,
+    'build': bench_first_build,
+    'daemon': bench_daemon,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark wts hot paths.')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument('--iterations', '-i', type=int, default=20)
+    args = parser.parse_args()
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+    if shutil.which('tmux') is None:
+        print('tmux not found', file=sys.stderr)
+        sys.exit(1)
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name](args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import functools
+import os
+
 from lib.utils import run_command
 
 
@@ -5,10 +8,33 @@ class ChainError(Exception):
     pass
 
 
-def _git(args, check=True, capture=True):
-    res = run_command(['git'] + args, check=False, capture_output=capture)
+# Read-only git calls are memoized for the rest of the command; any other
+# call (reset, branch -f, rebase, config writes, ...) may change what they
+# would print, so it clears the memo.
+_READS = {'for-each-ref', 'log', 'merge-base', 'rev-list', 'rev-parse', 'show-ref', 'status'}
+_memo = {}
+# chain.* settings of this worktree as read at the start of the command, with
+# the command's own writes applied; the writes reach git in _flush_config.
+_config = None
+_pending = {}
+_worktree_config_on = False
+
+
+def _is_read(args):
+    return args[0] in _READS or (args[0] == 'config' and ('--get' in args or '--list' in args))
+
+
+def _git(args, check=True, capture=True, env=None):
+    read = capture and _is_read(args)
+    res = _memo.get(tuple(args)) if read else None
     if res is None:
-        raise ChainError('git not found')
+        if not read:
+            _memo.clear()
+        res = run_command(['git'] + args, check=False, capture_output=capture, env=env)
+        if res is None:
+            raise ChainError('git not found')
+        if read:
+            _memo[tuple(args)] = res
     if check and res.returncode != 0:
         msg = res.stderr.strip() if capture and res.stderr else f"git {' '.join(args)} failed"
         raise ChainError(msg)
@@ -19,15 +45,75 @@ def _out(args):
     return _git(args).stdout.strip()
 
 
-def _trunk():
-    res = _git(['symbolic-ref', 'refs/remotes/origin/HEAD'], check=False)
-    if res.returncode != 0 or not res.stdout.strip():
-        raise ChainError('no origin HEAD found (set one with: git remote set-head origin -a)')
-    return res.stdout.strip().replace('refs/remotes/', '')
+def _command(fn):
+    """A git chain subcommand: what it learns from git is kept only for this
+    run, and the config it sets is written once, when it ends."""
+    @functools.wraps(fn)
+    def run(*args):
+        global _config
+        _memo.clear()
+        _pending.clear()
+        _config = None
+        try:
+            return fn(*args)
+        finally:
+            _flush_config()
+    return run
+
+
+def _worktree_config():
+    """This worktree's chain.* settings, read with one git config call per command.
+
+    Without extensions.worktreeConfig, 'git config --worktree' means the
+    repository's own config, so that is where the settings are read from.
+    """
+    global _config, _worktree_config_on
+    if _config is None:
+        res = _git(['config', '--list', '--show-scope'], check=False)
+        scopes = {}
+        for line in res.stdout.splitlines() if res.returncode == 0 else []:
+            scope, _, entry = line.partition('\t')
+            key, _, value = entry.partition('=')
+            scopes.setdefault(scope, {})[key] = value.strip()
+        local = scopes.get('local', {})
+        _worktree_config_on = _is_true(local.get('extensions.worktreeconfig', ''))
+        own = scopes.get('worktree', {}) if _worktree_config_on else local
+        _config = {key: value for key, value in own.items() if key.startswith('chain.')}
+    return _config
+
+
+def _is_true(value):
+    return value.lower() in ('true', 'yes', 'on', '1')
+
+
+def _set_config(key, value):
+    config = _worktree_config()
+    if config.get(key) != value:
+        config[key] = value
+        _pending[key] = value
+
+
+def _flush_config():
+    """Writes the settings changed by this command (git config sets one key per call)."""
+    global _worktree_config_on
+    if not _pending:
+        return
+    if not _worktree_config_on:
+        _git(['config', 'extensions.worktreeConfig', 'true'], check=False)
+        _worktree_config_on = True
+    while _pending:
+        key, value = _pending.popitem()
+        _git(['config', '--worktree', key, value])
+
+
+def _head():
+    """(git dir of this worktree, abbreviated HEAD), from one rev-parse."""
+    git_dir, head = _out(['rev-parse', '--absolute-git-dir', '--abbrev-ref', 'HEAD']).splitlines()
+    return git_dir, head
 
 
 def _current_branch():
-    branch = _out(['rev-parse', '--abbrev-ref', 'HEAD'])
+    branch = _head()[1]
     if branch == 'HEAD':
         raise ChainError('detached HEAD')
     if branch.endswith('-chain'):
@@ -40,21 +126,180 @@ def _require_clean():
         raise ChainError('working tree has uncommitted changes; commit or discard them first')
 
 
-def _count(rev_range):
-    return int(_out(['rev-list', '--count', rev_range]))
+# Frame index: the chain's frames, kept in the worktree's git dir so that
+# grow and shrink find frame n without walking the history. It is keyed by
+# the chain tip and trunk and rebuilt when either moves.
+_FRAME_INDEX = 'chain-frames'
 
 
-def _ref_exists(ref):
-    return _git(['show-ref', '--verify', '--quiet', f'refs/heads/{ref}'], check=False).returncode == 0
+def _read_frame_index(path):
+    """(tip, trunk SHA, frames) from the index file, or None."""
+    try:
+        with open(path) as f:
+            lines = f.read().split()
+    except OSError:
+        return None
+    if len(lines) < 2:
+        return None
+    return lines[0], lines[1], lines[2:]
 
 
-def _is_ancestor(a, b):
-    return _git(['merge-base', '--is-ancestor', a, b], check=False).returncode == 0
+def _write_frame_index(path, tip, trunk, frames):
+    tmp = f'{path}.{os.getpid()}'
+    try:
+        with open(tmp, 'w') as f:
+            f.write(f'{tip} {trunk}\n' + ''.join(f'{sha}\n' for sha in frames))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+class ChainGraph:
+    """The commits above trunk on the working branch, the chain and origin/<branch>.
+
+    Loaded with one for-each-ref (trunk from origin/HEAD, which branches
+    exist, and their SHAs) and, on first use, one git log over all tips, so
+    counts, ancestry and frame lookups are answered from memory instead of a
+    git process each. Chains are linear: a tip's frames are its first-parent
+    line down to trunk. The frames of the indexed branch (the chain) come
+    from the frame index while its tip and trunk have not moved.
+    """
+
+    def __init__(self, trunk, shas, index=None):
+        self.trunk = trunk
+        self.shas = shas        # branch name -> SHA, for the branches that exist
+        self.index = index      # (index file, branch it indexes), or None
+        self._commits = None
+        self._indexed = None
+
+    @property
+    def commits(self):
+        """SHA -> (parent SHAs, oneline), for trunk..tips."""
+        if self._commits is None:
+            self._commits = {}
+            tips = sorted({sha for name, sha in self.shas.items() if name != self.trunk})
+            if tips:
+                out = _out(['log', '--format=%H %P%x09%h %s'] + tips + [f'^{self.shas[self.trunk]}', '--'])
+                for line in out.splitlines():
+                    ids, _, oneline = line.partition('\t')
+                    sha, *parents = ids.split()
+                    self._commits[sha] = (parents, oneline)
+        return self._commits
+
+    @classmethod
+    def load(cls, branches, index=None):
+        refs = {}
+        for name in branches:
+            refs[name] = f'refs/remotes/{name}' if name.startswith('origin/') else f'refs/heads/{name}'
+        out = _out(['for-each-ref', '--format=%(objectname) %(refname) %(symref)',
+                    'refs/remotes/origin/HEAD'] + sorted(set(refs.values())))
+        by_ref, trunk = {}, None
+        for line in out.splitlines():
+            sha, ref, *symref = line.split()
+            if ref == 'refs/remotes/origin/HEAD' and symref:
+                trunk = symref[0].replace('refs/remotes/', '')
+            by_ref.setdefault(ref, sha)
+        if trunk is None:
+            raise ChainError('no origin HEAD found (set one with: git remote set-head origin -a)')
+        shas = {name: by_ref[ref] for name, ref in refs.items() if ref in by_ref}
+        shas[trunk] = by_ref['refs/remotes/origin/HEAD']
+        return cls(trunk, shas, index)
+
+    def exists(self, name):
+        return name in self.shas
+
+    def sha(self, name):
+        return self.shas[name]
+
+    def set_branch(self, name, sha):
+        """Records a branch moved with 'git branch -f' (its commits are already loaded)."""
+        self.shas[name] = sha
+
+    def _reachable(self, name):
+        seen, todo = set(), [self.shas[name]]
+        while todo:
+            sha = todo.pop()
+            if sha in self.commits and sha not in seen:
+                seen.add(sha)
+                todo.extend(self.commits[sha][0])
+        return seen
+
+    def count(self, tip, base=None):
+        """rev-list --count base..tip, with base defaulting to trunk."""
+        commits = self._reachable(tip)
+        if base is not None:
+            commits -= self._reachable(base)
+        return len(commits)
+
+    def is_ancestor(self, a, b):
+        """merge-base --is-ancestor a b."""
+        sha, tip = self.shas[a], self.shas[b]
+        if sha == tip or sha in self.commits:
+            return sha == tip or sha in self._reachable(b)
+        # a is at or below trunk: b reaches it where b's line leaves the graph
+        # (the usual case, a branch sitting on trunk), or deeper in trunk's history.
+        reach = self._reachable(b)
+        if any(sha in self.commits[c][0] for c in reach):
+            return True
+        return _git(['merge-base', '--is-ancestor', sha, tip], check=False).returncode == 0
+
+    def frames(self, name):
+        """SHAs of the frames on a branch, bottom (next to trunk) first."""
+        tip, trunk = self.shas[name], self.shas[self.trunk]
+        if self.index and self._indexed is None:
+            self._indexed = _read_frame_index(self.index[0]) or ()
+        if self._indexed and self._indexed[:2] == (tip, trunk):
+            return list(self._indexed[2])
+        line, sha = [], tip
+        while sha in self.commits:
+            line.append(sha)
+            parents = self.commits[sha][0]
+            sha = parents[0] if parents else None
+        line.reverse()
+        if self.index and name == self.index[1]:
+            _write_frame_index(self.index[0], tip, trunk, line)
+            self._indexed = (tip, trunk, line)
+        return list(line)
+
+    def at_frame(self, name, tip, n):
+        """True if branch name is tip's nth frame: the fold check of grow and shrink."""
+        if n == 0 and self.shas[name] == self.shas[self.trunk]:
+            return True
+        frames = self.frames(tip)
+        if 0 < n <= len(frames) and self.shas[name] == frames[n - 1]:
+            return True
+        return self.is_ancestor(name, tip) and self.count(name) == n
+
+    def frame_at(self, name, n):
+        """SHA of the nth frame on a branch (trunk itself when n is 0)."""
+        if n == 0:
+            return self.trunk
+        frames = self.frames(name)
+        if n > len(frames):
+            raise ChainError(f'chain has {len(frames)} frames but pointer is {n}')
+        return frames[n - 1]
+
+    def below(self, name, k):
+        """SHA of name~k; k may reach one step past the bottom frame."""
+        frames = self.frames(name)
+        if k < len(frames):
+            return frames[len(frames) - 1 - k]
+        if k == 0:
+            return self.shas[name]
+        if k == len(frames) and self.commits[frames[0]][0]:
+            return self.commits[frames[0]][0][0]
+        return _out(['rev-parse', f'{self.shas[name]}~{k}'])
+
+    def oneline(self, tip, base=None):
+        """log --oneline base..tip, newest first."""
+        commits = self._reachable(tip)
+        if base is not None:
+            commits -= self._reachable(base)
+        return '\n'.join(self.commits[sha][1] for sha in reversed(self.frames(tip)) if sha in commits)
 
 
 def _set_chain_branch(name):
-    _git(['config', 'extensions.worktreeConfig', 'true'], check=False)
-    _git(['config', '--worktree', 'chain.branch', name])
+    _set_config('chain.branch', name)
 
 
 def _get_chain_branch(branch):
@@ -62,15 +307,10 @@ def _get_chain_branch(branch):
 
     Recorded as chain.branch at bootstrap so that switching branches keeps the
     same chain. Falls back to <branch>-chain; an existing branch with that name
-    is adopted (and recorded) so restored worktrees stay seamless.
+    is adopted (and recorded, see _load_graph) so restored worktrees stay
+    seamless.
     """
-    res = _git(['config', '--worktree', '--get', 'chain.branch'], check=False)
-    if res.returncode == 0 and res.stdout.strip():
-        return res.stdout.strip()
-    chain = f'{branch}-chain'
-    if _ref_exists(chain):
-        _set_chain_branch(chain)
-    return chain
+    return _worktree_config().get('chain.branch') or f'{branch}-chain'
 
 
 def _branch_and_chain():
@@ -81,129 +321,425 @@ def _branch_and_chain():
     return branch, chain
 
 
-def _get_frames(branch, trunk):
+def _get_frames(branch, graph):
     """Number of frames (commits above trunk) that belong in the working branch.
 
     Stored per-worktree as chain.frames; an integer survives history rewrites,
     a SHA would not. Initialized from origin/<branch> when possible: what the
     reviewer sees is what belongs in the working branch.
     """
-    res = _git(['config', '--worktree', '--get', 'chain.frames'], check=False)
-    if res.returncode == 0 and res.stdout.strip():
-        return int(res.stdout.strip())
+    value = _worktree_config().get('chain.frames')
+    if value:
+        return int(value)
     remote = f'origin/{branch}'
-    if _git(['show-ref', '--verify', '--quiet', f'refs/remotes/{remote}'], check=False).returncode == 0:
-        n = _count(f'{trunk}..{remote}')
-    else:
-        n = _count(f'{trunk}..{branch}')
+    n = graph.count(remote if graph.exists(remote) else branch)
     _set_frames(n)
     return n
 
 
 def _set_frames(n):
-    _git(['config', 'extensions.worktreeConfig', 'true'], check=False)
-    _git(['config', '--worktree', 'chain.frames', str(n)])
+    _set_config('chain.frames', str(n))
 
 
-def _frame_at(trunk, chain, n):
-    """SHA of the nth frame on the chain branch (trunk itself when n is 0)."""
-    if n == 0:
-        return trunk
-    commits = _out(['rev-list', '--reverse', f'{trunk}..{chain}']).splitlines()
-    if n > len(commits):
-        raise ChainError(f'chain has {len(commits)} frames but pointer is {n}')
-    return commits[n - 1]
+def _load_graph(branch, chain):
+    index = (os.path.join(_head()[0], _FRAME_INDEX), chain)
+    graph = ChainGraph.load([branch, chain, f'origin/{branch}'], index)
+    if not _worktree_config().get('chain.branch') and graph.exists(chain):
+        _set_chain_branch(chain)
+    return graph
 
 
-def _move_fold(delta):
+def _at_fold():
+    """(graph, branch, chain, n) once the working branch is checked to be at frame n."""
     branch, chain = _branch_and_chain()
-    trunk = _trunk()
-    if not _ref_exists(chain):
+    graph = _load_graph(branch, chain)
+    if not graph.exists(chain):
         raise ChainError(f"no chain branch '{chain}' (nothing folded)")
     _require_clean()
-    n = _get_frames(branch, trunk)
-    count_a = _count(f'{trunk}..{branch}')
-    if not (_is_ancestor(branch, chain) and count_a == n):
+    n = _get_frames(branch, graph)
+    if not graph.at_frame(branch, chain, n):
         raise ChainError("working branch is not at the fold; run 'git chain fold' first")
-    total = _count(f'{trunk}..{chain}')
+    return graph, branch, chain, n
+
+
+def _move_fold(delta):
+    graph, branch, chain, n = _at_fold()
+    total = len(graph.frames(chain))
     new_n = n + delta
     if new_n < 0 or new_n > total:
         raise ChainError(f'fold is at frame {n} of {total}; cannot move by {delta}')
     _set_frames(new_n)
-    _git(['reset', '--hard', _frame_at(trunk, chain, new_n)], capture=False)
+    _git(['reset', '--hard', graph.frame_at(chain, new_n)], capture=False)
     print(f'fold at frame {new_n} of {total}')
 
 
+@_command
 def cmd_grow(count=1):
     _move_fold(count)
 
 
+@_command
 def cmd_shrink(count=1):
     _move_fold(-count)
 
 
+class _Browser:
+    """Moves the fold frame to frame, writing only the paths that differ.
+
+    read-tree -m -u with the current and target frame is a two-tree merge:
+    git updates the index and working tree for the paths that changed
+    between them and leaves the rest alone, then update-ref moves the
+    branch and chain.frames follows at once. The state is checked once, so
+    a browse session stays in memory between steps.
+    """
+
+    def __init__(self):
+        self.graph, self.branch, self.chain, self.n = _at_fold()
+        self.frames = self.graph.frames(self.chain)
+
+    def sha(self, n):
+        return self.frames[n - 1] if n else self.graph.sha(self.graph.trunk)
+
+    def go(self, new_n):
+        total = len(self.frames)
+        if new_n < 0 or new_n > total:
+            raise ChainError(f'fold is at frame {self.n} of {total}; there is no frame {new_n}')
+        if new_n != self.n:
+            old, new = self.sha(self.n), self.sha(new_n)
+            _git(['read-tree', '-m', '-u', old, new])
+            _git(['update-ref', '-m', 'git chain', f'refs/heads/{self.branch}', new, old])
+            self.n = new_n
+            # The branch has moved: write the pointer now, not when browse
+            # ends, so a session killed midway leaves the two in agreement.
+            _set_frames(new_n)
+            _flush_config()
+
+    def describe(self):
+        total = len(self.frames)
+        if not self.n:
+            return f'fold at frame 0 of {total} (trunk)'
+        return f'fold at frame {self.n} of {total}: {self.graph.commits[self.sha(self.n)][1]}'
+
+
+@_command
+def cmd_jump(n):
+    browser = _Browser()
+    browser.go(n)
+    print(f'fold at frame {browser.n} of {len(browser.frames)}')
+
+
+@_command
+def cmd_step(count=1):
+    browser = _Browser()
+    browser.go(browser.n + count)
+    print(f'fold at frame {browser.n} of {len(browser.frames)}')
+
+
+@_command
+def cmd_browse():
+    browser = _Browser()
+    print('enter: next frame, p: previous, N: frame N, q: quit')
+    print(browser.describe())
+    while True:
+        try:
+            line = input('> ').strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if line == 'q':
+            break
+        try:
+            if line.isdigit():
+                browser.go(int(line))
+            elif line in ('p', '-'):
+                browser.go(browser.n - 1)
+            elif line in ('', 'n', '+'):
+                browser.go(browser.n + 1)
+            else:
+                print(f"unknown input '{line}'")
+                continue
+        except ChainError as e:
+            print(e)
+            continue
+        print(browser.describe())
+
+
+@_command
 def cmd_list():
     branch, chain = _branch_and_chain()
-    trunk = _trunk()
+    graph = _load_graph(branch, chain)
     print(f'on {branch}:')
-    print(_out(['log', '--oneline', f'{trunk}..{branch}']) or '  (nothing)')
-    if not _ref_exists(chain):
+    print(graph.oneline(branch) or '  (nothing)')
+    if not graph.exists(chain):
         print(f"no chain branch '{chain}' (nothing folded)")
         return
     print(f'folded on {chain}:')
-    print(_out(['log', '--oneline', f'{branch}..{chain}']) or '  (nothing)')
+    print(graph.oneline(chain, branch) or '  (nothing)')
+
+
+def _worktrees():
+    """(path, git dir, branch or None) for each worktree, from worktree list --porcelain."""
+    worktrees, entry = [], {}
+    for line in _out(['worktree', 'list', '--porcelain']).splitlines() + ['']:
+        key, _, value = line.partition(' ')
+        if key:
+            entry[key] = value
+            continue
+        if 'worktree' in entry and 'bare' not in entry:
+            path = entry['worktree']
+            git_dir = os.path.join(path, '.git')
+            if os.path.isfile(git_dir):
+                try:
+                    with open(git_dir) as f:
+                        git_dir = os.path.join(path, f.read().strip().partition('gitdir: ')[2])
+                except OSError:
+                    git_dir = None
+            elif not os.path.isdir(git_dir):
+                git_dir = None
+            branch = entry.get('branch', '').replace('refs/heads/', '') or None
+            worktrees.append((path, git_dir and os.path.realpath(git_dir), branch))
+        entry = {}
+    return worktrees
+
+
+def _read_config_file(path):
+    """{'section.key': value} from a git config file, read as a file rather than with git config."""
+    config, section = {}, None
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except OSError:
+        return config
+    for line in lines:
+        line = line.strip()
+        if not line or line[0] in '#;':
+            continue
+        if line.startswith('['):
+            section = line[1:line.index(']')].strip().lower() if ']' in line else None
+            continue
+        key, _, value = line.partition('=')
+        if section:
+            config[f'{section}.{key.strip().lower()}'] = value.strip().strip('"')
+    return config
+
+
+def _read_chain_config(git_dir):
+    """chain.* keys of a worktree, from the same file _worktree_config reads:
+    its config.worktree, or the repository's config without extensions.worktreeConfig."""
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    except OSError:
+        pass
+    config = _read_config_file(os.path.join(common_dir, 'config'))
+    if _is_true(config.get('extensions.worktreeconfig', '')):
+        config = _read_config_file(os.path.join(git_dir, 'config.worktree'))
+    return {key: value for key, value in config.items() if key.startswith('chain.')}
+
+
+@_command
+def cmd_status(all_worktrees=False):
+    """One line per worktree: frames on its working branch and folded on its chain.
+
+    Worktree config is read from the config.worktree files, and all branches
+    and chains share one for-each-ref and one git log.
+    """
+    worktrees = _worktrees()
+    if not all_worktrees:
+        here = os.path.realpath(_head()[0])
+        worktrees = [w for w in worktrees if w[1] == here]
+    chains = {}
+    for path, git_dir, branch in worktrees:
+        if branch and git_dir:
+            config = _read_chain_config(git_dir)
+            chains[path] = (branch, config.get('chain.branch') or f'{branch}-chain', config.get('chain.frames'))
+    names = [name for branch, chain, _ in chains.values() for name in (branch, chain, f'origin/{branch}')]
+    graph = ChainGraph.load(names)
+    width = max((len(path) for path, _, _ in worktrees), default=0)
+    for path, git_dir, branch in worktrees:
+        if path not in chains:
+            print(f"{path:<{width}}  {'(missing)' if not git_dir else '(detached HEAD)'}")
+            continue
+        branch, chain, frames = chains[path]
+        on_branch = graph.count(branch) if graph.exists(branch) else 0
+        line = f'{path:<{width}}  {branch}: {on_branch} frame(s) on branch, '
+        if graph.exists(chain):
+            line += f"{graph.count(chain, branch) if graph.exists(branch) else graph.count(chain)} folded on '{chain}'"
+        else:
+            line += 'nothing folded'
+        if frames and frames.isdigit() and int(frames) != on_branch:
+            line += f' (fold pointer at frame {frames})'
+        print(line)
+
+
+@_command
+def cmd_push():
+    """Publishes each frame as <branch>-frame-K on origin with one atomic push.
+
+    Frames whose remote-tracking ref already has the frame's SHA are left out,
+    refs for frames the chain no longer has are deleted, and every update is
+    leased on the remote-tracking value so a ref moved by someone else fails
+    the whole push. (<branch>/frame-K cannot exist next to the pushed branch
+    itself: a ref cannot also be a directory.)
+    """
+    branch, chain = _branch_and_chain()
+    graph = _load_graph(branch, chain)
+    if not graph.exists(chain):
+        raise ChainError(f"no chain branch '{chain}' (nothing to push)")
+    prefix = f'{branch}-frame-'
+    out = _out(['for-each-ref', '--format=%(objectname) %(refname)', f'refs/remotes/origin/{prefix}*'])
+    remote = {}
+    for line in out.splitlines():
+        sha, ref = line.split(' ', 1)
+        name = ref[len('refs/remotes/origin/'):]
+        if name[len(prefix):].isdigit():
+            remote[name] = sha
+    frames = graph.frames(chain)
+    wanted = {f'{prefix}{k}': sha for k, sha in enumerate(frames, 1)}
+    leases, refspecs = [], []
+    for name in sorted(set(wanted) | set(remote), key=lambda name: int(name[len(prefix):])):
+        sha, old = wanted.get(name), remote.get(name, '')
+        if sha == old:
+            continue
+        leases.append(f'--force-with-lease=refs/heads/{name}:{old}')
+        refspecs.append(f'{sha or ""}:refs/heads/{name}')
+    if not refspecs:
+        print(f'{len(frames)} frame ref(s) already up to date on origin')
+        return
+    res = _git(['push', '--atomic', '--porcelain'] + leases + ['origin'] + refspecs, check=False)
+    if res.returncode != 0:
+        raise ChainError(res.stderr.strip() or 'git push failed')
+    print(f'pushed {len(refspecs)} frame ref update(s) to origin; '
+          f'{len(frames)} frame(s) as {prefix}1..{len(frames)}')
+
+
+# Replaying frames without a working tree. merge-tree --write-tree (git 2.38)
+# merges trees in the object store; --merge-base (git 2.40) makes it a
+# cherry-pick. Before 2.40 the merge base is forced with a stand-in commit
+# that has onto's tree on top of the frame's parent.
+_merge_base_option = True
+
+
+def _commit_info(shas):
+    """SHA -> (tree, first parent, author env, message), from one git log."""
+    out = _git(['log', '--no-walk=unsorted', '-z', '--date=raw',
+                '--format=%H%x01%T%x01%P%x01%an%x01%ae%x01%ad%x01%B'] + shas + ['--']).stdout
+    info = {}
+    for record in out.split('\0'):
+        if record.strip():
+            sha, tree, parents, name, email, date, message = record.lstrip('\n').split('\x01')
+            author = {'GIT_AUTHOR_NAME': name, 'GIT_AUTHOR_EMAIL': email, 'GIT_AUTHOR_DATE': date}
+            info[sha] = (tree, (parents.split() or [None])[0], author, message)
+    return info
+
+
+def _merge_tree(base, onto, onto_tree, commit):
+    """merge-tree result of cherry-picking commit (whose parent is base) onto onto."""
+    global _merge_base_option
+    if _merge_base_option:
+        res = _git(['merge-tree', '--write-tree', '--name-only', f'--merge-base={base}', onto, commit],
+                   check=False)
+        if res.returncode in (0, 1):
+            return res
+        _merge_base_option = False
+    stand_in = _out(['commit-tree', onto_tree, '-p', base, '-m', 'git chain: merge base'])
+    return _git(['merge-tree', '--write-tree', '--name-only', stand_in, commit], check=False)
+
+
+def _replay(commits, onto):
+    """Replays commits (bottom first) onto onto in the object store; returns the new tip.
+
+    Authors and messages are kept. Commits that change nothing on top of onto
+    (their changes are already there) are dropped, as rebase does. A conflict raises ChainError naming the frame
+    and the conflicting paths; nothing has been changed at that point.
+    """
+    info = _commit_info(commits + [onto])
+    tip, tip_tree = onto, info[onto][0]
+    for sha in commits:
+        _, parent, author, message = info[sha]
+        if parent is None:
+            raise ChainError(f'cannot replay root commit {sha[:12]}')
+        res = _merge_tree(parent, tip, tip_tree, sha)
+        lines = res.stdout.splitlines()
+        if res.returncode not in (0, 1) or not lines:
+            raise ChainError(res.stderr.strip() or f'git merge-tree failed on {sha[:12]}')
+        if res.returncode == 1:
+            paths = ', '.join(lines[1:lines.index('')] if '' in lines else lines[1:])
+            subject = message.splitlines()[0] if message.strip() else sha[:12]
+            raise ChainError(
+                f"conflict replaying '{subject}' ({paths}); nothing was changed. "
+                'Run the command again with --rebase to resolve it in the working tree')
+        if lines[0] == tip_tree:
+            continue
+        tip = _git(['commit-tree', lines[0], '-p', tip, '-m', message],
+                   env=dict(os.environ, **author)).stdout.strip()
+        tip_tree = lines[0]
+    return tip
 
 
-def cmd_unfold():
+def _update_branch(name, new, old):
+    _git(['update-ref', '-m', 'git chain', f'refs/heads/{name}', new, old])
+
+
+@_command
+def cmd_unfold(rebase=False):
     branch, chain = _branch_and_chain()
-    trunk = _trunk()
-    if not _ref_exists(chain):
+    graph = _load_graph(branch, chain)
+    if not graph.exists(chain):
         raise ChainError(f"nothing to unfold (no chain branch '{chain}')")
-    _get_frames(branch, trunk)
+    _get_frames(branch, graph)
     _require_clean()
-    tip = _out(['rev-parse', chain])
-    if _out(['rev-parse', branch]) == tip:
+    tip = graph.sha(chain)
+    if graph.sha(branch) == tip:
         print('nothing to unfold (working branch already at chain tip)')
         return
-    if not _is_ancestor(branch, chain):
-        if _out(['rev-list', branch, f'^{chain}', f'^{trunk}']):
+    if not graph.is_ancestor(branch, chain):
+        if graph.count(branch, chain):
             raise ChainError("working branch has unfolded changes; run 'git chain fold' first")
         # The fold's frames merged upstream (with new SHAs, as a squash or
         # rebase merge produces) and the branch was rebased onto the new trunk
         # before unfolding; replay the rest of the chain on top of it.
-        base = _out(['merge-base', branch, chain])
-        res = _git(['rebase', '--onto', branch, base, chain], check=False)
-        if res.returncode != 0:
-            raise ChainError(
-                'rebase conflict while moving the chain onto the rebased branch; '
-                "resolve it, run 'git rebase --continue', then check out the "
-                "working branch and run 'git chain unfold' again")
-        _git(['checkout', branch], capture=False)
-        tip = _out(['rev-parse', chain])
+        if rebase:
+            base = _out(['merge-base', branch, chain])
+            res = _git(['rebase', '--onto', branch, base, chain], check=False)
+            if res.returncode != 0:
+                raise ChainError(
+                    'rebase conflict while moving the chain onto the rebased branch; '
+                    "resolve it, run 'git rebase --continue', then check out the "
+                    "working branch and run 'git chain unfold' again")
+            _git(['checkout', branch], capture=False)
+            tip = _out(['rev-parse', chain])
+        else:
+            frames = _out(['rev-list', '--reverse', '--no-merges', chain, f'^{branch}']).split()
+            tip = _replay(frames, graph.sha(branch))
+            _update_branch(chain, tip, graph.sha(chain))
     _git(['reset', '--hard', tip], capture=False)
     print(f'unfolded chain onto {branch}')
 
 
-def cmd_fold():
+@_command
+def cmd_fold(rebase=False):
     branch, chain = _branch_and_chain()
-    trunk = _trunk()
     _require_clean()
+    graph = _load_graph(branch, chain)
     created = False
-    if not _ref_exists(chain):
+    if not graph.exists(chain):
         _git(['branch', chain, branch])
         _set_chain_branch(chain)
+        graph.set_branch(chain, graph.sha(branch))
         created = True
         print(f"created chain branch '{chain}'")
-    n = _get_frames(branch, trunk)
-    total = _count(f'{trunk}..{chain}')
+    n = _get_frames(branch, graph)
+    total = graph.count(chain)
     tail = total - n
-    count_a = _count(f'{trunk}..{branch}')
+    count_a = graph.count(branch)
     if tail < 0 or count_a < n:
         raise ChainError(
             f'stale pointer: chain has {total} frames, working branch has {count_a}, '
             f'pointer says {n}; fix with: git config --worktree chain.frames N')
 
-    if not created and _is_ancestor(branch, chain) and count_a == n:
+    if not created and graph.is_ancestor(branch, chain) and count_a == n:
         print('nothing to fold')
         return
 
@@ -212,22 +748,36 @@ def cmd_fold():
             # Replace: the working branch holds the full chain (unfolded and
             # committed on, rebased, or rewritten) — it is authoritative.
             _git(['branch', '-f', chain, branch])
-        elif count_a > n:
+            graph.set_branch(chain, graph.sha(branch))
+        elif count_a > n and rebase:
             # The working branch holds frame n plus frames not on the chain
             # (e.g. committed on a branch made from the reviewed frame):
             # replay the new frames onto the chain tip.
-            res = _git(['rebase', '--onto', chain, _frame_at(trunk, branch, n)], check=False)
+            res = _git(['rebase', '--onto', chain, graph.frame_at(branch, n)], check=False)
             if res.returncode != 0:
                 raise ChainError(
                     'rebase conflict while adding frames to the chain; resolve it, run '
                     "'git rebase --continue', then run 'git chain fold' again")
             _git(['branch', '-f', chain, branch])
+            graph = _load_graph(branch, chain)
+        elif count_a > n:
+            # As above, replayed in the object store: the working tree is
+            # only written by the final reset.
+            tip = _replay(graph.frames(branch)[n:], graph.sha(chain))
+            _update_branch(chain, tip, graph.sha(chain))
+            graph = _load_graph(branch, chain)
         elif tail == 0:
             _git(['branch', '-f', chain, branch])
-        else:
+            graph.set_branch(chain, graph.sha(branch))
+        elif not rebase:
             # Rebuild: the reviewed frames were amended; replay the folded
-            # frames on top of their replacements.
-            base = _out(['rev-parse', f'{chain}~{tail}'])
+            # frames on top of their replacements (in the object store, or
+            # with --rebase in the working tree).
+            tip = _replay(graph.frames(chain)[n:], graph.sha(branch))
+            _update_branch(chain, tip, graph.sha(chain))
+            graph = _load_graph(branch, chain)
+        else:
+            base = graph.below(chain, tail)
             res = _git(['rebase', '--onto', branch, base, chain], check=False)
             if res.returncode != 0:
                 raise ChainError(
@@ -235,6 +785,9 @@ def cmd_fold():
                     "'git rebase --continue', then check out the working branch "
                     "and run 'git chain fold' again")
             _git(['checkout', branch], capture=False)
+            graph = _load_graph(branch, chain)
 
-    _git(['reset', '--hard', _frame_at(trunk, chain, n)], capture=False)
-    print(f"folded: {_count(f'{branch}..{chain}')} frame(s) on '{chain}'")
+    target = graph.frame_at(chain, n)
+    _git(['reset', '--hard', target], capture=False)
+    graph.set_branch(branch, graph.sha(target) if target == graph.trunk else target)
+    print(f"folded: {graph.count(chain, branch)} frame(s) on '{chain}'")
@@ -3,23 +3,142 @@ import os
 import sys
 import shutil
 import platform
+import atexit
+import json
+import threading
+import time
+from contextlib import contextmanager
 
-def run_command(command, check=True, capture_output=False, text=True):
+def run_command(command, check=True, capture_output=False, text=True, env=None):
     """
     Unified wrapper for subprocess.run.
     Returns the result object.
     """
-    try:
-        return subprocess.run(command, check=check, capture_output=capture_output, text=text)
-    except FileNotFoundError:
-        print(f"Warning: Command '{command[0]}' not found. Skipping.", file=sys.stderr)
-        return None
-    except subprocess.CalledProcessError as e:
-        if check:
-            raise e
-        else:
-            print(f"Warning: Command '{' '.join(command)}' failed with error: {e}", file=sys.stderr)
-            return e
+    with timed('exec', ' '.join(command)) as event:
+        try:
+            res = subprocess.run(command, check=check, capture_output=capture_output, text=text, env=env)
+            event['returncode'] = res.returncode
+            return res
+        except FileNotFoundError:
+            event['returncode'] = 127
+            print(f"Warning: Command '{command[0]}' not found. Skipping.", file=sys.stderr)
+            return None
+        except subprocess.CalledProcessError as e:
+            event['returncode'] = e.returncode
+            if check:
+                raise e
+            else:
+                print(f"Warning: Command '{' '.join(command)}' failed with error: {e}", file=sys.stderr)
+                return e
+
+class Timings:
+    """
+    Records how long phases and subprocesses take, from any thread.
+    Each event is a dict: kind ('phase', 'exec', 'tmux', ...), name, start and
+    duration in seconds since t0, nesting depth, and returncode when known.
+    """
+    def __init__(self, t0=None, report=True, trace_path=None):
+        self.t0 = t0 if t0 is not None else time.perf_counter()
+        self.report = report
+        self.trace_path = trace_path
+        self.events = []
+        self.meta = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._finished = False
+
+    def record(self, kind, name, start, end, **fields):
+        """Adds an event measured elsewhere (start/end are perf_counter values)."""
+        event = dict(kind=kind, name=name, depth=getattr(self._local, 'depth', 0),
+                     start=start - self.t0, duration=end - start, **fields)
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, kind, name):
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        event = {'kind': kind, 'name': name, 'depth': depth, 'start': time.perf_counter() - self.t0}
+        try:
+            yield event
+        except BaseException as e:
+            event.setdefault('error', type(e).__name__)
+            raise
+        finally:
+            self._local.depth = depth
+            event['duration'] = time.perf_counter() - self.t0 - event['start']
+            with self._lock:
+                self.events.append(event)
+
+    def format_report(self):
+        total = time.perf_counter() - self.t0
+        lines = [f"timings: {total * 1000:.1f} ms total"]
+        for e in sorted(self.events, key=lambda e: e['start']):
+            rc = f"  [exit {e['returncode']}]" if e.get('returncode') else ''
+            rc += f"  [{e['error']}]" if e.get('error') else ''
+            name = e['name'] if len(e['name']) <= 100 else e['name'][:97] + '...'
+            lines.append(f"  {e['start'] * 1000:8.1f} {e['duration'] * 1000:8.1f} ms  "
+                         f"{'  ' * e['depth']}{e['kind']:<5} {name}{rc}")
+        by_kind = {}
+        for e in self.events:
+            if e['kind'] != 'phase':
+                count, seconds = by_kind.get(e['kind'], (0, 0.0))
+                by_kind[e['kind']] = (count + 1, seconds + e['duration'])
+        for kind, (count, seconds) in sorted(by_kind.items()):
+            lines.append(f"  {kind}: {count} call(s), {seconds * 1000:.1f} ms")
+        return '\n'.join(lines)
+
+    def finish(self):
+        """Prints the report and appends the trace; later calls do nothing."""
+        if self._finished:
+            return
+        self._finished = True
+        if self.report:
+            print(self.format_report(), file=sys.stderr)
+        if self.trace_path:
+            run = dict(self.meta, kind='run', pid=os.getpid(), host=platform.node(),
+                       python=platform.python_version(), time=time.time(),
+                       duration=time.perf_counter() - self.t0)
+            with self._lock:
+                events = list(self.events)
+            lines = ''.join(json.dumps(dict(e, pid=run['pid'])) + '\n' for e in events)
+            try:
+                # One append per run, so concurrent runs do not interleave lines
+                with open(self.trace_path, 'a') as f:
+                    f.write(lines + json.dumps(run) + '\n')
+            except OSError as e:
+                print(f"Warning: could not write trace to {self.trace_path}: {e}", file=sys.stderr)
+
+_timings = None
+
+def enable_timings(t0=None, report=True, trace_path=None):
+    """
+    Turns on timing of run_command and timed() blocks for this process.
+    Returns the Timings; finish_timings() reports (also run at exit).
+    """
+    global _timings
+    if _timings is None:
+        _timings = Timings(t0, report, trace_path)
+        atexit.register(finish_timings)
+    return _timings
+
+def timed(kind, name):
+    """
+    Context manager timing a block when timings are on. It yields a dict
+    the block may add fields (e.g. returncode) to, whether or not they are.
+    """
+    if _timings is None:
+        return _untimed()
+    return _timings.span(kind, name)
+
+@contextmanager
+def _untimed():
+    yield {}
+
+def finish_timings():
+    """Reports timings now; call before os.exec*, which skips exit handlers."""
+    if _timings is not None:
+        _timings.finish()
 
 def symlink_resource(source_relative_path, destination_path_from_home):
     """
@@ -1,19 +1,726 @@
 import subprocess
 import os
 import signal
+import stat
 import sys
+import fcntl
+import hashlib
 import json
+import re
+import shlex
+import shutil
+import socket
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from lib.utils import run_command
+try:
+    import tomllib
+except ImportError:  # Python < 3.11: .wts.toml profiles are ignored
+    tomllib = None
+from lib import wts_client
+from lib.utils import enable_timings, finish_timings, get_repo_root, is_darwin, run_command, timed
+
+
+def cache_dir():
+    """wts_client.cache_dir() as a Path."""
+    return Path(wts_client.cache_dir())
+
+
+def tmux_chain_args(commands):
+    """Joins tmux commands into one argv: tmux a \\; b \\; c.
+
+    tmux treats a trailing ';' on any argument as a command separator, so a
+    literal one (e.g. in a send-keys payload) is escaped.
+    """
+    argv = ['tmux']
+    for i, command in enumerate(commands):
+        if i:
+            argv.append(';')
+        argv.extend(arg[:-1] + '\\;' if arg.endswith(';') else arg for arg in command)
+    return argv
+
+
+def run_tmux_batch(commands, check=True):
+    """Runs a list of tmux commands in a single tmux client process.
+
+    tmux stops at the first failing command, like a shell '&&' chain.
+    """
+    if not commands:
+        return None
+    return run_command(tmux_chain_args(commands), check=check)
+
+
+class TmuxClient:
+    """One tmux control-mode (-C) connection shared by a wts invocation.
+
+    Commands are written one per line and each is answered with a
+    %begin ... %end (or %error) block. The client attaches with ignore-size
+    and no-output so it never resizes windows or streams pane output. When no
+    connection can be made (no server running, tmux too old) every command
+    falls back to its own tmux process, so callers need not care.
+    """
+
+    CONNECT = ['tmux', '-C', 'attach-session', '-f', 'ignore-size,no-output']
+
+    # Set by the daemon: connections outlive close() and are reused, one per server
+    keep_warm = False
+    _warm = {}
+
+    def __init__(self):
+        self.proc = None
+        self._tried = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def connected(self):
+        if not self._tried:
+            self._tried = True
+            self._connect()
+        return self.proc is not None
+
+    @staticmethod
+    def _server_key():
+        return os.environ.get('TMUX', '').split(',')[0], os.environ.get('TMUX_TMPDIR', '')
+
+    def _connect(self):
+        if self.keep_warm:
+            proc = self._warm.get(self._server_key())
+            if proc is not None and proc.poll() is None:
+                self.proc = proc
+                return
+        with timed('tmux', 'connect (control mode)') as event:
+            try:
+                # A new session keeps the client out of the pane's process group,
+                # so it survives the SIGHUP sent when wts kills its own session.
+                self.proc = subprocess.Popen(
+                    self.CONNECT, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL, text=True, start_new_session=True,
+                )
+            except OSError:
+                event['returncode'] = 127
+                return
+            # The attach itself is answered first; an error means no sessions.
+            reply = self._read_reply()
+            if reply is None or not reply[0]:
+                event['returncode'] = 1
+                self.close()
+            elif self.keep_warm:
+                self._warm[self._server_key()] = self.proc
+
+    def close(self):
+        """Closes the connection; the client detaches when stdin hits EOF."""
+        proc, self.proc = self.proc, None
+        if proc is None or any(warm is proc for warm in self._warm.values()):
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+
+    def _discard(self):
+        """Closes a broken connection, warm or not."""
+        for key, warm in list(self._warm.items()):
+            if warm is self.proc:
+                del self._warm[key]
+        self.close()
+
+    def _read_reply(self):
+        """Returns (ok, lines) for the next framed reply, or None on EOF.
+
+        Notifications (%session-changed, %sessions-changed, ...) arrive
+        unframed between replies and are skipped.
+        """
+        begin = None
+        lines = []
+        for line in self.proc.stdout:
+            line = line.rstrip('\n')
+            if begin is None:
+                if line.startswith('%begin '):
+                    begin = line.split()[1:3]
+                elif line == '%exit':
+                    return None
+                continue
+            parts = line.split()
+            if parts and parts[0] in ('%end', '%error') and parts[1:3] == begin:
+                return parts[0] == '%end', lines
+            lines.append(line)
+        return None
+
+    @staticmethod
+    def _quote(arg):
+        return '"' + re.sub(r'([\\"$])', r'\\\1', arg) + '"'
+
+    def _send(self, commands):
+        """Pipelines commands over the connection; returns one reply per command."""
+        name = ' '.join(commands[0]) + (f' (+{len(commands) - 1} more)' if len(commands) > 1 else '')
+        with timed('tmux', name) as event:
+            try:
+                self.proc.stdin.write(''.join(
+                    ' '.join(self._quote(arg) for arg in command) + '\n' for command in commands))
+                self.proc.stdin.flush()
+            except OSError:
+                self._discard()
+                event['returncode'] = 1
+                return [None] * len(commands)
+            replies = []
+            for _ in commands:
+                reply = self._read_reply() if self.proc else None
+                if reply is None:
+                    self._discard()
+                replies.append(reply)
+            event['returncode'] = 0 if all(r and r[0] for r in replies) else 1
+            return replies
+
+    @staticmethod
+    def _result(command, reply, check):
+        if reply is None:
+            res = subprocess.CompletedProcess(['tmux'] + command, 1, '', 'tmux control connection closed\n')
+        else:
+            ok, lines = reply
+            out = ''.join(line + '\n' for line in lines)
+            res = subprocess.CompletedProcess(['tmux'] + command, 0 if ok else 1,
+                                              out if ok else '', '' if ok else out)
+        if check and res.returncode != 0:
+            raise subprocess.CalledProcessError(res.returncode, res.args, res.stdout, res.stderr)
+        return res
+
+    def run(self, command, check=False):
+        """Runs one tmux command; returns a CompletedProcess with text output."""
+        if not self.connected or any('\n' in arg for arg in command):
+            return self._run_process(command, check)
+        return self._result(command, self._send([command])[0], check)
+
+    @staticmethod
+    def _run_process(command, check):
+        with timed('exec', ' '.join(['tmux'] + command)) as event:
+            res = subprocess.run(['tmux'] + command, check=False, capture_output=True, text=True)
+            event['returncode'] = res.returncode
+        if check and res.returncode != 0:
+            raise subprocess.CalledProcessError(res.returncode, res.args, res.stdout, res.stderr)
+        return res
+
+    def batch(self, commands, check=True):
+        """Runs commands in order over the connection (or one chained process)."""
+        if not self.connected or any('\n' in arg for command in commands for arg in command):
+            return run_tmux_batch(commands, check=check)
+        for command, reply in zip(commands, self._send(commands)):
+            self._result(command, reply, check)
+
+    def source_file(self, path, count, check=True):
+        """Runs 'source-file path', a script of count commands, and waits for all of them.
+
+        Over control mode the commands a sourced file queues are answered
+        after source-file itself, each with its own reply block.
+        """
+        command = ['source-file', path]
+        if not self.connected:
+            return self._run_process(command, check)
+        reply = self._send([command])[0]
+        replies = [reply]
+        if reply is not None and reply[0]:
+            for _ in range(count):
+                replies.append(self._read_reply() if self.proc else None)
+                if replies[-1] is None:
+                    self._discard()
+                    break
+        failed = next((r for r in replies if r is None or not r[0]), reply)
+        return self._result(command, failed, check)
+
+    # ------------------------------------------------------------------
+    # Queries shared by the create, --add and --done flows
+    # ------------------------------------------------------------------
+
+    def has_session(self, name):
+        return self.run(['has-session', '-t', f'={name}']).returncode == 0
+
+    def display(self, fmt):
+        """Expands fmt for the invoking pane ($TMUX_PANE) rather than this client."""
+        command = ['display-message', '-p']
+        if os.environ.get('TMUX_PANE'):
+            command += ['-t', os.environ['TMUX_PANE']]
+        res = self.run(command + [fmt])
+        return res.stdout.strip() if res.returncode == 0 else ''
+
+    def user_client(self, session):
+        """The most recently active terminal (non-control) client on session, or None."""
+        res = self.run(['list-clients', '-t', session, '-F',
+                        '#{client_control_mode} #{client_activity} #{client_name}'])
+        clients = []
+        for line in res.stdout.splitlines() if res.returncode == 0 else []:
+            parts = line.split(None, 2)
+            if len(parts) == 3 and parts[0] == '0' and parts[1].isdigit():
+                clients.append((int(parts[1]), parts[2]))
+        return max(clients)[1] if clients else None
+
+
+class GitRepo:
+    """Read-only view of a repository's refs, answered from its git dir.
+
+    HEAD, loose refs, packed-refs and the commondir file are read directly,
+    so wts can size up a repository without starting git. Setups this
+    reader does not understand (GIT_DIR overrides, reftable ref storage)
+    are answered by git itself; writes always go through git.
+    """
+
+    # Refs that live in each worktree's own git dir rather than the common dir
+    PER_WORKTREE_REFS = ('refs/bisect/', 'refs/worktree/', 'refs/rewritten/')
+
+    def __init__(self, git_dir, common_dir, worktree=None, native=True):
+        self.git_dir = Path(git_dir)
+        self.common_dir = Path(common_dir)
+        self.worktree = Path(worktree) if worktree else None
+        self.native = native
+        self._packed = None
+
+    @property
+    def repo_root(self):
+        """The main worktree for a normal repo, the git dir itself for a bare one."""
+        return self.common_dir.parent if self.common_dir.name == '.git' else self.common_dir
+
+    @classmethod
+    def discover(cls, path='.'):
+        """Returns the GitRepo containing path, or None outside a repository."""
+        path = Path(os.path.abspath(path))
+        if 'GIT_DIR' in os.environ or 'GIT_COMMON_DIR' in os.environ:
+            return cls._from_git(path)
+        for d in (path, *path.parents):
+            dotgit = d / '.git'
+            if dotgit.is_dir():
+                return cls._open(dotgit, d)
+            if dotgit.is_file():
+                content = dotgit.read_text().strip()
+                if content.startswith('gitdir:'):
+                    return cls._open(d / content[len('gitdir:'):].strip(), d)
+            if cls._is_git_dir(d):
+                return cls._open(d, None)
+        return None
+
+    @staticmethod
+    def _is_git_dir(d):
+        if not (d / 'HEAD').is_file():
+            return False
+        return (d / 'commondir').is_file() or ((d / 'objects').is_dir() and (d / 'refs').is_dir())
+
+    @classmethod
+    def _open(cls, git_dir, worktree):
+        git_dir = Path(os.path.abspath(git_dir))
+        common_dir = git_dir
+        commondir_file = git_dir / 'commondir'
+        if commondir_file.is_file():
+            common_dir = Path(os.path.abspath(git_dir / commondir_file.read_text().strip()))
+        if (common_dir / 'reftable').is_dir():
+            return cls._from_git(worktree or git_dir)
+        return cls(git_dir, common_dir, worktree)
+
+    @classmethod
+    def _from_git(cls, path):
+        res = run_command(
+            ['git', '-C', str(path), 'rev-parse', '--absolute-git-dir', '--git-common-dir',
+             '--is-inside-work-tree'],
+            capture_output=True, check=False,
+        )
+        if not res or res.returncode != 0:
+            return None
+        git_dir, common_dir, inside = res.stdout.strip().splitlines()
+        worktree = None
+        if inside == 'true':
+            worktree = run_command(['git', '-C', str(path), 'rev-parse', '--show-toplevel'],
+                                   capture_output=True).stdout.strip()
+        return cls(git_dir, os.path.join(path, common_dir), worktree, native=False)
+
+    def _git(self, args):
+        return run_command(['git', '--git-dir', str(self.git_dir)] + args, capture_output=True, check=False)
+
+    def _packed_refs(self):
+        """Maps ref name to SHA for every entry in packed-refs."""
+        if self._packed is None:
+            self._packed = {}
+            try:
+                with open(self.common_dir / 'packed-refs') as f:
+                    for line in f:
+                        if line.startswith(('#', '^')):
+                            continue
+                        parts = line.split()
+                        if len(parts) == 2:
+                            self._packed[parts[1]] = parts[0]
+            except FileNotFoundError:
+                pass
+        return self._packed
+
+    def ref_exists(self, ref):
+        """True if the full ref name (e.g. refs/heads/main) exists."""
+        if not self.native:
+            res = self._git(['show-ref', '--verify', '--quiet', ref])
+            return res is not None and res.returncode == 0
+        base = self.git_dir if ref.startswith(self.PER_WORKTREE_REFS) else self.common_dir
+        return (base / ref).is_file() or ref in self._packed_refs()
+
+    def branch_exists(self, branch):
+        return self.ref_exists(f'refs/heads/{branch}')
+
+    def read_symref(self, ref):
+        """Target of a symbolic ref (e.g. refs/remotes/origin/HEAD), or None."""
+        if not self.native:
+            res = self._git(['symbolic-ref', '-q', ref])
+            return res.stdout.strip() if res and res.returncode == 0 else None
+        base = self.git_dir if ref == 'HEAD' or ref.startswith(self.PER_WORKTREE_REFS) else self.common_dir
+        try:
+            content = (base / ref).read_text().strip()
+        except OSError:
+            return None
+        return content[len('ref:'):].strip() if content.startswith('ref:') else None
+
+    def commit_of(self, ref):
+        """SHA that ref (HEAD or a full ref name) points at, following symbolic refs."""
+        if not self.native:
+            res = self._git(['rev-parse', '--verify', '--quiet', ref])
+            return res.stdout.strip() if res and res.returncode == 0 else None
+        for _ in range(5):
+            base = self.git_dir if ref == 'HEAD' or ref.startswith(self.PER_WORKTREE_REFS) else self.common_dir
+            try:
+                content = (base / ref).read_text().strip()
+            except OSError:
+                return self._packed_refs().get(ref)
+            if not content.startswith('ref:'):
+                return content
+            ref = content[len('ref:'):].strip()
+        return None
+
+    def trunk_ref(self):
+        """The last-fetched trunk (what origin/HEAD points at), or None if unknown."""
+        target = self.read_symref('refs/remotes/origin/HEAD')
+        return target if target and self.ref_exists(target) else None
+
+    def head_branch(self):
+        """The checked-out branch name, or 'HEAD' when detached."""
+        if not self.native:
+            res = self._git(['rev-parse', '--abbrev-ref', 'HEAD'])
+            return res.stdout.strip() if res and res.returncode == 0 else 'HEAD'
+        head = (self.git_dir / 'HEAD').read_text().strip()
+        prefix = 'ref: refs/heads/'
+        return head[len(prefix):] if head.startswith(prefix) else 'HEAD'
+
+    def config_values(self, key):
+        """All values of key (section.name) in the repository's own config file.
+
+        Only the repo's config is read, not global or included files: wts
+        keeps its per-repo settings there. Subsections are not supported.
+        """
+        if not self.native:
+            res = self._git(['config', '--local', '--get-all', key])
+            return res.stdout.splitlines() if res and res.returncode == 0 else []
+        section, _, name = key.lower().rpartition('.')
+        values, current = [], None
+        try:
+            lines = (self.common_dir / 'config').read_text().splitlines()
+        except OSError:
+            return []
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith(('#', ';')):
+                continue
+            if line.startswith('['):
+                current = line[1:line.index(']')].strip().lower() if ']' in line else None
+                continue
+            k, sep, v = line.partition('=')
+            if current != section or k.strip().lower() != name:
+                continue
+            v = re.split(r'\s[#;]', v, maxsplit=1)[0].strip() if sep else 'true'
+            values.append(v[1:-1] if len(v) >= 2 and v[0] == v[-1] == '"' else v)
+        return values
+
+
+class SessionIndex:
+    """On-disk index of wts sessions, kept in ~/.cache/wts/index.json.
+
+    Maps each session to its directory, its worktrees (repo, path, branch)
+    and when it was last used. create, --add and --done keep it current;
+    reconcile() folds in whatever changed behind wts's back (sessions killed
+    by hand, branches switched, worktrees deleted) from a single
+    list-sessions call and the worktrees' HEAD files, without running git.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else self.default_path()
+
+    @staticmethod
+    def default_path():
+        return cache_dir() / 'index.json'
+
+    def load(self):
+        """Returns {session: entry}; a missing or unreadable index is empty."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return {}
+        return data.get('sessions', {})
+
+    def _save(self, sessions):
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix='.index-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'version': self.VERSION, 'sessions': sessions}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def _update(self, change):
+        """Applies change(sessions) under the index lock; failures only warn.
+
+        change returns False when it left sessions untouched.
+        """
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.with_suffix('.lock'), 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                sessions = self.load()
+                if change(sessions) is not False:
+                    self._save(sessions)
+                return sessions
+        except OSError as e:
+            print(f"Warning: could not update {self.path}: {e}", file=sys.stderr)
+            return None
+
+    @staticmethod
+    def _worktree_entry(repo_root, path):
+        repo = GitRepo.discover(path) if Path(path).is_dir() else None
+        if not repo or not repo.worktree:
+            return {'repo': str(repo_root), 'path': str(path), 'branch': None, 'head': None}
+        head = str(repo.git_dir / 'HEAD') if repo.native else None
+        return {'repo': str(repo_root), 'path': str(path), 'branch': repo.head_branch(), 'head': head}
+
+    @staticmethod
+    def _refresh_worktree(w):
+        """Re-reads the branch from the worktree's HEAD file; False if the worktree is gone."""
+        if not os.path.isdir(w['path']):
+            return False
+        if w.get('head'):
+            try:
+                with open(w['head']) as f:
+                    content = f.read().strip()
+            except OSError:
+                return False
+            prefix = 'ref: refs/heads/'
+            w['branch'] = content[len(prefix):] if content.startswith(prefix) else 'HEAD'
+        return True
+
+    def record(self, session, path=None, worktrees=()):
+        """Marks session as used now, adding (repo_root, worktree) pairs to it."""
+        added = [self._worktree_entry(repo_root, wt) for repo_root, wt in worktrees]
+
+        def change(sessions):
+            entry = sessions.setdefault(session, {'path': None, 'worktrees': []})
+            entry['last_used'] = time.time()
+            if path:
+                entry['path'] = str(path)
+            known = {w['path'] for w in added}
+            entry['worktrees'] = [w for w in entry['worktrees'] if w['path'] not in known] + added
+
+        self._update(change)
+
+    def remove(self, session):
+        # Returning False skips the write when the session was not indexed
+        self._update(lambda sessions: sessions.pop(session, None) is not None)
+
+    @staticmethod
+    def _live_sessions():
+        """{name: (last activity, path)} from one tmux process; None if tmux is unreachable."""
+        res = run_command(['tmux', 'list-sessions', '-F',
+                           '#{session_name}\t#{session_activity}\t#{session_path}'],
+                          check=False, capture_output=True)
+        if res is None:
+            return None
+        live = {}
+        for line in res.stdout.splitlines() if res.returncode == 0 else []:
+            parts = line.split('\t')
+            if len(parts) == 3:
+                live[parts[0]] = (int(parts[1]) if parts[1].isdigit() else 0, parts[2])
+        return live
+
+    def reconcile(self):
+        """Brings the index in line with tmux and the file system; returns it.
+
+        Sessions tmux has but the index lacks are added; indexed sessions
+        that are gone are dropped, unless a worktree of theirs survives
+        under ~/worktrees: those stay, marked 'live': False. Worktrees that
+        are gone are dropped too, except from live sessions.
+        """
+        live = self._live_sessions()
+        managed = os.path.join(Path.home(), 'worktrees', '')
+
+        def change(sessions):
+            before = json.dumps(sessions, sort_keys=True)
+            for name, (activity, path) in (live or {}).items():
+                if name not in sessions:
+                    repo = GitRepo.discover(path) if path and Path(path).is_dir() else None
+                    worktrees = [self._worktree_entry(repo.repo_root, repo.worktree)] \
+                        if repo and repo.worktree else []
+                    sessions[name] = {'path': path, 'worktrees': worktrees, 'last_used': 0}
+                entry = sessions[name]
+                entry['last_used'] = max(entry.get('last_used', 0), activity)
+            for name in list(sessions):
+                entry = sessions[name]
+                entry['live'] = name in (live or {})
+                # A live session keeps its missing worktrees: --restore recreates them
+                entry['worktrees'] = [w for w in entry['worktrees'] if self._refresh_worktree(w) or entry['live']]
+                owned = any(w['path'].startswith(managed) for w in entry['worktrees'])
+                if live is not None and not entry['live'] and not owned:
+                    del sessions[name]
+            return json.dumps(sessions, sort_keys=True) != before
+
+        sessions = self._update(change)
+        return sessions if sessions is not None else self.load()
+
+
+class SessionLayout:
+    """Windows and panes of a new session, declared under [layout] in .wts.toml.
+
+        [[layout.windows]]
+        name = "Agent"
+        panes = [
+          { title = "Agent", agent = true },
+          { title = "Editor", command = "nvim .", split = "h", size = "60%" },
+        ]
+
+    Each pane after the first splits the one before it ('h': side by side,
+    'v': stacked); size goes to split-window -l, agent = true runs
+    $WTS_AGENT_CMD and focus = true selects the pane at the end. A window
+    may also name a tmux preset (layout = "main-vertical"). Layouts compile
+    to a flat tmux script cached under ~/.cache/wts/layouts by a hash of the
+    file, so however many panes they have, applying one is a single
+    source-file.
+    """
+
+    DEFAULT = {'windows': [{'name': 'Agent', 'panes': [
+        {'title': 'Agent', 'agent': True},
+        {'title': 'Editor', 'command': 'nvim .', 'split': 'h'},
+    ]}]}
+
+    # Stand-ins for the per-session values in a cached script
+    SESSION = '@WTS_SESSION@'
+    CWD = '@WTS_CWD@'
+    # Part of the cache key: bump when the compiled form changes
+    VERSION = 1
+
+    def __init__(self, spec):
+        self.windows = self._validate(spec)
+
+    @staticmethod
+    def _validate(spec):
+        windows = spec.get('windows') if isinstance(spec, dict) else None
+        if not isinstance(windows, list) or not windows:
+            raise ValueError("layout needs at least one [[layout.windows]] entry")
+        for w, window in enumerate(windows, 1):
+            panes = window.get('panes') if isinstance(window, dict) else None
+            if not isinstance(panes, list) or not panes or not all(isinstance(p, dict) for p in panes):
+                raise ValueError(f"layout window {w} needs a non-empty list of panes")
+            for pane in panes:
+                if pane.get('split', 'h') not in ('h', 'v'):
+                    raise ValueError(f"layout window {w}: split must be 'h' or 'v', not {pane['split']!r}")
+                size = str(pane.get('size', '1'))
+                if not re.fullmatch(r'\d+%?', size):
+                    raise ValueError(f"layout window {w}: size must be a number or a percentage, not {size!r}")
+        return windows
+
+    def commands(self, session, cwd, agent_cmd=None):
+        """The tmux commands that build the layout for session, starting in cwd."""
+        commands, focus = [], None
+        for w, window in enumerate(self.windows):
+            target = f'{session}:{w}'
+            name = str(window.get('name', f'window{w}'))
+            if w == 0:
+                commands.append(['new-session', '-d', '-s', session, '-c', cwd])
+                commands.append(['rename-window', '-t', target, name])
+            else:
+                commands.append(['new-window', '-d', '-t', target, '-n', name, '-c', cwd])
+            for p, pane in enumerate(window['panes']):
+                if p:
+                    split = ['split-window', f"-{pane.get('split', 'h')}", '-t', f'{target}.{p - 1}', '-c', cwd]
+                    if 'size' in pane:
+                        split[2:2] = ['-l', str(pane['size'])]
+                    commands.append(split)
+                if pane.get('title'):
+                    commands.append(['select-pane', '-t', f'{target}.{p}', '-T', str(pane['title'])])
+                command = agent_cmd if pane.get('agent') else pane.get('command')
+                if command:
+                    commands.append(['send-keys', '-t', f'{target}.{p}', str(command), 'Enter'])
+                if pane.get('focus') or window.get('focus') and p == 0:
+                    focus = focus or (w, p)
+            if window.get('layout'):
+                commands.append(['select-layout', '-t', target, str(window['layout'])])
+        w, p = focus or (0, 0)
+        if len(self.windows) > 1:
+            commands.append(['select-window', '-t', f'{session}:{w}'])
+        commands.append(['select-pane', '-t', f'{session}:{w}.{p}'])
+        return commands
+
+    def script(self, agent_cmd=None):
+        """The layout as a tmux script, with placeholders for the session and directory."""
+        return ''.join(' '.join(TmuxClient._quote(arg) for arg in command) + '\n'
+                       for command in self.commands(self.SESSION, self.CWD, agent_cmd))
+
+    @classmethod
+    def render(cls, script, session, cwd):
+        escape = lambda value: re.sub(r'([\\"$])', r'\\\1', value)
+        return script.replace(cls.SESSION, escape(session)).replace(cls.CWD, escape(cwd))
+
+    @classmethod
+    def compiled(cls, repo_root, agent_cmd=None):
+        """The cached script for repo_root's layout, compiling it on a miss.
+
+        Returns None when the repo declares no layout (also cached, as an
+        empty script) or .wts.toml cannot be read.
+        """
+        try:
+            source = (Path(repo_root) / WtsManager._SPARSE_FILE).read_bytes()
+        except OSError:
+            return None
+        key = hashlib.sha256(f'{cls.VERSION}\0{agent_cmd or ""}\0'.encode() + source).hexdigest()
+        cached = cache_dir() / 'layouts' / f'{key}.tmux'
+        try:
+            return cached.read_text() or None
+        except OSError:
+            pass
+        if tomllib is None:
+            return None
+        try:
+            spec = tomllib.loads(source.decode()).get('layout')
+        except (UnicodeDecodeError, tomllib.TOMLDecodeError) as e:
+            raise ValueError(f"cannot read layout from {Path(repo_root) / WtsManager._SPARSE_FILE}: {e}")
+        script = cls(spec).script(agent_cmd) if spec else ''
+        try:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cached.parent, prefix='.layout-')
+            with os.fdopen(fd, 'w') as f:
+                f.write(script)
+            os.replace(tmp, cached)
+        except OSError:
+            pass
+        return script or None
 
 
 class WtsManager:
     """Manages git worktrees and tmux sessions."""
 
-    def __init__(self, name=None, no_worktree=False, attach=False):
+    def __init__(self, name=None, no_worktree=False, attach=False, background_fetch=False):
         self.name = name
         self.no_worktree = no_worktree
         self.attach = attach
+        self.background_fetch = background_fetch
         self.user = os.environ.get('USER', '').lower()
         self.repo_root = None
         self.repo_name = None
@@ -22,20 +729,19 @@ class WtsManager:
         self.full_branch_name = None
         self.session_name = None
         self.target_dir = Path.cwd()
+        self.git = None
+        self.tmux = TmuxClient()
 
-        self._detect_git()
-        self._setup_names()
+        with timed('phase', 'detect git'):
+            self._detect_git()
+            self._setup_names()
 
     def _detect_git(self):
         """Detects if we are inside a git repository and sets repo info."""
         try:
-            res = run_command(['git', 'rev-parse', '--git-common-dir'], capture_output=True, check=False)
-            if res and res.returncode == 0:
-                common_dir = os.path.abspath(res.stdout.strip())
-                if common_dir.endswith('/.git'):
-                    self.repo_root = os.path.dirname(common_dir)
-                else:
-                    self.repo_root = common_dir
+            self.git = GitRepo.discover(Path.cwd())
+            if self.git:
+                self.repo_root = str(self.git.repo_root)
                 self.in_git = True
                 self.repo_name = os.path.basename(self.repo_root)
         except Exception:
@@ -57,8 +763,7 @@ class WtsManager:
             return
 
         if not self.branch_name:
-            res = run_command(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], capture_output=True)
-            self.branch_name = res.stdout.strip()
+            self.branch_name = self.git.head_branch()
 
         # Prefix format: {user}/{repo}-{branch}
         prefix = f"{self.user}/{self.repo_name}-"
@@ -75,74 +780,109 @@ class WtsManager:
             self._attach()
             return
 
+        sync = None
         if self.in_git and not self.no_worktree:
             self.target_dir = Path.home() / "worktrees" / self.repo_name / self.branch_name
-            run_command(['git', '-C', self.repo_root, 'rst'], check=False)
-            self._ensure_worktree()
-
-        created = self._ensure_tmux_session()
+            if self.background_fetch:
+                # Branch from the last-fetched trunk now; the fetch catches up in the background
+                with timed('phase', 'worktree'):
+                    new_branch = self._ensure_worktree(start_point=self.git.trunk_ref())
+                sync = (self.repo_root, self.session_name, self.target_dir if new_branch else None)
+            else:
+                with timed('phase', 'rst'):
+                    run_command(['git', '-C', self.repo_root, 'rst'], check=False)
+                with timed('phase', 'worktree'):
+                    self._ensure_worktree()
+
+        with timed('phase', 'tmux layout'):
+            created = self._ensure_tmux_session()
+        if sync:
+            # Only now: the sync reports into the session's options
+            self._spawn_trunk_sync(*sync)
         if created:
-            self._save_resurrect_state()
+            with timed('phase', 'resurrect save'):
+                self._save_resurrect_state(self._resurrect_save_script(self.tmux))
+        with timed('phase', 'index'):
+            worktrees = [(self.repo_root, self.target_dir)] if self.in_git and not self.no_worktree else []
+            SessionIndex().record(self.session_name, self.target_dir, worktrees)
+            self._maybe_spawn_gc()
         self._switch()
 
     def _attach(self):
         """Attaches to an existing session."""
-        res = subprocess.run(['tmux', 'has-session', '-t', f'={self.session_name}'], capture_output=True)
-        if res.returncode == 0:
+        if self.tmux.has_session(self.session_name):
+            SessionIndex().record(self.session_name)
             self._switch()
         else:
+            self.tmux.close()
             sys.exit(0)
 
-    def _ensure_worktree(self):
-        """Ensures the git worktree exists."""
-        if self.target_dir.exists():
-            return
-
-        self.target_dir.parent.mkdir(parents=True, exist_ok=True)
+    def _ensure_worktree(self, start_point=None):
+        """Ensures the git worktree exists. Returns True if a new branch was created.
 
-        target_branch = self.full_branch_name
-        # Check if the fully prefixed branch exists
-        if subprocess.run(['git', 'show-ref', '--verify', '--quiet', f'refs/heads/{self.full_branch_name}']).returncode != 0:
-            # Check for the unprefixed branch (backward compatibility)
-            if subprocess.run(['git', 'show-ref', '--verify', '--quiet', f'refs/heads/{self.branch_name}']).returncode == 0:
-                target_branch = self.branch_name
-            else:
-                run_command(['git', 'branch', self.full_branch_name])
-                target_branch = self.full_branch_name
-
-        print(f"Creating worktree for branch '{target_branch}' at {self.target_dir}...")
-        run_command(['git', 'worktree', 'add', str(self.target_dir), target_branch])
+        A new branch starts at start_point when given, otherwise at HEAD.
+        """
+        # Pinned to this worktree's HEAD, since the git commands run in repo_root
+        start_point = start_point or self.git.commit_of('HEAD')
+        return self._create_worktree(self.repo_root, self.target_dir, self.full_branch_name,
+                                     self.branch_name, start_point)
 
     def _ensure_tmux_session(self):
         """Ensures the tmux session exists. Returns True if a new session was created."""
-        res = subprocess.run(['tmux', 'has-session', '-t', f'={self.session_name}'], capture_output=True)
-        if res.returncode == 0:
+        if self.tmux.has_session(self.session_name):
             return False
 
         print(f"Creating new tmux session '{self.session_name}'...")
-        run_command(['tmux', 'new-session', '-d', '-s', self.session_name, '-c', str(self.target_dir)])
-
-        # Initial layout
-        run_command(['tmux', 'rename-window', '-t', f'{self.session_name}:0', 'Agent'])
-        run_command(['tmux', 'select-pane', '-t', f'{self.session_name}:0.0', '-T', 'Agent'])
-        run_command(['tmux', 'split-window', '-h', '-t', f'{self.session_name}:0', '-c', str(self.target_dir)])
-        run_command(['tmux', 'select-pane', '-t', f'{self.session_name}:0.1', '-T', 'Editor'])
-        run_command(['tmux', 'send-keys', '-t', f'{self.session_name}:0.1', 'nvim .', 'Enter'])
+        script = SessionLayout.compiled(self.repo_root, os.environ.get('WTS_AGENT_CMD')) \
+            if self.repo_root else None
+        if script:
+            self._source_layout(script)
+        else:
+            self.tmux.batch(self._layout_commands())
+        return True
 
-        agent_cmd = os.environ.get('WTS_AGENT_CMD')
-        if agent_cmd:
-            run_command(['tmux', 'send-keys', '-t', f'{self.session_name}:0.0', agent_cmd, 'Enter'])
+    def _layout_commands(self):
+        """Returns the tmux commands that build the default Agent + Editor layout."""
+        return SessionLayout(SessionLayout.DEFAULT).commands(
+            self.session_name, str(self.target_dir), os.environ.get('WTS_AGENT_CMD'))
 
-        run_command(['tmux', 'select-pane', '-t', f'{self.session_name}:0.0'])
-        return True
+    def _source_layout(self, script):
+        """Applies a compiled layout script to this session with one source-file."""
+        rendered = SessionLayout.render(script, self.session_name, str(self.target_dir))
+        fd, path = tempfile.mkstemp(prefix='wts-layout-', suffix='.tmux')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(rendered)
+            self.tmux.source_file(path, rendered.count('\n'), check=True)
+        finally:
+            os.unlink(path)
 
     def _switch(self):
         """Switches the current client to the session."""
         if 'TMUX' in os.environ:
-            run_command(['tmux', 'refresh-client', '-S'])
-            os.execvp('tmux', ['tmux', 'switch-client', '-t', self.session_name])
+            client = self.tmux.connected and self.tmux.user_client(self.tmux.display('#S'))
+            if client:
+                self.tmux.run(['refresh-client', '-S', '-t', client])
+                self.tmux.run(['switch-client', '-c', client, '-t', self.session_name])
+                self.tmux.close()
+                return
+            self.tmux.run(['refresh-client', '-S'])
+            self.tmux.close()
+            self._exec(['tmux', 'switch-client', '-t', self.session_name])
         else:
-            os.execvp('tmux', ['tmux', 'attach-session', '-t', self.session_name])
+            self.tmux.close()
+            self._exec(['tmux', 'attach-session', '-t', self.session_name])
+
+    @staticmethod
+    def _exec(argv):
+        """Replaces this process with argv; timings are reported first, as exec skips atexit.
+
+        Under the daemon the client process is the one replaced.
+        """
+        if WtsDaemon.serving:
+            raise _Handoff(argv)
+        finish_timings()
+        os.execvp(argv[0], argv)
 
     # ------------------------------------------------------------------
     # Helpers shared between create and --add flows
@@ -156,48 +896,392 @@ class WtsManager:
         return short_name
 
     @staticmethod
-    def _create_worktree(repo_root, worktree_path, full_branch, short_branch):
+    def _branch_args(branch, start_point=None):
+        """git branch arguments; --no-track keeps a remote-tracking start point from becoming upstream."""
+        if start_point:
+            return ['branch', '--no-track', branch, start_point]
+        return ['branch', branch]
+
+    @staticmethod
+    def _create_worktree(repo_root, worktree_path, full_branch, short_branch, start_point=None):
         """Creates a worktree for repo_root at worktree_path, non-interactively.
 
         Prefers full_branch (prefixed), falls back to short_branch for backward
-        compatibility, and creates full_branch from HEAD if neither exists.
+        compatibility, and creates full_branch from start_point (default HEAD)
+        if neither exists. Returns True if a new branch was created.
         """
         if worktree_path.exists():
-            return
+            return False
 
         worktree_path.parent.mkdir(parents=True, exist_ok=True)
 
-        def _branch_exists(branch):
-            res = run_command(
-                ['git', '-C', str(repo_root), 'show-ref', '--verify', '--quiet',
-                 f'refs/heads/{branch}'],
-                check=False,
-            )
-            return res is not None and res.returncode == 0
-
-        if _branch_exists(full_branch):
+        repo = GitRepo.discover(repo_root)
+        new_branch = False
+        if repo.branch_exists(full_branch):
             target = full_branch
-        elif _branch_exists(short_branch):
+        elif repo.branch_exists(short_branch):
             target = short_branch
         else:
-            run_command(['git', '-C', str(repo_root), 'branch', full_branch])
             target = full_branch
+            new_branch = True
+
+        if WtsManager._pool_size():
+            if new_branch and start_point is None:
+                # A spare sits at trunk as of its refill; branch from what the
+                # repo's HEAD (just reset by 'git rst') points at instead.
+                start_point = repo.commit_of('HEAD')
+            claimed = WtsManager._claim_pooled_worktree(repo_root, worktree_path, target, new_branch, start_point)
+            WtsManager._spawn_background(['--refill-pool', str(repo_root)])
+            if claimed:
+                WtsManager._seed_worktree(repo_root, worktree_path)
+                return new_branch
+            new_branch = new_branch and not GitRepo.discover(repo_root).branch_exists(target)
+
+        if new_branch:
+            run_command(['git', '-C', str(repo_root)] + WtsManager._branch_args(full_branch, start_point))
 
         print(f"Creating worktree for branch '{target}' at {worktree_path}...")
-        run_command(['git', '-C', str(repo_root), 'worktree', 'add', str(worktree_path), target])
+        WtsManager._add_worktree(repo_root, worktree_path, [target])
+        WtsManager._seed_worktree(repo_root, worktree_path)
+        return new_branch
+
+    # ------------------------------------------------------------------
+    # Sparse profiles: check out only the directories a repo's sessions use
+    # ------------------------------------------------------------------
+
+    _SPARSE_CONFIG = 'wts.sparse'
+    _SPARSE_FILE = '.wts.toml'
+
+    @staticmethod
+    def _repo_paths(repo_root, config_key, table):
+        """A per-repo list of paths: the multi-valued git config config_key,
+        falling back to `paths` in the [table] of a .wts.toml at the repo root."""
+        repo = GitRepo.discover(repo_root)
+        paths = repo.config_values(config_key) if repo else []
+        if paths:
+            return paths
+        toml_file = Path(repo_root) / WtsManager._SPARSE_FILE
+        if tomllib is None or not toml_file.is_file():
+            return []
+        try:
+            with open(toml_file, 'rb') as f:
+                paths = tomllib.load(f).get(table, {}).get('paths', [])
+        except (OSError, tomllib.TOMLDecodeError) as e:
+            print(f"Warning: ignoring {toml_file}: {e}", file=sys.stderr)
+            return []
+        return [p for p in paths if isinstance(p, str)]
+
+    @staticmethod
+    def _sparse_profile(repo_root):
+        """Directories to check out in new worktrees of repo_root, or [] for all.
+
+        Read from the repo's git config (multi-valued wts.sparse), falling
+        back to `paths` in the [sparse] table of a .wts.toml at the repo root.
+        """
+        return WtsManager._repo_paths(repo_root, WtsManager._SPARSE_CONFIG, 'sparse')
+
+    @staticmethod
+    def _add_worktree(repo_root, worktree_path, args, check=True, quiet=False):
+        """git worktree add worktree_path <args>, applying the repo's sparse profile.
+
+        With a profile the worktree is added with --no-checkout, restricted
+        with cone-mode sparse-checkout and only then populated, so only the
+        profile's files are written (and, in a partial clone, fetched).
+        Returns True on success.
+        """
+        profile = WtsManager._sparse_profile(repo_root)
+        add = ['git', '-C', str(repo_root), 'worktree', 'add'] + (['--quiet'] if quiet else [])
+        if not profile:
+            steps = [add + [str(worktree_path)] + args]
+        else:
+            steps = [
+                add + ['--no-checkout', str(worktree_path)] + args,
+                ['git', '-C', str(worktree_path), 'sparse-checkout', 'set', '--cone'] + profile,
+                ['git', '-C', str(worktree_path), 'read-tree', '-m', '-u', 'HEAD'],
+            ]
+        for step in steps:
+            res = run_command(step, check=check, capture_output=quiet)
+            if res is None or res.returncode != 0:
+                return False
+        return True
+
+    # ------------------------------------------------------------------
+    # Build-artifact seeding: new worktrees start with a sibling's caches
+    # ------------------------------------------------------------------
+
+    _SEED_CONFIG = 'wts.seed'
+
+    @staticmethod
+    def _seed_rules(repo_root):
+        """Cacheable directories (node_modules, target, ...) relative to a worktree.
+
+        Read from the repo's git config (multi-valued wts.seed), falling back
+        to `paths` in the [seed] table of its .wts.toml. Absolute paths and
+        ones climbing out with '..' are ignored.
+        """
+        rules = WtsManager._repo_paths(repo_root, WtsManager._SEED_CONFIG, 'seed')
+        return [r.strip('/') for r in rules
+                if r.strip('/') and not os.path.isabs(r) and '..' not in Path(r).parts]
+
+    @staticmethod
+    def _seed_source(repo_root, worktree_path, rules):
+        """The sibling checkout whose cached directories changed last, or None.
+
+        Siblings are the other worktrees under ~/worktrees/<repo> and the
+        main checkout. A cache directory's stamp is the newest mtime of it and
+        its direct entries: a rebuild rewrites files below the top level, which
+        leaves the top directory's own mtime alone.
+        """
+        parent = Path.home() / 'worktrees' / Path(repo_root).name
+        candidates = list(WtsManager._checkouts(parent)) if parent.is_dir() else []
+        best, newest = None, 0
+        for checkout in candidates + [Path(repo_root)]:
+            if checkout == Path(worktree_path):
+                continue
+            for rule in rules:
+                stamp = WtsManager._cache_stamp(checkout / rule)
+                if stamp > newest:
+                    best, newest = checkout, stamp
+        return best
+
+    @staticmethod
+    def _cache_stamp(path):
+        """Newest mtime of directory path and its direct entries; 0 if it is not a directory."""
+        try:
+            st = os.lstat(path)
+            if not stat.S_ISDIR(st.st_mode):
+                return 0
+            with os.scandir(path) as entries:
+                return max([st.st_mtime] + [e.stat(follow_symlinks=False).st_mtime for e in entries])
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _link_or_copy(src, dst):
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    @staticmethod
+    def _clone_tree(src, dst):
+        """Copies the directory src to dst, cheaply; returns 'reflink' or 'hardlink'.
+
+        Copy-on-write clones (cp -c on APFS, --reflink on btrfs/XFS) share
+        blocks until either side writes. Where the file system cannot clone,
+        files are hard-linked, so a tool rewriting a file in place rather
+        than replacing it changes the sibling's copy too.
+        """
+        cp = ['cp', '-c', '-R', '-p'] if is_darwin() else ['cp', '-a', '--reflink=always']
+        res = run_command(cp + [str(src), str(dst)], check=False, capture_output=True)
+        if res is not None and res.returncode == 0:
+            return 'reflink'
+        shutil.rmtree(dst, ignore_errors=True)
+        shutil.copytree(src, dst, symlinks=True, copy_function=WtsManager._link_or_copy)
+        return 'hardlink'
+
+    @staticmethod
+    def _seed_worktree(repo_root, worktree_path):
+        """Seeds a new worktree's cacheable directories from its most recent sibling."""
+        rules = WtsManager._seed_rules(repo_root)
+        if not rules:
+            return
+        with timed('phase', 'seed caches'):
+            source = WtsManager._seed_source(repo_root, worktree_path, rules)
+            if source is None:
+                return
+            for rule in rules:
+                src, dst = source / rule, Path(worktree_path) / rule
+                if not src.is_dir() or src.is_symlink() or os.path.lexists(dst):
+                    continue
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    how = WtsManager._clone_tree(src, dst)
+                except (OSError, shutil.Error) as e:
+                    print(f"Warning: could not seed {rule} from {source}: {e}", file=sys.stderr)
+                    shutil.rmtree(dst, ignore_errors=True)
+                    continue
+                print(f"Seeded {rule} from {source} ({how})")
+
+    # ------------------------------------------------------------------
+    # Worktree pool: spare detached checkouts of trunk, claimed by new sessions
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _pool_size():
+        """Spare worktrees to keep per repo (WTS_POOL_SIZE, default 0: no pool)."""
+        try:
+            return max(0, int(os.environ.get('WTS_POOL_SIZE', '0')))
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def _pool_dir(repo_root):
+        return Path.home() / "worktrees" / Path(repo_root).name / ".pool"
+
+    @staticmethod
+    def _move_worktree(repo_root, src, dst):
+        """git worktree move; doubles as an atomic claim when several wts race for src."""
+        res = run_command(['git', '-C', str(repo_root), 'worktree', 'move', str(src), str(dst)],
+                          check=False, capture_output=True)
+        return res is not None and res.returncode == 0
+
+    @staticmethod
+    def _discard_worktree(repo_root, worktree):
+        if WtsManager._move_to_trash(worktree):
+            run_command(['git', '-C', str(repo_root), 'worktree', 'prune'], check=False)
+            WtsManager._spawn_background(['--purge-trash'])
+        else:
+            run_command(['git', '-C', str(repo_root), 'worktree', 'remove', '--force', str(worktree)], check=False)
+
+    @staticmethod
+    def _claim_pooled_worktree(repo_root, worktree_path, branch, create, start_point):
+        """Moves a spare worktree to worktree_path and switches it to branch.
+
+        The spare is already checked out at trunk, so only the difference to
+        the branch is written. Returns False (leaving worktree_path absent) if
+        the pool is empty or the switch fails.
+        """
+        pool = WtsManager._pool_dir(repo_root)
+        slots = sorted(p for p in pool.iterdir() if not p.name.startswith('.')) if pool.is_dir() else []
+        if not any(WtsManager._move_worktree(repo_root, slot, worktree_path) for slot in slots):
+            return False
+
+        print(f"Claiming pooled worktree for branch '{branch}' at {worktree_path}...")
+        if create:
+            switch = ['switch', '--quiet', '--no-track', '-c', branch] + ([start_point] if start_point else [])
+        else:
+            switch = ['switch', '--quiet', branch]
+        res = run_command(['git', '-C', str(worktree_path)] + switch, check=False)
+        if res is None or res.returncode != 0:
+            WtsManager._discard_worktree(repo_root, worktree_path)
+            return False
+        return True
+
+    @staticmethod
+    def refill_pool(repo_root):
+        """Tops the repo's pool up to WTS_POOL_SIZE and moves stale spares to trunk.
+
+        Runs detached after every claim. A lock file keeps concurrent refills
+        from stepping on each other; spares being rebuilt or refreshed carry
+        a dot-prefixed name so that claimers skip them.
+        """
+        size = WtsManager._pool_size()
+        pool = WtsManager._pool_dir(repo_root)
+        if not size:
+            return
+        pool.mkdir(parents=True, exist_ok=True)
+        with open(pool / '.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+
+            repo = GitRepo.discover(repo_root)
+            trunk = repo.commit_of(repo.trunk_ref() or 'HEAD')
+            if not trunk:
+                return
+
+            # Leftovers of an interrupted refill
+            for stray in pool.iterdir():
+                if stray.name.startswith('.') and stray.name != '.lock':
+                    WtsManager._discard_worktree(repo_root, stray)
+
+            slots = [p for p in pool.iterdir() if not p.name.startswith('.')]
+            for slot in slots:
+                spare = GitRepo.discover(slot)
+                if spare is None or spare.worktree != slot:
+                    continue
+                if spare.commit_of('HEAD') == trunk:
+                    continue
+                work = pool / f'.refresh-{slot.name}'
+                if not WtsManager._move_worktree(repo_root, slot, work):
+                    continue
+                res = run_command(['git', '-C', str(work), 'checkout', '--quiet', '--detach', trunk],
+                                  check=False, capture_output=True)
+                if res is None or res.returncode != 0 or not WtsManager._move_worktree(repo_root, work, slot):
+                    WtsManager._discard_worktree(repo_root, work)
+
+            for _ in range(size - len(slots)):
+                name = f'spare-{os.urandom(4).hex()}'
+                work = pool / f'.build-{name}'
+                if not WtsManager._add_worktree(repo_root, work, ['--detach', trunk], check=False, quiet=True):
+                    break
+                WtsManager._move_worktree(repo_root, work, pool / name)
+
+    # ------------------------------------------------------------------
+    # Background trunk sync
+    # ------------------------------------------------------------------
+
+    _STATUS_OPTION = '@wts-status'
+    _STATUS_LINGER = 5  # seconds a finished sync stays in the status line
+
+    @staticmethod
+    def _spawn_background(args):
+        """Runs 'wts <args>' in a detached process that outlives this one and its session."""
+        with timed('spawn', ' '.join(['wts'] + args)):
+            subprocess.Popen(
+                [sys.executable, os.path.join(get_repo_root(), 'scripts', 'wts')] + args,
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                start_new_session=True,
+            )
+
+    @staticmethod
+    def _spawn_trunk_sync(repo_root, session_name, worktree=None):
+        """Starts sync_trunk in the background."""
+        args = ['--sync-trunk', str(repo_root), session_name] + ([str(worktree)] if worktree else [])
+        WtsManager._spawn_background(args)
+
+    @staticmethod
+    def _set_status(session_name, text):
+        """Sets the session's status-line text; None unsets it."""
+        if text:
+            command = ['set-option', '-t', f'={session_name}', WtsManager._STATUS_OPTION, text]
+        else:
+            command = ['set-option', '-u', '-t', f'={session_name}', WtsManager._STATUS_OPTION]
+        subprocess.run(['tmux'] + command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    @staticmethod
+    def _final_status(session_name, text):
+        """Shows a sync's last status for a while, then unsets it unless something replaced it."""
+        WtsManager._set_status(session_name, text)
+        time.sleep(WtsManager._STATUS_LINGER)
+        res = subprocess.run(['tmux', 'show-options', '-t', f'={session_name}', '-v', WtsManager._STATUS_OPTION],
+                             capture_output=True, text=True)
+        if res.returncode == 0 and res.stdout.strip() == text:
+            WtsManager._set_status(session_name, None)
+
+    @staticmethod
+    def sync_trunk(repo_root, session_name, worktree=None):
+        """Runs 'git rst' on repo_root, then fast-forwards worktree's branch to the new trunk.
+
+        Progress goes to the session's @wts-status option, which tmux.conf
+        shows in status-right.
+        """
+        repo_name = Path(repo_root).name
+        WtsManager._set_status(session_name, f'{repo_name}: fetching trunk')
+        res = run_command(['git', '-C', str(repo_root), 'rst'], check=False, capture_output=True)
+        if not res or res.returncode != 0:
+            WtsManager._final_status(session_name, f'{repo_name}: fetch failed')
+            return
+        if worktree:
+            trunk = GitRepo.discover(repo_root).trunk_ref()
+            res = run_command(['git', '-C', str(worktree), 'merge', '--ff-only', '--quiet', trunk],
+                              check=False, capture_output=True) if trunk else None
+            if not res or res.returncode != 0:
+                WtsManager._final_status(session_name, f"{repo_name}: trunk moved, run 'git rb'")
+                return
+        WtsManager._final_status(session_name, f'{repo_name}: trunk up to date')
 
     # ------------------------------------------------------------------
     # tmux-resurrect integration
     # ------------------------------------------------------------------
 
     @staticmethod
-    def _resurrect_save_script():
-        """Returns the path to the resurrect save.sh if installed, else None."""
+    def _lookup_resurrect_save_script(tmux):
+        """Asks tmux for the resurrect save.sh; None if the plugin is not installed."""
         # Try the tmux option the plugin sets at load time
-        res = subprocess.run(
-            ['tmux', 'show-options', '-gv', '@resurrect-save-script-path'],
-            capture_output=True, text=True,
-        )
+        res = tmux.run(['show-options', '-gv', '@resurrect-save-script-path'])
         if res.returncode == 0 and res.stdout.strip():
             path = Path(res.stdout.strip())
             if path.exists():
@@ -207,15 +1291,89 @@ class WtsManager:
         return fallback if fallback.exists() else None
 
     @staticmethod
-    def _save_resurrect_state():
-        """Triggers a tmux-resurrect save; silently skips if not installed."""
-        script = WtsManager._resurrect_save_script()
+    def _resurrect_save_script(tmux):
+        """Returns the path to the resurrect save.sh if installed, else None.
+
+        The path is cached in ~/.cache/wts, so the tmux lookup only runs
+        when the cached script has gone away (or resurrect is not installed).
+        """
+        cache = cache_dir() / WtsManager._RESURRECT_CACHE
+        try:
+            path = Path(cache.read_text().strip())
+            if path.is_file():
+                return path
+        except OSError:
+            pass
+        path = WtsManager._lookup_resurrect_save_script(tmux)
+        if path:
+            try:
+                cache.parent.mkdir(parents=True, exist_ok=True)
+                cache.write_text(f'{path}\n')
+            except OSError:
+                pass
+        return path
+
+    _RESURRECT_CACHE = 'resurrect-save-script'
+    _RESURRECT_REQUEST = 'resurrect.request'
+    _RESURRECT_QUIET = 1.0  # seconds without new requests before the save runs
+
+    @staticmethod
+    def _save_resurrect_state(script):
+        """Requests a tmux-resurrect save and returns at once; skips if not installed.
+
+        The save itself runs in a detached saver (save_resurrect) once
+        requests have stopped for a moment, so a burst of wts calls makes
+        one save and no wts waits for save.sh.
+        """
         if not script:
             return
-        subprocess.run(
-            [str(script)],
-            check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
-        )
+        request = cache_dir() / WtsManager._RESURRECT_REQUEST
+        try:
+            request.parent.mkdir(parents=True, exist_ok=True)
+            request.touch()
+        except OSError:
+            return
+        WtsManager._spawn_background(['--save-resurrect'])
+
+    @staticmethod
+    def save_resurrect():
+        """The detached saver: waits for a quiet period, then runs save.sh.
+
+        Only one saver runs at a time (flock). Requests that arrive while
+        it saves make it go round again; a saver that loses the lock leaves
+        its request to the one holding it, which checks once more after
+        letting go, so no request is dropped.
+        """
+        request = cache_dir() / WtsManager._RESURRECT_REQUEST
+
+        def requested():
+            try:
+                return request.stat().st_mtime
+            except OSError:
+                return None
+
+        saved = None
+        while True:
+            with open(cache_dir() / 'resurrect.lock', 'w') as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return
+                while (stamp := requested()) is not None and stamp != saved:
+                    idle = time.time() - stamp
+                    if idle < WtsManager._RESURRECT_QUIET:
+                        time.sleep(WtsManager._RESURRECT_QUIET - idle)
+                        continue
+                    saved = stamp
+                    with TmuxClient() as tmux:
+                        script = WtsManager._resurrect_save_script(tmux)
+                    if script:
+                        with timed('exec', str(script)) as event:
+                            event['returncode'] = subprocess.run(
+                                [str(script)], check=False,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode
+            if requested() == saved:
+                return
 
     # ------------------------------------------------------------------
     # tmux option helpers for tracking cross-repo worktrees
@@ -224,12 +1382,9 @@ class WtsManager:
     _TMUX_OPTION = '@wts-added-repos'
 
     @staticmethod
-    def _get_added_repos(session_name):
+    def _get_added_repos(tmux, session_name):
         """Returns the list of added-repo entries for session_name from the tmux option."""
-        res = subprocess.run(
-            ['tmux', 'show-options', '-t', session_name, '-v', WtsManager._TMUX_OPTION],
-            capture_output=True, text=True,
-        )
+        res = tmux.run(['show-options', '-t', session_name, '-v', WtsManager._TMUX_OPTION])
         if res.returncode != 0 or not res.stdout.strip():
             return []
         try:
@@ -238,65 +1393,89 @@ class WtsManager:
             return []
 
     @staticmethod
-    def _set_added_repos(session_name, entries):
+    def _set_added_repos(tmux, session_name, entries):
         """Persists entries as a tmux option on session_name."""
-        subprocess.run(
-            ['tmux', 'set-option', '-t', session_name, WtsManager._TMUX_OPTION, json.dumps(entries)],
-            check=False,
-        )
+        tmux.run(['set-option', '-t', session_name, WtsManager._TMUX_OPTION, json.dumps(entries)])
 
     @staticmethod
-    def _record_added_worktree(session_name, repo_root, worktree_path):
-        """Appends a cross-repo worktree entry to the session's tmux option (de-duplicated)."""
-        entries = WtsManager._get_added_repos(session_name)
-        entry = {"repo_root": str(repo_root), "worktree": str(worktree_path)}
-        if entry not in entries:
-            entries.append(entry)
-        WtsManager._set_added_repos(session_name, entries)
+    def _record_added_worktrees(tmux, session_name, added):
+        """Appends (repo_root, worktree_path) entries to the session's tmux option in one
+        read and one write (de-duplicated)."""
+        entries = WtsManager._get_added_repos(tmux, session_name)
+        for repo_root, worktree_path in added:
+            entry = {"repo_root": str(repo_root), "worktree": str(worktree_path)}
+            if entry not in entries:
+                entries.append(entry)
+        WtsManager._set_added_repos(tmux, session_name, entries)
 
     # ------------------------------------------------------------------
     # --add command
     # ------------------------------------------------------------------
 
+    _ADD_WORKERS = 4  # concurrent repos for --add; each runs fetch + checkout
+
     @staticmethod
-    def add_session_repo(repo_path_arg):
-        """Adds a worktree for another repo to the current tmux session."""
+    def add_session_repo(repo_path_args, background_fetch=False):
+        """Adds worktrees for other repos to the current tmux session, in parallel."""
         if 'TMUX' not in os.environ:
             print("Error: Must be run inside a tmux session.", file=sys.stderr)
             sys.exit(1)
 
-        res = run_command(['tmux', 'display-message', '-p', '#S'], capture_output=True)
-        short_name = res.stdout.strip() if res else None
-        if not short_name:
-            print("Error: Could not determine current tmux session name.", file=sys.stderr)
-            sys.exit(1)
-
-        repo_path = Path(repo_path_arg).expanduser().resolve()
-        res = run_command(
-            ['git', '-C', str(repo_path), 'rev-parse', '--git-common-dir'],
-            capture_output=True, check=False,
-        )
-        if not res or res.returncode != 0:
-            print(f"Error: '{repo_path}' is not a git repository.", file=sys.stderr)
+        with TmuxClient() as tmux:
+            short_name = tmux.display('#S')
+            if not short_name:
+                print("Error: Could not determine current tmux session name.", file=sys.stderr)
+                sys.exit(1)
+
+            # Validate every path before touching any repo
+            repos = {}
+            for repo_path_arg in repo_path_args:
+                repo_path = Path(repo_path_arg).expanduser().resolve()
+                repo = GitRepo.discover(repo_path) if repo_path.is_dir() else None
+                if not repo:
+                    print(f"Error: '{repo_path}' is not a git repository.", file=sys.stderr)
+                    sys.exit(1)
+                repos.setdefault(repo.repo_root, repo)
+
+            user = os.environ.get('USER', '').lower()
+
+            def add_one(repo):
+                with timed('phase', f'add {repo.repo_root.name}'):
+                    return set_up(repo)
+
+            def set_up(repo):
+                repo_root = repo.repo_root
+                full_branch = WtsManager._prefixed_branch(user, repo_root.name, short_name)
+                worktree = Path.home() / "worktrees" / repo_root.name / short_name
+                if background_fetch:
+                    new_branch = WtsManager._create_worktree(repo_root, worktree, full_branch, short_name,
+                                                             start_point=repo.trunk_ref())
+                    WtsManager._spawn_trunk_sync(repo_root, short_name, worktree if new_branch else None)
+                else:
+                    run_command(['git', '-C', str(repo_root), 'rst'], check=False)
+                    WtsManager._create_worktree(repo_root, worktree, full_branch, short_name)
+                return repo_root, worktree
+
+            added, failed = [], []
+            workers = min(WtsManager._ADD_WORKERS, len(repos))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [(root, pool.submit(add_one, repo)) for root, repo in repos.items()]
+                for repo_root, future in futures:
+                    try:
+                        added.append(future.result())
+                    except Exception as e:
+                        failed.append(repo_root)
+                        print(f"Error: could not add '{repo_root}': {e}", file=sys.stderr)
+
+            if added:
+                WtsManager._record_added_worktrees(tmux, short_name, added)
+                SessionIndex().record(short_name, worktrees=added)
+
+        for _, worktree in added:
+            print(worktree)
+        if failed:
             sys.exit(1)
 
-        common_dir = res.stdout.strip()
-        if not os.path.isabs(common_dir):
-            common_dir = os.path.join(str(repo_path), common_dir)
-        common_dir = os.path.abspath(common_dir)
-        repo_root = Path(os.path.dirname(common_dir) if common_dir.endswith('/.git') else common_dir)
-        repo_name = repo_root.name
-
-        user = os.environ.get('USER', '').lower()
-        full_branch = WtsManager._prefixed_branch(user, repo_name, short_name)
-        worktree = Path.home() / "worktrees" / repo_name / short_name
-
-        run_command(['git', '-C', str(repo_root), 'rst'], check=False)
-        WtsManager._create_worktree(repo_root, worktree, full_branch, short_name)
-        WtsManager._record_added_worktree(short_name, repo_root, worktree)
-
-        print(worktree)
-
     # ------------------------------------------------------------------
     # --done command
     # ------------------------------------------------------------------
@@ -308,10 +1487,11 @@ class WtsManager:
             print("Error: Must be run inside a tmux session.", file=sys.stderr)
             sys.exit(1)
 
-        res = run_command(['tmux', 'display-message', '-p', '#S'], capture_output=True)
-        session_name = res.stdout.strip() if res else None
+        tmux = TmuxClient()
+        session_id, _, session_name = tmux.display('#{session_id} #{session_name}').partition(' ')
         if not session_name:
             print("Error: Could not determine current tmux session name.", file=sys.stderr)
+            tmux.close()
             sys.exit(1)
 
         # Detect git and worktree info
@@ -320,17 +1500,13 @@ class WtsManager:
         should_remove_worktree = False
 
         try:
-            res = run_command(['git', 'rev-parse', '--is-inside-work-tree'], capture_output=True, check=False)
-            if res and res.returncode == 0:
-                res = run_command(['git', 'rev-parse', '--show-toplevel'], capture_output=True)
-                worktree_path = Path(res.stdout.strip()) if res else None
-
-                res = run_command(['git', 'rev-parse', '--git-common-dir'], capture_output=True)
-                if res:
-                    common_dir = os.path.abspath(res.stdout.strip())
-                    main_repo = os.path.dirname(common_dir) if common_dir.endswith('/.git') else common_dir
+            repo = GitRepo.discover(Path.cwd())
+            if repo and repo.worktree:
+                worktree_path = repo.worktree
+                main_repo = str(repo.repo_root)
 
-                if worktree_path:
+                # A clone kept under ~/worktrees is not ours to remove
+                if worktree_path and WtsManager._is_linked_worktree(worktree_path):
                     try:
                         worktree_path.relative_to(Path.home() / "worktrees")
                         should_remove_worktree = True
@@ -340,47 +1516,942 @@ class WtsManager:
             pass
 
         # Read cross-repo entries before switching away (tmux option stays readable until kill)
-        added = WtsManager._get_added_repos(session_name)
+        added = WtsManager._get_added_repos(tmux, session_name)
+        # Look the save script up now: the connection may not outlive kill-session
+        save_script = WtsManager._resurrect_save_script(tmux)
 
         # Switch to another session before killing this one
-        other = subprocess.run(
-            ['tmux', 'display-message', '-p', '#{session_id}'],
-            capture_output=True, text=True,
-        ).stdout.strip()
-        sessions = subprocess.run(
-            ['tmux', 'list-sessions', '-F', '#{session_id} #{session_name}'],
-            capture_output=True, text=True,
-        ).stdout.strip().splitlines()
+        sessions = tmux.run(['list-sessions', '-F', '#{session_id} #{session_name}']).stdout.strip().splitlines()
         next_session = next(
-            (parts[1] for line in sessions if (parts := line.split(None, 1)) and parts[0] != other),
+            (parts[1] for line in sessions if (parts := line.split(None, 1)) and parts[0] != session_id),
             None,
         )
-        if next_session:
-            subprocess.run(['tmux', 'switch-client', '-t', next_session])
+        client = tmux.user_client(session_name)
+        if client:
+            if next_session:
+                tmux.run(['switch-client', '-c', client, '-t', next_session])
+            else:
+                tmux.run(['detach-client', '-t', client])
+
+        doomed = [(main_repo, worktree_path)] if should_remove_worktree else []
+        doomed += [(entry['repo_root'], entry['worktree']) for entry in added]
+        with timed('phase', 'remove worktrees'):
+            if WtsManager._remove_worktrees(doomed):
+                WtsManager._spawn_background(['--purge-trash'])
+
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        with timed('phase', 'kill session'):
+            tmux.run(['kill-session', '-t', session_name])
+            tmux.close()
+        with timed('phase', 'index'):
+            SessionIndex().remove(session_name)
+        with timed('phase', 'resurrect save'):
+            WtsManager._save_resurrect_state(save_script)
+
+    # ------------------------------------------------------------------
+    # --list and --pick
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _age(seconds):
+        for unit, size in (('d', 86400), ('h', 3600), ('m', 60)):
+            if seconds >= size:
+                return f'{int(seconds // size)}{unit}'
+        return 'now'
+
+    @staticmethod
+    def _session_rows():
+        """(name, line) per indexed session, most recently used first."""
+        sessions = SessionIndex().reconcile()
+        now = time.time()
+        order = sorted(sessions.items(), key=lambda item: -item[1].get('last_used', 0))
+        width = max((len(name) for name in sessions), default=0)
+        rows = []
+        for name, entry in order:
+            worktrees = ', '.join(f"{Path(w['repo']).name}:{w['branch'] or '?'}" for w in entry['worktrees'])
+            state = '' if entry.get('live') else '(closed) '
+            age = WtsManager._age(now - entry.get('last_used', 0))
+            rows.append((name, f"{name:<{width}}  {age:>4}  {state}{worktrees or entry.get('path') or ''}"))
+        return rows
+
+    @staticmethod
+    def list_sessions():
+        for _, line in WtsManager._session_rows():
+            print(line)
+
+    @staticmethod
+    def pick_session():
+        """Fuzzy-picks an indexed session (fzf, else a numbered prompt) and switches to it.
+
+        A closed session whose worktree survives is reopened in it.
+        """
+        rows = WtsManager._session_rows()
+        if not rows:
+            print("No wts sessions.", file=sys.stderr)
+            sys.exit(1)
+        if shutil.which('fzf'):
+            # Session names may contain spaces: fzf shows the line, hands back name<TAB>line
+            res = subprocess.run(['fzf', '--height=40%', '--reverse', '--prompt=wts> ',
+                                  '--delimiter=\t', '--with-nth=2..'],
+                                 input=''.join(f'{name}\t{line}\n' for name, line in rows),
+                                 stdout=subprocess.PIPE, text=True)
+            name = res.stdout.rstrip('\n').split('\t', 1)[0] if res.returncode == 0 else ''
         else:
-            subprocess.run(['tmux', 'detach-client'])
+            for i, (_, line) in enumerate(rows, 1):
+                print(f'{i:>3}  {line}', file=sys.stderr)
+            try:
+                answer = input('wts> ').strip()
+            except EOFError:
+                answer = ''
+            name = rows[int(answer) - 1][0] if answer.isdigit() and 0 < int(answer) <= len(rows) else ''
+        if not name:
+            sys.exit(1)
 
-        if should_remove_worktree:
-            run_command(['git', '-C', main_repo, 'worktree', 'remove', '--force', str(worktree_path)], check=False)
+        entry = SessionIndex().load().get(name, {})
+        paths = [w['path'] for w in entry.get('worktrees', [])] + [entry.get('path')]
+        path = next((p for p in paths if p and os.path.isdir(p)), None)
+        if path:
+            os.chdir(path)
+        manager = WtsManager(name=name, no_worktree=True)
+        manager.session_name = name
+        if path:
+            manager.target_dir = Path(path)
+        manager.create_session()
 
-        for entry in added:
-            run_command(
-                ['git', '-C', entry['repo_root'], 'worktree', 'remove', '--force', entry['worktree']],
-                check=False,
-            )
+    # ------------------------------------------------------------------
+    # --restore: rebuild missing worktrees when a session is first visited
+    # ------------------------------------------------------------------
 
-        signal.signal(signal.SIGHUP, signal.SIG_IGN)
-        subprocess.run(['tmux', 'kill-session', '-t', session_name])
-        WtsManager._save_resurrect_state()
+    _RESTORE_OPTION = '@wts-restore'
+    # An index of its own, so the hook can be dropped without touching the user's
+    _RESTORE_HOOK = 'client-session-changed[77]'
+    _RESTORE_LOCK = 'restore.lock'
+    _SHELLS = ('sh', 'bash', 'zsh', 'fish', 'dash')
+
+    @staticmethod
+    def _restore_plan(tmux, name, entry):
+        """{'path', 'worktrees'} for the worktrees session name lacks, or None.
+
+        Worktrees come from the index entry and the session's @wts-added-repos
+        option; ones whose repo is gone too are skipped.
+        """
+        wanted = {w['path']: w for w in (entry or {}).get('worktrees', [])}
+        for added in WtsManager._get_added_repos(tmux, name):
+            wanted.setdefault(added['worktree'],
+                              {'repo': added['repo_root'], 'path': added['worktree'], 'branch': None})
+        missing = [{'repo': w['repo'], 'path': w['path'], 'branch': w.get('branch')}
+                   for w in wanted.values() if not os.path.isdir(w['path']) and os.path.isdir(w['repo'])]
+        if not missing:
+            return None
+        return {'path': (entry or {}).get('path'), 'worktrees': missing}
+
+    @staticmethod
+    def _restore_hook():
+        """The client-session-changed hook: restores a pending session a terminal client switched to."""
+        wts = ' '.join(shlex.quote(arg) for arg in (sys.executable, os.path.join(get_repo_root(), 'scripts', 'wts')))
+        shell = f'{wts} --restore-session #{{q:client_session}} >/dev/null 2>&1'
+        # Control-mode clients (wts's own connections among them) do not count as visits
+        condition = f'#{{&&:#{{{WtsManager._RESTORE_OPTION}}},#{{!:#{{client_control_mode}}}}}}'
+        return f'if-shell -F "{condition}" {{ run-shell -b {TmuxClient._quote(shell)} }}'
+
+    @staticmethod
+    def restore():
+        """Marks live sessions whose worktrees are missing (say, after a reboot
+        brought them back through tmux-resurrect) for restoring.
+
+        Nothing is checked out here: a session's worktrees are recreated in
+        the background when a client first switches to it, through a
+        client-session-changed hook. Sessions a client is on right now are
+        restored straight away.
+        """
+        sessions = SessionIndex().reconcile()
+        with TmuxClient() as tmux:
+            res = tmux.run(['list-sessions', '-F', '#{session_name}'])
+            live = res.stdout.splitlines() if res.returncode == 0 else []
+            plans = {}
+            for name in live:
+                plan = WtsManager._restore_plan(tmux, name, sessions.get(name))
+                if plan:
+                    plans[name] = plan
+            if plans:
+                tmux.batch([['set-option', '-t', name, WtsManager._RESTORE_OPTION, json.dumps(plan)]
+                            for name, plan in plans.items()]
+                           + [['set-hook', '-g', WtsManager._RESTORE_HOOK, WtsManager._restore_hook()]])
+            res = tmux.run(['list-clients', '-F', '#{client_control_mode} #{client_session}'])
+            viewed = {line.split(None, 1)[1] for line in res.stdout.splitlines()
+                      if line.startswith('0 ') and len(line.split(None, 1)) == 2}
+
+        for name in sorted(plans):
+            if name in viewed:
+                WtsManager._spawn_background(['--restore-session', name])
+        count = sum(len(plan['worktrees']) for plan in plans.values())
+        if plans:
+            print(f"{count} worktree(s) in {len(plans)} session(s) will be restored when first switched to.")
+        else:
+            print("No missing worktrees.")
+
+    @staticmethod
+    def _take_restore_plan(name):
+        """Reads and clears session name's pending plan, and drops the hook once none is left.
+
+        Serialized by a lock, so a burst of switches restores a session once.
+        """
+        lock_path = cache_dir() / WtsManager._RESTORE_LOCK
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, 'w') as lock, TmuxClient() as tmux:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            res = tmux.run(['show-options', '-t', name, '-v', WtsManager._RESTORE_OPTION])
+            try:
+                plan = json.loads(res.stdout) if res.returncode == 0 and res.stdout.strip() else None
+            except ValueError:
+                plan = None
+            tmux.run(['set-option', '-u', '-t', name, WtsManager._RESTORE_OPTION])
+            res = tmux.run(['list-sessions', '-F', f'#{{{WtsManager._RESTORE_OPTION}}}'])
+            if res.returncode == 0 and not res.stdout.strip():
+                tmux.run(['set-hook', '-gu', WtsManager._RESTORE_HOOK])
+        return plan
+
+    @staticmethod
+    def _restore_worktrees(repo_root, worktrees, user):
+        """Recreates worktrees of one repo on their branches (new ones start at trunk)."""
+        # Missing worktrees are still registered, which blocks re-adding them and their branches
+        run_command(['git', '-C', str(repo_root), 'worktree', 'prune'], check=False)
+        trunk = GitRepo.discover(repo_root).trunk_ref()
+        restored = []
+        for w in worktrees:
+            path = Path(w['path'])
+            branch = w['branch'] if w['branch'] not in (None, 'HEAD') else \
+                WtsManager._prefixed_branch(user, Path(repo_root).name, path.name)
+            WtsManager._create_worktree(repo_root, path, branch, path.name, start_point=trunk)
+            restored.append((repo_root, path))
+        return restored
+
+    @staticmethod
+    def restore_session(name):
+        """Recreates session name's missing worktrees, one worker per repo.
+
+        Runs from the hook when a client first switches to the session.
+        Progress shows in @wts-status; idle shells left in $HOME or / (where
+        tmux starts panes whose directory is gone) are moved to the session's
+        directory.
+        """
+        plan = WtsManager._take_restore_plan(name)
+        if not plan:
+            return
+        by_repo = {}
+        for w in plan['worktrees']:
+            by_repo.setdefault(w['repo'], []).append(w)
+        user = os.environ.get('USER', '').lower()
+        WtsManager._set_status(name, f"restoring {len(plan['worktrees'])} worktree(s)")
+
+        restored, failed = [], []
+        with ThreadPoolExecutor(max_workers=min(WtsManager._ADD_WORKERS, len(by_repo))) as pool:
+            futures = [(repo_root, pool.submit(WtsManager._restore_worktrees, repo_root, worktrees, user))
+                       for repo_root, worktrees in by_repo.items()]
+            for repo_root, future in futures:
+                try:
+                    restored += future.result()
+                except Exception as e:
+                    failed.append(Path(repo_root).name)
+                    print(f"Error: could not restore worktrees of '{repo_root}': {e}", file=sys.stderr)
+
+        session_dir = plan.get('path')
+        if session_dir and os.path.isdir(session_dir):
+            res = subprocess.run(['tmux', 'list-panes', '-s', '-t', name, '-F',
+                                  '#{pane_id}\t#{pane_current_command}\t#{pane_current_path}'],
+                                 capture_output=True, text=True)
+            fallbacks = (str(Path.home()), '/')
+            commands = []
+            for line in res.stdout.splitlines() if res.returncode == 0 else []:
+                pane, command, cwd = (line.split('\t') + ['', ''])[:3]
+                if command in WtsManager._SHELLS and cwd in fallbacks:
+                    commands.append(['send-keys', '-t', pane, f'cd {shlex.quote(session_dir)}', 'Enter'])
+            if commands:
+                run_tmux_batch(commands, check=False)
+
+        if restored:
+            SessionIndex().record(name, worktrees=restored)
+        WtsManager._set_status(name, f"restore failed: {', '.join(failed)}" if failed else None)
+        if failed:
+            sys.exit(1)
+
+    # ------------------------------------------------------------------
+    # Worktree teardown
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _trash_dir():
+        """Where --done parks worktrees until the background purge deletes them."""
+        return Path.home() / "worktrees" / ".trash"
+
+    @staticmethod
+    def _is_linked_worktree(worktree):
+        """True if worktree's .git is a file pointing into <common dir>/worktrees/.
+
+        Only such checkouts may be renamed away; a main clone (or anything
+        else) keeps git's own 'worktree remove' checks.
+        """
+        try:
+            content = (Path(worktree) / '.git').read_text().strip()
+        except OSError:
+            return False
+        if not content.startswith('gitdir:'):
+            return False
+        git_dir = (Path(worktree) / content[len('gitdir:'):].strip()).resolve()
+        try:
+            common_dir = (git_dir / (git_dir / 'commondir').read_text().strip()).resolve()
+        except OSError:
+            return False
+        return git_dir.parent == common_dir / 'worktrees'
+
+    @staticmethod
+    def _move_to_trash(worktree):
+        """Renames worktree into the trash in constant time. Returns False if it can't
+        (e.g. the trash is on another filesystem)."""
+        trash = WtsManager._trash_dir()
+        try:
+            trash.mkdir(parents=True, exist_ok=True)
+            slot = Path(tempfile.mkdtemp(prefix=f'{Path(worktree).name}-', dir=trash))
+        except OSError:
+            return False
+        try:
+            os.rename(worktree, slot / 'tree')
+        except OSError:
+            # Nothing purges an empty slot on the paths that fall back
+            slot.rmdir()
+            return False
+        return True
+
+    @staticmethod
+    def _remove_worktrees(pairs):
+        """Detaches (repo_root, worktree) pairs from their repos, one worker per repo.
+
+        Linked worktrees are renamed into the trash and the repo pruned, so the
+        cost does not depend on the size of the checkout; anything else, and
+        any rename that fails, goes through 'worktree remove', which refuses a
+        main working tree. Pruning stays in the foreground: until it runs, git still
+        considers the branch checked out and a new 'wts <branch>' would fail.
+        Returns True if anything was left in the trash for purge_trash.
+        """
+        by_repo = {}
+        for repo_root, worktree in pairs:
+            by_repo.setdefault(str(repo_root), []).append(str(worktree))
+
+        def detach(repo_root, worktrees):
+            trashed = False
+            for worktree in worktrees:
+                if WtsManager._is_linked_worktree(worktree) and WtsManager._move_to_trash(worktree):
+                    trashed = True
+                else:
+                    run_command(['git', '-C', repo_root, 'worktree', 'remove', '--force', worktree], check=False)
+            if trashed:
+                run_command(['git', '-C', repo_root, 'worktree', 'prune'], check=False)
+            return trashed
+
+        if not by_repo:
+            return False
+        with ThreadPoolExecutor(max_workers=min(WtsManager._ADD_WORKERS, len(by_repo))) as pool:
+            return any(list(pool.map(detach, by_repo.keys(), by_repo.values())))
+
+    @staticmethod
+    def purge_trash():
+        """Deletes everything in the worktree trash; runs detached after --done."""
+        trash = WtsManager._trash_dir()
+        if not trash.is_dir():
+            return
+        slots = list(trash.iterdir())
+        if slots:
+            with ThreadPoolExecutor(max_workers=min(WtsManager._ADD_WORKERS, len(slots))) as pool:
+                list(pool.map(lambda slot: shutil.rmtree(slot, ignore_errors=True), slots))
+        try:
+            trash.rmdir()
+        except OSError:
+            pass
+
+
+    # ------------------------------------------------------------------
+    # --gc command: worktrees left behind by dead servers and interrupted --done
+    # ------------------------------------------------------------------
+
+    _GC_MIN_AGE = 3600  # seconds; younger worktrees may belong to a wts still starting up
+    _GC_STAMP = 'gc.stamp'
+
+    @staticmethod
+    def _tree_size(path):
+        """Bytes on disk under path, symlinks not followed."""
+        total = 0
+        for root, dirs, files in os.walk(path):
+            for name in dirs + files:
+                try:
+                    total += os.lstat(os.path.join(root, name)).st_blocks * 512
+                except OSError:
+                    pass
+        return total
+
+    @staticmethod
+    def _format_bytes(n):
+        for unit in ('B', 'KiB', 'MiB', 'GiB'):
+            if n < 1024 or unit == 'GiB':
+                return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+            n /= 1024
+
+    @staticmethod
+    def _checkouts(parent):
+        """Worktree roots under parent, descending into the directories of 'a/b' names."""
+        for child in sorted(parent.iterdir()):
+            if child.name.startswith('.') or child.is_symlink() or not child.is_dir():
+                continue
+            if (child / '.git').exists():
+                yield child
+            else:
+                yield from WtsManager._checkouts(child)
+
+    @staticmethod
+    def _registered_worktrees(repo_root):
+        """{resolved path: {'branch': ..., 'locked': bool}} from 'git worktree list --porcelain'.
+
+        None when git cannot list them: nothing can be told apart then.
+        """
+        res = run_command(['git', '-C', str(repo_root), 'worktree', 'list', '--porcelain'],
+                          check=False, capture_output=True)
+        if res is None or res.returncode != 0:
+            return None
+        worktrees, current = {}, None
+        for line in res.stdout.splitlines():
+            key, _, value = line.partition(' ')
+            if key == 'worktree':
+                current = worktrees.setdefault(str(Path(value).resolve()), {'branch': None, 'locked': False})
+            elif current is not None and key == 'branch':
+                current['branch'] = value[len('refs/heads/'):] if value.startswith('refs/heads/') else value
+            elif current is not None and key == 'locked':
+                current['locked'] = True
+        return worktrees
+
+    @staticmethod
+    def _sessions_in_use(tmux):
+        """(live session names, directories panes sit in, {session: added-repo entries})."""
+        res = tmux.run(['list-sessions', '-F', '#{session_name}'])
+        names = set(res.stdout.splitlines()) if res.returncode == 0 else set()
+        res = tmux.run(['list-panes', '-a', '-F', '#{pane_current_path}'])
+        paths = set(res.stdout.splitlines()) if res.returncode == 0 else set()
+        added = {name: WtsManager._get_added_repos(tmux, name) for name in names}
+        return names, paths, added
+
+    @staticmethod
+    def _in_use(checkout, names, busy):
+        # ~/worktrees/<repo>/<session name>, where the name may contain '/'
+        name = '/'.join(checkout.relative_to(Path.home() / 'worktrees').parts[1:])
+        return name in names or str(checkout) in busy or str(checkout.resolve()) in busy
+
+    @staticmethod
+    def _checkout_age(checkout, now):
+        try:
+            return now - (checkout / '.git').stat().st_mtime
+        except OSError:
+            return now
+
+    @staticmethod
+    def _classify_broken(checkout, now):
+        """Returns (verdict, detail) for a checkout whose .git leads nowhere.
+
+        Without its repo, git cannot tell its files from uncommitted work, so
+        only an empty one (nothing but .git) past the grace period is stale;
+        the rest is kept for 'git worktree repair'.
+        """
+        if WtsManager._checkout_age(checkout, now) < WtsManager._GC_MIN_AGE:
+            return 'keep', 'created recently'
+        try:
+            if any(entry.name != '.git' for entry in os.scandir(checkout)):
+                return 'keep', "broken .git link, has files (try 'git worktree repair')"
+        except OSError:
+            return 'keep', 'unreadable'
+        return 'stale', 'broken .git link'
+
+    @staticmethod
+    def _classify_checkout(checkout, registered, names, busy, now):
+        """Returns (verdict, detail) for one checkout; verdict is keep, orphan or stale.
+
+        Checkouts git does not list as worktrees go through the same in-use,
+        age and local-changes checks before they are called stale.
+        """
+        if registered is None:
+            return 'keep', 'git worktree list failed'
+        info = registered.get(str(checkout.resolve()))
+        if WtsManager._in_use(checkout, names, busy):
+            return 'keep', 'in use'
+        if info is not None and info['locked']:
+            return 'keep', 'locked'
+        if WtsManager._checkout_age(checkout, now) < WtsManager._GC_MIN_AGE:
+            return 'keep', 'created recently'
+        res = run_command(['git', '-C', str(checkout), 'status', '--porcelain'], check=False, capture_output=True)
+        if res is None or res.returncode != 0:
+            return 'keep', 'git status failed'
+        if res.stdout.strip():
+            return 'keep', 'has local changes'
+        if info is None:
+            return 'stale', 'not a registered worktree'
+        return 'orphan', info['branch']
+
+    @staticmethod
+    def gc(dry_run=False):
+        """Removes worktrees under ~/worktrees that no live session uses.
+
+        Each checkout is cross-checked against tmux (session names, pane
+        directories, @wts-added-repos) and its repo's 'git worktree list'.
+        Checkouts are removed only when unused, unlocked, clean and older than
+        an hour, whether or not git still lists them as worktrees (paths are
+        compared resolved); a repo whose worktrees git cannot list is left
+        alone, and so are main clones. A checkout whose .git link is broken
+        goes only if it holds nothing else. Branches of removed worktrees are deleted with 'git branch -d'
+        (merged ones only).
+        Repos are examined and cleaned concurrently. Dead @wts-added-repos
+        entries are dropped too.
+        """
+        root = Path.home() / 'worktrees'
+        with TmuxClient() as tmux:
+            names, panes, added = WtsManager._sessions_in_use(tmux)
+            busy = {str(Path(e['worktree']).resolve()) for entries in added.values() for e in entries}
+            # A pane anywhere inside a checkout keeps it
+            for path in panes:
+                p = Path(path).resolve()
+                busy.update(str(d) for d in (p, *p.parents))
+
+            stale_entries = {}
+            for name, entries in added.items():
+                live = [e for e in entries if Path(e['worktree']).is_dir()]
+                if len(live) != len(entries):
+                    stale_entries[name] = live
+            for name, live in stale_entries.items():
+                print(f"{'Would drop' if dry_run else 'Dropping'} {len(added[name]) - len(live)} "
+                      f"dead @wts-added-repos entries from '{name}'")
+                if not dry_run:
+                    WtsManager._set_added_repos(tmux, name, live)
+
+        checkouts = list(WtsManager._checkouts(root)) if root.is_dir() else []
+        now = time.time()
+        by_repo, stale = {}, []
+        for checkout in checkouts:
+            repo = GitRepo.discover(checkout)
+            if repo is None or repo.worktree != checkout or not repo.git_dir.is_dir():
+                if WtsManager._in_use(checkout, names, busy):
+                    continue
+                verdict, detail = WtsManager._classify_broken(checkout, now)
+                if verdict == 'stale':
+                    stale.append((checkout, detail))
+                else:
+                    print(f"Keeping {checkout}: {detail}")
+            elif WtsManager._is_linked_worktree(checkout):
+                by_repo.setdefault(str(repo.repo_root), []).append(checkout)
+            # Anything else is a clone kept under ~/worktrees, not gc's to remove
+
+
+        def examine(repo_root, repo_checkouts):
+            registered = WtsManager._registered_worktrees(repo_root)
+            return [(repo_root, c) + WtsManager._classify_checkout(c, registered, names, busy, now)
+                    for c in repo_checkouts]
+
+        verdicts = []
+        if by_repo:
+            with ThreadPoolExecutor(max_workers=min(WtsManager._ADD_WORKERS, len(by_repo))) as pool:
+                for result in pool.map(examine, by_repo.keys(), by_repo.values()):
+                    verdicts.extend(result)
+
+        orphans = [(repo_root, c, branch) for repo_root, c, verdict, branch in verdicts if verdict == 'orphan']
+        stale += [(c, detail) for _, c, verdict, detail in verdicts if verdict == 'stale']
+        for _, c, verdict, detail in verdicts:
+            if verdict == 'keep' and detail != 'in use':
+                print(f"Keeping {c}: {detail}")
+
+        doomed = [c for _, c, _ in orphans] + [c for c, _ in stale]
+        trash = WtsManager._trash_dir()
+        with ThreadPoolExecutor(max_workers=WtsManager._ADD_WORKERS) as pool:
+            sizes = dict(zip(doomed, pool.map(WtsManager._tree_size, doomed)))
+            trash_size = WtsManager._tree_size(trash) if trash.is_dir() else 0
+
+        verb = 'Would remove' if dry_run else 'Removing'
+        for repo_root, c, branch in orphans:
+            print(f"{verb} {c} ({WtsManager._format_bytes(sizes[c])}, branch {branch or 'detached'})")
+        for c, detail in stale:
+            print(f"{verb} {c} ({WtsManager._format_bytes(sizes[c])}, {detail})")
+        if trash_size:
+            print(f"{verb} leftovers in {trash} ({WtsManager._format_bytes(trash_size)})")
+
+        if not dry_run:
+            WtsManager._remove_worktrees([(repo_root, c) for repo_root, c, _ in orphans])
+            for c, _ in stale:
+                if not WtsManager._move_to_trash(c):
+                    shutil.rmtree(c, ignore_errors=True)
+
+            def delete_branches(repo_root, branches):
+                for branch in branches:
+                    res = run_command(['git', '-C', repo_root, 'branch', '-d', branch],
+                                      check=False, capture_output=True)
+                    if res is not None and res.returncode != 0:
+                        print(f"Keeping unmerged branch '{branch}' in {repo_root}")
+
+            branches = {}
+            for repo_root, _, branch in orphans:
+                if branch:
+                    branches.setdefault(repo_root, []).append(branch)
+            if branches:
+                with ThreadPoolExecutor(max_workers=min(WtsManager._ADD_WORKERS, len(branches))) as pool:
+                    list(pool.map(delete_branches, branches.keys(), branches.values()))
+            WtsManager.purge_trash()
+            SessionIndex().reconcile()
+
+            stamp = cache_dir() / WtsManager._GC_STAMP
+            stamp.parent.mkdir(parents=True, exist_ok=True)
+            stamp.touch()
+
+        total = sum(sizes.values()) + trash_size
+        print(f"{'Would reclaim' if dry_run else 'Reclaimed'} {WtsManager._format_bytes(total)} "
+              f"from {len(doomed)} worktree(s).")
+
+    @staticmethod
+    def _maybe_spawn_gc():
+        """Starts a detached --gc when the last one is older than WTS_GC_INTERVAL hours."""
+        try:
+            interval = float(os.environ.get('WTS_GC_INTERVAL', '0')) * 3600
+        except ValueError:
+            return
+        if interval <= 0:
+            return
+        stamp = cache_dir() / WtsManager._GC_STAMP
+        try:
+            if time.time() - stamp.stat().st_mtime < interval:
+                return
+        except OSError:
+            pass
+        try:
+            stamp.parent.mkdir(parents=True, exist_ok=True)
+            stamp.touch()  # claim this round before the detached gc gets going
+        except OSError:
+            return
+        WtsManager._spawn_background(['--gc'])
+
+    # ------------------------------------------------------------------
+    # Shared object stores: clones of one project borrow objects from a bare store
+    # ------------------------------------------------------------------
+
+    _STORE_MEMBER = 'wts.member'
+
+    @staticmethod
+    def _store_root():
+        # Not under ~/.cache: deleting a store corrupts every clone borrowing from it
+        return Path.home() / 'worktrees' / '.objects'
+
+    @staticmethod
+    def _git_out(args):
+        res = run_command(['git'] + args, check=True, capture_output=True)
+        return res.stdout.strip()
+
+    @staticmethod
+    def _project_key(repo_root):
+        """Names the project by its oldest root commit, which forks and mirrors share."""
+        roots = WtsManager._git_out(['-C', str(repo_root), 'rev-list', '--max-parents=0', 'HEAD']).split()
+        return min(roots)[:16]
+
+    @staticmethod
+    def _member_ref_prefix(repo_root):
+        return f"refs/members/{hashlib.sha1(str(repo_root).encode()).hexdigest()[:12]}/"
+
+    @staticmethod
+    def _fetch_member(store, repo_root):
+        """Mirrors repo_root's branches and tags into the store, copying only objects it lacks.
+
+        The refs keep the objects reachable, so repacking the store never
+        drops what a member relies on.
+        """
+        prefix = WtsManager._member_ref_prefix(repo_root)
+        run_command(['git', '-C', str(store), 'fetch', '--quiet', '--no-tags', '--prune', str(repo_root),
+                     f'+refs/heads/*:{prefix}heads/*', f'+refs/tags/*:{prefix}tags/*'],
+                    check=True, capture_output=True)
+
+    @staticmethod
+    def _alternates_file(repo):
+        return repo.common_dir / 'objects' / 'info' / 'alternates'
+
+    @staticmethod
+    def _shrink_member(repo_root):
+        """Repacks a member with -l, so objects the store has leave its own packs.
+
+        Loose objects are packed first: -l only filters what goes into the
+        new pack, and loose copies of the store's objects would stay behind.
+        """
+        for args in (['repack', '-d', '-q'], ['repack', '-a', '-d', '-l', '-q']):
+            run_command(['git', '-C', str(repo_root)] + args, check=True, capture_output=True)
+
+    @staticmethod
+    def share_objects(repo_path_args):
+        """Joins repos to their project's shared object store under ~/worktrees/.objects.
+
+        The store is a bare repo holding every member's branches and tags.
+        Each member lists it in objects/info/alternates and drops its own
+        copies of the store's objects, so clones, and the worktrees of each,
+        borrow one set of objects.
+        """
+        repos = []
+        for repo_path_arg in repo_path_args:
+            repo_path = Path(repo_path_arg).expanduser().resolve()
+            repo = GitRepo.discover(repo_path) if repo_path.is_dir() else None
+            if not repo:
+                print(f"Error: '{repo_path}' is not a git repository.", file=sys.stderr)
+                sys.exit(1)
+            repos.append(repo)
+
+        for repo in repos:
+            repo_root = repo.repo_root
+            before = WtsManager._tree_size(repo.common_dir / 'objects')
+            store = WtsManager._store_root() / f'{WtsManager._project_key(repo_root)}.git'
+            if not store.is_dir():
+                store.parent.mkdir(parents=True, exist_ok=True)
+                run_command(['git', 'init', '--bare', '-q', str(store)])
+                # The store is only ever repacked by --repack-store, which keeps unreachable objects
+                run_command(['git', '-C', str(store), 'config', 'gc.auto', '0'])
+            WtsManager._fetch_member(store, repo_root)
+
+            members = GitRepo.discover(store).config_values(WtsManager._STORE_MEMBER)
+            if str(repo_root) not in members:
+                run_command(['git', '-C', str(store), 'config', '--add', WtsManager._STORE_MEMBER, str(repo_root)])
+            alternates = WtsManager._alternates_file(repo)
+            objects = str(store / 'objects')
+            current = alternates.read_text().split('\n') if alternates.exists() else []
+            if objects not in current:
+                alternates.parent.mkdir(parents=True, exist_ok=True)
+                with open(alternates, 'a') as f:
+                    f.write(objects + '\n')
+            WtsManager._shrink_member(repo_root)
+            after = WtsManager._tree_size(repo.common_dir / 'objects')
+            print(f"{repo_root}: shares {store} "
+                  f"({WtsManager._format_bytes(before)} -> {WtsManager._format_bytes(after)} of own objects)")
+
+    @staticmethod
+    def repack_stores():
+        """Maintenance for the shared stores: refreshes members' refs, repacks, slims members.
+
+        Members that are gone lose their refs. The store is repacked into
+        one pack with a bitmap, keeping unreachable objects (a member's
+        reflogs and stashes may still point at them); each member is then
+        repacked with -l, dropping objects it picked up since.
+        """
+        root = WtsManager._store_root()
+        stores = sorted(p for p in root.iterdir() if p.suffix == '.git') if root.is_dir() else []
+        if not stores:
+            print("No shared object stores.")
+            return
+        for store in stores:
+            before = WtsManager._tree_size(store)
+            members = GitRepo.discover(store).config_values(WtsManager._STORE_MEMBER)
+            live = []
+            for member in members:
+                repo = GitRepo.discover(member) if Path(member).is_dir() else None
+                if repo and str(repo.repo_root) == member:
+                    WtsManager._fetch_member(store, member)
+                    live.append(member)
+                    continue
+                print(f"Dropping {member} from {store.name}: no longer a git repository")
+                prefix = WtsManager._member_ref_prefix(member)
+                refs = WtsManager._git_out(['-C', str(store), 'for-each-ref', '--format=%(refname)', prefix])
+                if refs:
+                    subprocess.run(['git', '-C', str(store), 'update-ref', '--stdin'], check=True,
+                                   input=''.join(f'delete {ref}\n' for ref in refs.split()), text=True)
+                run_command(['git', '-C', str(store), 'config', '--unset', '--fixed-value',
+                             WtsManager._STORE_MEMBER, member], check=False)
+            run_command(['git', '-C', str(store), 'repack', '-a', '-d', '-k', '-b', '-q'],
+                        check=True, capture_output=True)
+            for member in live:
+                WtsManager._shrink_member(member)
+            after = WtsManager._tree_size(store)
+            print(f"{store.name}: {len(live)} member(s), "
+                  f"{WtsManager._format_bytes(before)} -> {WtsManager._format_bytes(after)}")
+
+
+class _Handoff(BaseException):
+    """Raised in the daemon instead of exec'ing argv, which the client then does."""
+
+    def __init__(self, argv):
+        super().__init__(argv)
+        self.argv = argv
+
+
+class WtsDaemon:
+    """Serves scripts/wts requests over a Unix socket (see lib/wts_client.py).
+
+    Requests run one at a time, through the same main() as scripts/wts,
+    each with the client's argv, directory, environment and stdio: cwd, the
+    environment and fds 0-2 belong to the whole process, so serving two at
+    once would mix them up. Python start-up and imports are paid once, and
+    tmux control connections stay open between requests. The daemon exits
+    when its code changes, leaving that request to the client.
+    """
+
+    serving = False
+
+    def __init__(self, main, path=None):
+        self.main = main
+        self.path = Path(path) if path else Path(wts_client.socket_path())
+        self.sources = self._source_mtimes()
+
+    @staticmethod
+    def _source_mtimes():
+        root = Path(get_repo_root())
+        files = [root / 'scripts' / 'wts'] + sorted((root / 'lib').glob('*.py'))
+        return {str(f): f.stat().st_mtime_ns for f in files if f.exists()}
+
+    def serve_forever(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path.with_suffix('.lock'), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                print(f"wts daemon already running on {self.path}", file=sys.stderr)
+                return
+            if self.path.exists():
+                self.path.unlink()
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            umask = os.umask(0o077)
+            try:
+                server.bind(str(self.path))
+            finally:
+                os.umask(umask)
+            server.listen(16)
+            WtsDaemon.serving = True
+            TmuxClient.keep_warm = True
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.default_int_handler)
+            print(f"wts daemon listening on {self.path}", flush=True)
+            try:
+                while True:
+                    conn, _ = server.accept()
+                    with conn:
+                        if not self._handle(conn):
+                            break
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.close()
+                self.path.unlink(missing_ok=True)
+
+    def _handle(self, conn):
+        """Answers one request; returns False when the daemon should exit."""
+        data, fds, _, _ = socket.recv_fds(conn, 1 << 16, 3)
+        try:
+            while data and not data.endswith(b'\n'):
+                more = conn.recv(1 << 16)
+                if not more:
+                    break
+                data += more
+            if len(fds) != 3 or not data.endswith(b'\n'):
+                return True
+            if self._source_mtimes() != self.sources:
+                reply, keep_serving = {'restart': True}, False
+            else:
+                reply, keep_serving = self._run(json.loads(data), fds), True
+        finally:
+            for fd in fds:
+                os.close(fd)
+        try:
+            conn.sendall(json.dumps(reply).encode() + b'\n')
+        except OSError:
+            pass
+        return keep_serving
+
+    def _run(self, request, fds):
+        """Runs main() as the client would have; returns the reply for it."""
+        saved_env, saved_cwd, saved_argv = dict(os.environ), os.getcwd(), sys.argv
+        saved_fds = [os.dup(fd) for fd in (0, 1, 2)]
+        sys.stdout.flush()
+        sys.stderr.flush()
+        reply = {'exit': 0}
+        try:
+            for fd, target in zip(fds, (0, 1, 2)):
+                os.dup2(fd, target)
+            os.environ.clear()
+            os.environ.update(request['env'])
+            os.chdir(request['cwd'])
+            sys.argv = ['wts'] + request['argv']
+            self.main()
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                print(e.code, file=sys.stderr)
+            reply['exit'] = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except _Handoff as e:
+            reply['exec'] = e.argv
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            reply['exit'] = 1
+        finally:
+            for stream in (sys.stdout, sys.stderr):
+                try:
+                    stream.flush()
+                except OSError:  # the client's terminal is gone (wts -d killed its pane)
+                    pass
+            for fd, saved in zip((0, 1, 2), saved_fds):
+                os.dup2(saved, fd)
+                os.close(saved)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            os.chdir(saved_cwd)
+            sys.argv = saved_argv
+        return reply
+
+
+def start_timings(t0, imported, report, trace_path=None):
+    """Turns on --timings and/or the JSONL trace; t0 and imported are when scripts/wts
+    started and finished importing this module (time.perf_counter())."""
+    timings = enable_timings(t0, report=report, trace_path=trace_path)
+    timings.record('phase', 'import', t0, imported)
+    repo = GitRepo.discover(get_repo_root())
+    timings.meta.update(argv=sys.argv[1:], version=repo.commit_of('HEAD') if repo else None)
+    if trace_path:
+        # Detached helpers (trunk sync, purge, pool refill, saver) trace to the same file
+        os.environ['WTS_TRACE'] = str(trace_path)
 
 
 # Compatibility wrappers
 def create_session(args):
-    manager = WtsManager(name=args.name, no_worktree=args.no_worktree, attach=args.attach)
+    manager = WtsManager(name=args.name, no_worktree=args.no_worktree, attach=args.attach,
+                         background_fetch=args.background_fetch)
     manager.create_session()
 
 def cleanup_session():
     WtsManager.cleanup_session()
 
 def add_repo(args):
-    WtsManager.add_session_repo(args.add)
+    WtsManager.add_session_repo(args.add, background_fetch=args.background_fetch)
+
+def sync_trunk(args):
+    WtsManager.sync_trunk(*args.sync_trunk)
+
+def purge_trash():
+    WtsManager.purge_trash()
+
+def list_sessions():
+    WtsManager.list_sessions()
+
+def save_resurrect():
+    WtsManager.save_resurrect()
+
+def gc(args):
+    WtsManager.gc(dry_run=args.dry_run)
+
+def pick_session():
+    WtsManager.pick_session()
+
+def restore():
+    WtsManager.restore()
+
+def restore_session(args):
+    WtsManager.restore_session(args.restore_session)
+
+def refill_pool(args):
+    WtsManager.refill_pool(args.refill_pool)
+
+def serve_daemon(main):
+    WtsDaemon(main).serve_forever()
+
+def share_objects(args):
+    WtsManager.share_objects(args.share)
+
+def repack_stores():
+    WtsManager.repack_stores()
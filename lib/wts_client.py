@@ -0,0 +1,72 @@
+"""Thin client for the wts daemon (wts --daemon).
+
+scripts/wts tries this before importing lib.wts: it only needs socket and
+json, so a call the daemon serves costs one Python start-up and a round
+trip. The request carries argv, the working directory and the environment;
+stdin, stdout and stderr travel as file descriptors, so the daemon (and the
+git and tmux processes it runs) read and write this terminal directly.
+"""
+import json
+import os
+import socket
+import sys
+
+# Flags the daemon serves; anything else (--pick's prompt, --timings, the
+# detached helpers, --daemon itself) runs in this process.
+SERVED_FLAGS = {
+    '--done', '-d', '--no-worktree', '-n', '--attach', '-a', '--add',
+    '--list', '-l', '--background-fetch', '-b',
+}
+
+
+def cache_dir():
+    """~/.cache/wts (or $XDG_CACHE_HOME/wts): the index, stamps and cached lookups.
+
+    A plain string, so the client gets by without pathlib; lib.wts wraps it.
+    """
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache, 'wts')
+
+
+def socket_path():
+    """daemon.sock in cache_dir(), next to the index."""
+    return os.path.join(cache_dir(), 'daemon.sock')
+
+
+def served(argv):
+    """True if the daemon may run argv (set WTS_NO_DAEMON=1 to never use it)."""
+    if os.environ.get('WTS_NO_DAEMON') or os.environ.get('WTS_TRACE'):
+        return False
+    return all(arg in SERVED_FLAGS for arg in argv if arg.startswith('-'))
+
+
+def run(argv):
+    """Runs argv in the daemon; returns its exit status, or None to run it here.
+
+    The daemon answers with the status, a command to exec in its place
+    (tmux attach-session needs this terminal) or a refusal when its code is
+    out of date.
+    """
+    if not served(argv):
+        return None
+    try:
+        request = json.dumps({'argv': argv, 'cwd': os.getcwd(), 'env': dict(os.environ)}).encode()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    except OSError:
+        return None
+    with sock:
+        try:
+            sock.connect(socket_path())
+            socket.send_fds(sock, [request + b'\n'], [0, 1, 2])
+        except OSError:
+            return None
+        line = sock.makefile('rb').readline()
+    if not line:
+        print("wts: the daemon went away while running the command", file=sys.stderr)
+        return 1
+    reply = json.loads(line)
+    if reply.get('restart'):
+        return None
+    if reply.get('exec'):
+        os.execvp(reply['exec'][0], reply['exec'])
+    return reply.get('exit', 1)
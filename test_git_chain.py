@@ -3,6 +3,13 @@ import os
 import shutil
 import subprocess
 import sys
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from lib import git_chain
+from lib.utils import run_command
 
 GIT_CHAIN = os.path.abspath(os.path.join(os.path.dirname(__file__), 'scripts', 'git-chain'))
 
@@ -41,6 +48,28 @@ class TestGitChain(unittest.TestCase):
             self.fail(f'git chain {args} failed: {res.stderr}')
         return res
 
+    def git_calls(self, command, *args):
+        """Runs a git chain command in-process; returns the git subcommands it ran."""
+        calls = []
+
+        def counting(cmd, **kwargs):
+            calls.append(cmd[1])
+            return run_command(cmd, **kwargs)
+
+        cwd, stdout = os.getcwd(), os.dup(1)
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.chdir(self.repo)
+        os.dup2(devnull, 1)
+        try:
+            with mock.patch.object(git_chain, 'run_command', counting), redirect_stdout(StringIO()):
+                command(*args)
+        finally:
+            os.dup2(stdout, 1)
+            os.close(stdout)
+            os.close(devnull)
+            os.chdir(cwd)
+        return calls
+
     def commit_file(self, name, content, message):
         with open(os.path.join(self.repo, name), 'w') as f:
             f.write(content)
@@ -138,6 +167,38 @@ class TestGitChain(unittest.TestCase):
         self.assertEqual(self.git('show', f'{tip}:f2.txt').stdout, 'f2')
         self.assertEqual(self.git('show', f'{tip}:f1.txt').stdout, 'f1 amended')
 
+    def test_fold_replays_new_frames_without_touching_the_working_tree(self):
+        f1, f3 = self.make_rest_state()
+        with open(os.path.join(self.repo, 'g.txt'), 'w') as f:
+            f.write('g')
+        self.git('add', 'g.txt')
+        self.git('commit', '-m', 'g', '--date', '2001-02-03T04:05:06+00:00')
+        calls = self.git_calls(git_chain.cmd_fold)
+        self.assertNotIn('rebase', calls)
+        self.assertNotIn('checkout', calls)
+        self.assertEqual(calls.count('reset'), 1)
+        self.assertEqual(self.rev('feature'), f1)
+        self.assertEqual(self.frames('feature..feature-chain'), ['g', 'f3', 'f2'])
+        tip = self.rev('feature-chain')
+        self.assertEqual(self.git('show', f'{tip}:g.txt').stdout, 'g')
+        self.assertEqual(self.git('log', '-1', '--format=%aI', tip).stdout.strip(),
+                         '2001-02-03T04:05:06+00:00')
+
+    def test_fold_conflict_changes_nothing(self):
+        f1, f3 = self.make_rest_state()
+        g = self.commit_file('f2.txt', 'other', 'clashes with f2')
+        res = self.chain('fold', check=False)
+        self.assertNotEqual(res.returncode, 0)
+        self.assertIn("conflict replaying 'clashes with f2' (f2.txt)", res.stderr)
+        self.assertEqual(self.rev('feature'), g)
+        self.assertEqual(self.rev('feature-chain'), f3)
+        self.assertEqual(self.git('status', '--porcelain').stdout, '')
+        # --rebase stops at the conflict in the working tree instead.
+        res = self.chain('fold', '--rebase', check=False)
+        self.assertNotEqual(res.returncode, 0)
+        self.assertIn("git rebase --continue", res.stderr)
+        self.git('rebase', '--abort')
+
     def test_refuses_to_run_on_chain_branch(self):
         self.make_rest_state()
         self.git('checkout', 'feature-chain')
@@ -279,6 +340,141 @@ class TestGitChain(unittest.TestCase):
         self.assertNotEqual(res.returncode, 0)
         self.assertIn('cannot move', res.stderr)
 
+    def test_frame_index_is_rebuilt_when_the_chain_moves(self):
+        f1, f3 = self.make_rest_state()
+        index = os.path.join(self.repo, '.git', 'chain-frames')
+        with open(index) as f:
+            self.assertEqual(f.read().split()[0], f3)
+        f4 = self.git('commit-tree', f'{f3}^{{tree}}', '-p', f3, '-m', 'f4').stdout.strip()
+        self.git('branch', '-f', 'feature-chain', f4)
+        res = self.chain('grow', '3')
+        self.assertIn('fold at frame 4 of 4', res.stdout)
+        self.assertEqual(self.rev('feature'), f4)
+        with open(index) as f:
+            self.assertEqual(f.read().split()[0], f4)
+
+    def test_jump_and_step_update_only_changed_paths(self):
+        f1, f3 = self.make_rest_state()
+        calls = self.git_calls(git_chain.cmd_jump, 3)
+        self.assertNotIn('reset', calls)
+        self.assertEqual(calls[-3:], ['read-tree', 'update-ref', 'config'])
+        self.assertEqual(self.rev('feature'), f3)
+        self.assertTrue(os.path.exists(os.path.join(self.repo, 'f3.txt')))
+        res = self.chain('step', '-2')
+        self.assertIn('fold at frame 1 of 3', res.stdout)
+        self.assertEqual(self.rev('feature'), f1)
+        self.assertFalse(os.path.exists(os.path.join(self.repo, 'f2.txt')))
+        self.assertEqual(self.git('status', '--porcelain').stdout, '')
+        res = self.chain('jump', '4', check=False)
+        self.assertIn('there is no frame 4', res.stderr)
+        self.chain('grow')
+        self.assertEqual(self.frames('main..feature'), ['f2', 'f1'])
+
+    def test_browse_steps_through_frames(self):
+        f1, f3 = self.make_rest_state()
+        res = subprocess.run([sys.executable, GIT_CHAIN, 'browse'], cwd=self.repo, input='\n\np\n0\n3\n9\nq\n',
+                             capture_output=True, text=True)
+        self.assertEqual(res.returncode, 0, res.stderr)
+        out = res.stdout
+        self.assertIn('fold at frame 1 of 3: ', out)
+        self.assertIn('fold at frame 3 of 3: ', out)
+        self.assertIn('fold at frame 0 of 3 (trunk)', out)
+        self.assertIn('there is no frame 9', out)
+        self.assertEqual(self.rev('feature'), f3)
+        self.assertEqual(self.git('config', '--worktree', 'chain.frames').stdout.strip(), '3')
+        self.assertEqual(self.git('status', '--porcelain').stdout, '')
+
+    def test_browse_killed_midway_keeps_pointer_and_branch_together(self):
+        f1, f3 = self.make_rest_state()
+        proc = subprocess.Popen([sys.executable, GIT_CHAIN, 'browse'], cwd=self.repo, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        proc.stdin.write('3\n')
+        proc.stdin.flush()
+        for line in proc.stdout:
+            if 'fold at frame 3 of 3' in line:
+                break
+        proc.kill()
+        proc.wait()
+        proc.stdin.close()
+        proc.stdout.close()
+        self.assertEqual(self.rev('feature'), f3)
+        self.assertEqual(self.git('config', '--worktree', 'chain.frames').stdout.strip(), '3')
+        self.assertIn('fold at frame 2 of 3', self.chain('shrink').stdout)
+
+    def test_status_all_covers_every_worktree(self):
+        self.make_rest_state()
+        other = os.path.join(self.test_dir, 'other-wt')
+        self.git('worktree', 'add', '-b', 'other', other, 'origin/main')
+        # worktree add copies config.worktree; the new worktree gets its own chain.
+        self.git('config', '--worktree', '--remove-section', 'chain', cwd=other)
+        self.commit_file('o1.txt', 'o1', 'o1')  # on feature: one frame not folded yet
+        calls = self.git_calls(git_chain.cmd_status, True)
+        self.assertEqual(calls, ['worktree', 'for-each-ref', 'log'])
+        res = self.chain('status', '--all')
+        lines = res.stdout.splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertRegex(lines[0], r"work +feature: 2 frame\(s\) on branch, 2 folded on "
+                                   r"'feature-chain' \(fold pointer at frame 1\)$")
+        self.assertRegex(lines[1], r"other-wt +other: 0 frame\(s\) on branch, nothing folded$")
+        res = self.chain('status')
+        self.assertEqual(len(res.stdout.splitlines()), 1)
+        self.assertIn('feature:', res.stdout)
+
+    def remote_frames(self):
+        out = self.git('for-each-ref', '--format=%(refname:short) %(objectname)',
+                       'refs/heads/feature-frame-*', cwd=self.origin).stdout
+        return dict(line.split() for line in out.splitlines())
+
+    def test_push_publishes_changed_frames_atomically(self):
+        f1, f3 = self.make_rest_state()
+        f2 = self.rev('feature-chain~1')
+        calls = self.git_calls(git_chain.cmd_push)
+        self.assertEqual(calls.count('push'), 1)
+        self.assertEqual(self.remote_frames(),
+                         {'feature-frame-1': f1, 'feature-frame-2': f2, 'feature-frame-3': f3})
+        self.assertEqual(self.rev('origin/feature-frame-3'), f3)
+
+        # Nothing changed: no push at all.
+        self.assertNotIn('push', self.git_calls(git_chain.cmd_push))
+
+        # Drop the top frame and rewrite the middle one: frame 1 is skipped,
+        # frame 2 is replaced and frame 3 deleted, in the same push.
+        self.git('branch', '-f', 'feature-chain', f1)
+        self.git('checkout', '-q', 'feature-chain')
+        f2_new = self.commit_file('f2.txt', 'f2 amended', 'f2 amended')
+        self.git('checkout', '-q', 'feature')
+        res = self.chain('push')
+        self.assertIn('pushed 2 frame ref update(s)', res.stdout)
+        self.assertEqual(self.remote_frames(), {'feature-frame-1': f1, 'feature-frame-2': f2_new})
+
+    def test_push_refuses_when_remote_frame_moved(self):
+        f1, f3 = self.make_rest_state()
+        f2 = self.rev('feature-chain~1')
+        self.chain('push')
+        # Someone else moves frame 3 on origin; our remote-tracking ref still says f3.
+        self.git('push', '--force', 'origin', f'{f1}:refs/heads/feature-frame-3')
+        self.git('update-ref', 'refs/remotes/origin/feature-frame-3', f3)
+        g = self.git('commit-tree', f'{f2}^{{tree}}', '-p', f2, '-m', 'g').stdout.strip()
+        h = self.git('commit-tree', f'{g}^{{tree}}', '-p', g, '-m', 'h').stdout.strip()
+        self.git('branch', '-f', 'feature-chain', h)
+        res = self.chain('push', check=False)
+        self.assertNotEqual(res.returncode, 0)
+        # Atomic: the lease on frame 3 failed, so frame 4 was not created either.
+        self.assertEqual(self.remote_frames(),
+                         {'feature-frame-1': f1, 'feature-frame-2': f2, 'feature-frame-3': f1})
+
+    def test_status_reads_repo_config_without_worktree_config(self):
+        f1 = self.commit_file('f1.txt', 'f1', 'f1')
+        f2 = self.commit_file('f2.txt', 'f2', 'f2')
+        self.git('branch', 'custom-chain', f2)
+        self.git('reset', '--hard', f1)
+        # Without extensions.worktreeConfig, 'git config --worktree' is the repo's config.
+        self.git('config', 'chain.branch', 'custom-chain')
+        self.git('config', 'chain.frames', '2')
+        res = self.chain('status')
+        self.assertIn("feature: 1 frame(s) on branch, 1 folded on 'custom-chain' (fold pointer at frame 2)",
+                      res.stdout)
+
     def test_grow_requires_working_branch_at_the_fold(self):
         f1, f3 = self.make_rest_state()
         self.chain('unfold')
@@ -291,6 +487,59 @@ class TestGitChain(unittest.TestCase):
         self.assertNotEqual(res.returncode, 0)
         self.assertIn('nothing folded', res.stderr)
 
+    def test_git_invocations_per_command(self):
+        self.make_rest_state()
+        setup = ['rev-parse', 'config', 'for-each-ref', 'log']
+        self.assertEqual(self.git_calls(git_chain.cmd_list), setup)
+        # The fold left a frame index, so grow and shrink skip the log.
+        move = ['rev-parse', 'config', 'for-each-ref', 'status', 'reset', 'config']
+        self.assertEqual(self.git_calls(git_chain.cmd_grow, 1), move)
+        self.assertEqual(self.git_calls(git_chain.cmd_shrink, 1), move)
+        fold = ['rev-parse', 'config', 'status', 'for-each-ref', 'log']
+        self.assertEqual(self.git_calls(git_chain.cmd_fold), fold)
+        self.assertEqual(self.git_calls(git_chain.cmd_unfold),
+                         ['rev-parse', 'config', 'for-each-ref', 'status', 'log', 'reset'])
+        self.assertEqual(self.git_calls(git_chain.cmd_fold), fold + ['branch', 'reset'])
+        self.assertEqual(self.frames('main..feature'), ['f1'])
+
+    def test_config_is_written_once_at_the_end(self):
+        self.commit_file('f1.txt', 'f1', 'f1')
+        self.git('push', 'origin', 'feature')
+        self.commit_file('f2.txt', 'f2', 'f2')
+        calls = []
+        real = git_chain._git
+
+        def recording(args, **kwargs):
+            if args[0] == 'config':
+                calls.append(args)
+            return real(args, **kwargs)
+
+        with mock.patch.object(git_chain, '_git', recording):
+            self.git_calls(git_chain.cmd_fold)
+            self.assertEqual(calls[1:], [
+                ['config', 'extensions.worktreeConfig', 'true'],
+                ['config', '--worktree', 'chain.frames', '1'],
+                ['config', '--worktree', 'chain.branch', 'feature-chain'],
+            ])
+            del calls[:]
+            self.git_calls(git_chain.cmd_grow, 1)
+            self.assertEqual(calls[1:], [['config', '--worktree', 'chain.frames', '2']])
+            del calls[:]
+            self.git_calls(git_chain.cmd_list)
+            self.assertEqual(calls, [['config', '--list', '--show-scope']])
+        self.assertEqual(self.git('config', '--worktree', 'chain.frames').stdout.strip(), '2')
+
+    def test_reads_are_memoized_until_a_write(self):
+        f1, f3 = self.make_rest_state()
+
+        def reads():
+            first = git_chain._out(['rev-parse', 'HEAD'])
+            self.assertEqual(git_chain._out(['rev-parse', 'HEAD']), first)
+            git_chain._git(['reset', '--hard', 'feature-chain'])
+            self.assertEqual(git_chain._out(['rev-parse', 'HEAD']), f3)
+            self.assertEqual(first, f1)
+
+        self.assertEqual(self.git_calls(git_chain._command(reads)), ['rev-parse', 'reset', 'rev-parse'])
 
 if __name__ == '__main__':
     unittest.main()
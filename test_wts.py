@@ -170,6 +170,736 @@ class TestWtsIntegration(unittest.TestCase):
             self.assertIn("vim .", content)
             self.assertIn("test-agent", content)
 
+    def test_wts_create_layout_is_one_tmux_call(self):
+        """The whole layout is sent as one chained tmux invocation."""
+        branch_name = "batched-feature"
+        subprocess.run(['git', 'branch', branch_name], cwd=self.test_dir, check=True)
+
+        fake_tmux_dir = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_tmux_dir)
+        fake_tmux = os.path.join(fake_tmux_dir, 'tmux')
+        tmux_log = os.path.join(self.test_dir, 'tmux_batch.log')
+        with open(fake_tmux, 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {tmux_log}\n')
+            f.write('if echo "$@" | grep -q "has-session"; then\n  exit 1\nfi\n')
+            f.write('exit 0\n')
+        os.chmod(fake_tmux, 0o755)
+
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['PATH'] = fake_tmux_dir + os.pathsep + env['PATH']
+        env['WTS_AGENT_CMD'] = 'agent --flag;'
+        env.pop('TMUX', None)
+
+        subprocess.run([sys.executable, WTS_SCRIPT, branch_name], cwd=self.test_dir, env=env, check=True)
+
+        with open(tmux_log, 'r') as f:
+            calls = f.read().splitlines()
+        layout = [c for c in calls if 'new-session' in c]
+        self.assertEqual(len(layout), 1, f"expected one layout call, got: {calls}")
+        for command in ('rename-window', 'split-window', 'send-keys', 'select-pane'):
+            self.assertIn(command, layout[0])
+        # A trailing ';' in a payload must not split the chain.
+        self.assertIn('agent --flag\\; Enter', layout[0])
+
+    def test_wts_create_applies_compiled_layout_file(self):
+        """A [layout] in .wts.toml is compiled once, cached, and applied with one source-file."""
+        with open(os.path.join(self.test_dir, '.wts.toml'), 'w') as f:
+            f.write('''
+[[layout.windows]]
+name = "Code"
+panes = [
+  { title = "Agent", agent = true },
+  { title = "Editor", command = "true", split = "h" },
+  { title = "Tests", command = "true", split = "v", size = 5, focus = true },
+]
+
+[[layout.windows]]
+name = "Server"
+panes = [{ title = "Server" }, { title = "Logs", split = "v" }]
+''')
+        wrapper_dir = os.path.join(self.test_dir, 'bin')
+        os.makedirs(wrapper_dir)
+        tmux_log = os.path.join(self.test_dir, 'tmux_layout.log')
+        with open(os.path.join(wrapper_dir, 'tmux'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {tmux_log}\n'
+                    'case "$1" in attach-session|-C) exit 0;; esac\n'
+                    f'exec {shutil.which("tmux")} -L wts_test_socket "$@"\n')
+        os.chmod(os.path.join(wrapper_dir, 'tmux'), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['PATH'] = wrapper_dir + os.pathsep + env['PATH']
+        env['WTS_AGENT_CMD'] = 'true'
+        env.pop('TMUX', None)
+        env.pop('XDG_CACHE_HOME', None)
+
+        for name in ('layout-one', 'layout-two'):
+            subprocess.run([sys.executable, WTS_SCRIPT, name], cwd=self.test_dir, env=env, check=True,
+                           capture_output=True)
+            panes = self.run_tmux('list-panes', '-s', '-t', name, '-F',
+                                  '#{window_name} #{pane_title} #{pane_active}',
+                                  capture_output=True, text=True, check=True).stdout.splitlines()
+            self.assertEqual(panes, ['Code Agent 0', 'Code Editor 0', 'Code Tests 1',
+                                     'Server Server 0', 'Server Logs 1'])
+
+        with open(tmux_log) as f:
+            calls = f.read().splitlines()
+        self.assertEqual(len([c for c in calls if c.startswith('source-file')]), 2, calls)
+        self.assertFalse([c for c in calls if 'split-window' in c or 'new-session' in c], calls)
+        layouts = os.listdir(os.path.join(self.test_dir, '.cache', 'wts', 'layouts'))
+        self.assertEqual(len(layouts), 1, "both sessions should share one compiled script")
+
+    def test_wts_timings_report_and_trace(self):
+        """--timings prints phases and subprocesses; --trace appends them as JSON lines."""
+        import json
+
+        subprocess.run(['git', 'branch', 'timed'], cwd=self.test_dir, check=True)
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write('#!/bin/sh\nif echo "$@" | grep -q "has-session"; then\n  exit 1\nfi\nexit 0\n')
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        env.pop('TMUX', None)
+        env.pop('WTS_TRACE', None)
+        trace = os.path.join(self.test_dir, 'trace.jsonl')
+
+        res = subprocess.run([sys.executable, WTS_SCRIPT, '--timings', '--trace', trace, 'timed'],
+                             cwd=self.test_dir, env=env, check=True, capture_output=True, text=True)
+        for phase in ('import', 'detect git', 'rst', 'worktree', 'tmux layout'):
+            self.assertRegex(res.stderr, rf'phase +{phase}\n')
+        self.assertIn('exec  git -C', res.stderr)
+
+        with open(trace) as f:
+            events = [json.loads(line) for line in f]
+        run = events[-1]
+        self.assertEqual(run['kind'], 'run')
+        self.assertEqual(run['argv'], ['--timings', '--trace', trace, 'timed'])
+        worktree_add = [e for e in events if e['kind'] == 'exec' and 'worktree add' in e['name']]
+        self.assertEqual(len(worktree_add), 1)
+        self.assertEqual(worktree_add[0]['returncode'], 0)
+        self.assertEqual(worktree_add[0]['depth'], 1)
+        self.assertTrue(all(e['pid'] == run['pid'] for e in events))
+
+    def test_wts_create_reads_refs_without_git(self):
+        """Repo discovery and branch checks do not start git; only writes do."""
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        git_log = os.path.join(self.test_dir, 'git.log')
+        with open(os.path.join(fake_bin, 'git'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {git_log}\nexec {shutil.which("git")} "$@"\n')
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write('#!/bin/sh\nif echo "$@" | grep -q "has-session"; then\n  exit 1\nfi\nexit 0\n')
+        os.chmod(os.path.join(fake_bin, 'git'), 0o755)
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['USER'] = 'testuser'
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+
+        subprocess.run([sys.executable, WTS_SCRIPT, 'no-fork'], cwd=self.test_dir, env=env, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        with open(git_log) as f:
+            calls = [line.split() for line in f.read().splitlines()]
+        commands = [c[2] if c[0] == '-C' else c[0] for c in calls]
+        # HOME has no gitconfig, so the 'rst' alias fails without running anything else.
+        self.assertEqual(commands, ['rst', 'branch', 'worktree'])
+
+    def test_wts_background_fetch_fast_forwards_new_branch(self):
+        """--background-fetch branches from the last-fetched trunk, then catches up."""
+        origin = os.path.join(self.test_dir, 'origin.git')
+        clone = os.path.join(self.test_dir, 'clone')
+        other = os.path.join(self.test_dir, 'other')
+        git = lambda *args, cwd=clone: subprocess.run(
+            ['git', '-c', 'user.email=test@example.com', '-c', 'user.name=Test User'] + list(args),
+            cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+        git('init', '--bare', '-b', 'main', origin, cwd=self.test_dir)
+        git('clone', origin, clone, cwd=self.test_dir)
+        git('commit', '--allow-empty', '-m', 'c1')
+        git('push', 'origin', 'main')
+        git('remote', 'set-head', 'origin', '-a')
+        with open(os.path.join(os.path.dirname(WTS_SCRIPT), '..', 'gitconfig.base')) as f:
+            rst = next(line.split('=', 1)[1].strip() for line in f if line.strip().startswith('rst ='))
+        git('config', 'alias.rst', rst.strip('"').replace('\\"', '"'))
+        old_trunk = git('rev-parse', 'HEAD')
+
+        # Trunk moves on the remote; the clone has not fetched it yet.
+        git('clone', origin, other, cwd=self.test_dir)
+        git('commit', '--allow-empty', '-m', 'c2', cwd=other)
+        git('push', 'origin', 'main', cwd=other)
+        new_trunk = git('rev-parse', 'HEAD', cwd=other)
+
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        tmux_log = os.path.join(self.test_dir, 'tmux_bg.log')
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {tmux_log}\n')
+            f.write('if echo "$@" | grep -q "has-session"; then\n  exit 1\nfi\nexit 0\n')
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['USER'] = 'testuser'
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        env.pop('TMUX', None)
+
+        subprocess.run([sys.executable, WTS_SCRIPT, '--background-fetch', 'bg'], cwd=clone, env=env,
+                       check=True, capture_output=True)
+
+        worktree = os.path.join(self.test_dir, 'worktrees', 'clone', 'bg')
+        self.assertTrue(os.path.exists(worktree))
+        upstream = subprocess.run(['git', 'rev-parse', '--abbrev-ref', '@{upstream}'], cwd=worktree,
+                                  capture_output=True, text=True)
+        self.assertNotEqual(upstream.returncode, 0, "the new branch must not track origin/main")
+
+        head = None
+        for _ in range(40):
+            head = git('rev-parse', 'HEAD', cwd=worktree)
+            if head == new_trunk:
+                break
+            time.sleep(0.25)
+        self.assertNotEqual(old_trunk, new_trunk)
+        self.assertEqual(head, new_trunk, "branch should be fast-forwarded once the fetch lands")
+
+        # Wait for the status check that ends the detached sync before tearDown.
+        for _ in range(40):
+            with open(tmux_log) as f:
+                content = f.read()
+            if 'show-options -t =bg -v @wts-status' in content:
+                break
+            time.sleep(0.25)
+        self.assertIn('set-option -t =bg @wts-status clone: fetching trunk', content)
+        self.assertIn('set-option -t =bg @wts-status clone: trunk up to date', content)
+        # The sync is started once the session exists, so its first status lands.
+        self.assertLess(content.index('new-session'), content.index('@wts-status clone: fetching trunk'))
+
+    def test_wts_sync_trunk_failure_status_is_cleared(self):
+        """A failed fetch shows in the status line for a while, then goes away."""
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        tmux_log = os.path.join(self.test_dir, 'tmux_sync.log')
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {tmux_log}\n'
+                    'case "$1" in show-options) echo "temp_wts_test: fetch failed";; esac\n')
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir  # no gitconfig: the 'rst' alias fails
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        subprocess.run([sys.executable, WTS_SCRIPT, '--sync-trunk', self.test_dir, 'foo'], env=env,
+                       check=True, capture_output=True)
+        with open(tmux_log) as f:
+            self.assertEqual(f.read().splitlines(), [
+                'set-option -t =foo @wts-status temp_wts_test: fetching trunk',
+                'set-option -t =foo @wts-status temp_wts_test: fetch failed',
+                'show-options -t =foo -v @wts-status',
+                'set-option -u -t =foo @wts-status',
+            ])
+
+    def test_wts_pool_claims_prewarmed_worktree(self):
+        """With WTS_POOL_SIZE, a new session takes a spare checkout instead of 'worktree add'."""
+        import fcntl
+
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        git_log = os.path.join(self.test_dir, 'git_pool.log')
+        with open(os.path.join(fake_bin, 'git'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {git_log}\nexec {shutil.which("git")} "$@"\n')
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write('#!/bin/sh\nif echo "$@" | grep -q "has-session"; then\n  exit 1\nfi\nexit 0\n')
+        os.chmod(os.path.join(fake_bin, 'git'), 0o755)
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['USER'] = 'testuser'
+        env['WTS_POOL_SIZE'] = '1'
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        env.pop('TMUX', None)
+
+        repo_name = os.path.basename(self.test_dir)
+        pool = os.path.join(self.test_dir, 'worktrees', repo_name, '.pool')
+        subprocess.run([sys.executable, WTS_SCRIPT, '--refill-pool', self.test_dir], env=env, check=True)
+        spares = os.listdir(pool)
+        self.assertEqual(len([n for n in spares if not n.startswith('.')]), 1, spares)
+
+        os.remove(git_log)
+        subprocess.run([sys.executable, WTS_SCRIPT, 'pooled'], cwd=self.test_dir, env=env, check=True,
+                       capture_output=True)
+
+        worktree = os.path.join(self.test_dir, 'worktrees', repo_name, 'pooled')
+        branch = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=worktree,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        self.assertEqual(branch, f'testuser/{repo_name}-pooled')
+        with open(git_log) as f:
+            calls = f.read()
+        self.assertIn('worktree move', calls)
+        self.assertNotIn(f'worktree add {worktree}', calls)
+
+        # The detached refill builds a new spare; wait for it to finish before tearDown.
+        def refilled():
+            names = os.listdir(pool)
+            if len([n for n in names if not n.startswith('.')]) != 1 or any(
+                    n.startswith(('.build-', '.refresh-')) for n in names):
+                return False
+            with open(os.path.join(pool, '.lock')) as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+            return True
+
+        for _ in range(40):
+            if refilled():
+                break
+            time.sleep(0.25)
+        self.assertTrue(refilled(), "pool should be topped up again in the background")
+
+    def test_wts_add_from_pool_branches_from_current_trunk(self):
+        """A spare refilled before trunk moved still gives --add a branch at the new trunk."""
+        import fcntl
+
+        second_repo = os.path.join(self.test_dir, 'second-repo')
+        git = lambda *args: subprocess.run(
+            ['git', '-c', 'user.email=test@example.com', '-c', 'user.name=Test User'] + list(args),
+            cwd=second_repo, check=True, capture_output=True, text=True).stdout.strip()
+        os.makedirs(second_repo)
+        git('init')
+        git('commit', '--allow-empty', '-m', 'c1')
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['WTS_POOL_SIZE'] = '1'
+        subprocess.run([sys.executable, WTS_SCRIPT, '--refill-pool', second_repo], env=env, check=True)
+        git('commit', '--allow-empty', '-m', 'c2')
+        trunk = git('rev-parse', 'HEAD')
+
+        self.run_tmux('new-session', '-d', '-s', self.session_name, '-c', self.test_dir, check=True)
+        self.run_tmux('send-keys', '-t', self.session_name,
+                      f"export HOME='{self.test_dir}' USER=testuser WTS_POOL_SIZE=1; "
+                      f"'{sys.executable}' '{WTS_SCRIPT}' --add '{second_repo}'", 'Enter', check=True)
+        worktree = os.path.join(self.test_dir, 'worktrees', 'second-repo', self.session_name)
+        pool = os.path.join(self.test_dir, 'worktrees', 'second-repo', '.pool')
+
+        def settled():
+            if not os.path.exists(os.path.join(worktree, '.git')) or any(
+                    n.startswith(('.build-', '.refresh-')) for n in os.listdir(pool)):
+                return False
+            with open(os.path.join(pool, '.lock')) as lock:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+            return len([n for n in os.listdir(pool) if not n.startswith('.')]) == 1
+
+        for _ in range(40):
+            if settled():
+                break
+            time.sleep(0.25)
+        self.assertTrue(settled(), "worktree should be claimed and the pool refilled")
+        head = subprocess.run(['git', 'rev-parse', 'HEAD', '--abbrev-ref', 'HEAD'], cwd=worktree,
+                              capture_output=True, text=True, check=True).stdout.split()
+        self.assertEqual(head, [trunk, f'testuser/second-repo-{self.session_name}'])
+
+    def test_wts_create_applies_sparse_profile(self):
+        """A wts.sparse profile checks out only the listed directories."""
+        for path in ('services/api/main.py', 'services/web/app.js', 'libs/util.py', 'README'):
+            os.makedirs(os.path.join(self.test_dir, os.path.dirname(path)), exist_ok=True)
+            with open(os.path.join(self.test_dir, path), 'w') as f:
+                f.write(path)
+        subprocess.run(['git', 'add', 'services', 'libs', 'README'], cwd=self.test_dir, check=True)
+        subprocess.run(['git', 'commit', '-q', '-m', 'Tree'], cwd=self.test_dir, check=True)
+        with open(os.path.join(self.test_dir, '.wts.toml'), 'w') as f:
+            f.write('[sparse]\npaths = ["libs"]\n')
+        subprocess.run(['git', 'config', '--add', 'wts.sparse', 'services/api'], cwd=self.test_dir, check=True)
+
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write('#!/bin/sh\nif echo "$@" | grep -q "has-session"; then\n  exit 1\nfi\nexit 0\n')
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        env.pop('TMUX', None)
+
+        def create(name):
+            subprocess.run([sys.executable, WTS_SCRIPT, name], cwd=self.test_dir, env=env, check=True,
+                           capture_output=True)
+            worktree = Path(self.test_dir, 'worktrees', os.path.basename(self.test_dir), name)
+            return sorted(str(p.relative_to(worktree)) for p in worktree.rglob('*')
+                          if p.is_file() and '.git' not in p.parts)
+
+        # git config wins over .wts.toml; top-level files are always part of a cone.
+        self.assertEqual(create('sparse-config'), ['README', 'services/api/main.py'])
+
+        subprocess.run(['git', 'config', '--unset-all', 'wts.sparse'], cwd=self.test_dir, check=True)
+        self.assertEqual(create('sparse-toml'), ['README', 'libs/util.py'])
+
+        os.remove(os.path.join(self.test_dir, '.wts.toml'))
+        self.assertEqual(create('full'), ['README', 'libs/util.py', 'services/api/main.py',
+                                          'services/web/app.js'])
+
+    def test_wts_list_and_pick_from_index(self):
+        """--list answers from the session index and one list-sessions call; --pick reopens."""
+        import json
+
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        tmux_log = os.path.join(self.test_dir, 'tmux.log')
+        git_log = os.path.join(self.test_dir, 'git.log')
+        live = os.path.join(self.test_dir, 'live.txt')
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {tmux_log}\n')
+            f.write(f'case "$1" in has-session) exit 1;; list-sessions) cat {live};; esac\nexit 0\n')
+        with open(os.path.join(fake_bin, 'git'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {git_log}\nexec {shutil.which("git")} "$@"\n')
+        with open(os.path.join(fake_bin, 'fzf'), 'w') as f:
+            f.write('#!/bin/sh\nhead -n 1\n')
+        for name in ('tmux', 'git', 'fzf'):
+            os.chmod(os.path.join(fake_bin, name), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['USER'] = 'testuser'
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        env.pop('TMUX', None)
+        env.pop('XDG_CACHE_HOME', None)
+
+        def wts(*args):
+            return subprocess.run([sys.executable, WTS_SCRIPT] + list(args), cwd=self.test_dir, env=env,
+                                  check=True, capture_output=True, text=True).stdout
+
+        repo_name = os.path.basename(self.test_dir)
+        worktree = os.path.join(self.test_dir, 'worktrees', repo_name, 'indexed')
+        wts('indexed')
+        with open(os.path.join(self.test_dir, '.cache', 'wts', 'index.json')) as f:
+            entry = json.load(f)['sessions']['indexed']
+        self.assertEqual([(w['repo'], w['path'], w['branch']) for w in entry['worktrees']],
+                         [(self.test_dir, worktree, f'testuser/{repo_name}-indexed')])
+
+        # A session started outside wts shows up; neither listing runs git.
+        with open(live, 'w') as f:
+            f.write(f'indexed\t{int(time.time())}\t{worktree}\nadhoc\t100\t{self.test_dir}\n')
+        os.remove(git_log)
+        lines = wts('--list').splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['indexed', 'adhoc'])
+        self.assertIn(f'{repo_name}:testuser/{repo_name}-indexed', lines[0])
+        self.assertIn(f'{repo_name}:master', lines[1])
+
+        # Once tmux forgets them, the session with a worktree is kept as closed,
+        # and a branch switched behind wts's back is picked up.
+        with open(live, 'w') as f:
+            f.write('')
+        subprocess.run(['git', 'switch', '-q', '-c', 'renamed'], cwd=worktree, check=True)
+        lines = wts('--list').splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertIn(f'(closed) {repo_name}:renamed', lines[0])
+        self.assertFalse(os.path.exists(git_log), "listing should not run git")
+
+        os.remove(tmux_log)
+        wts('--pick')
+        with open(tmux_log) as f:
+            calls = f.read()
+        self.assertIn(f'new-session -d -s indexed -c {worktree}', calls)
+        self.assertIn('attach-session -t indexed', calls)
+
+        # A name with spaces survives the trip through the picker whole.
+        with open(live, 'w') as f:
+            f.write(f'my  work\t{int(time.time()) + 60}\t{self.test_dir}\n')
+        os.remove(tmux_log)
+        wts('--pick')
+        with open(tmux_log) as f:
+            calls = f.read()
+        self.assertIn(f'new-session -d -s my  work -c {self.test_dir}', calls)
+        self.assertIn('attach-session -t my  work', calls)
+
+    def test_wts_gc_removes_orphaned_worktrees(self):
+        """--gc removes clean worktrees no live session uses and keeps the rest."""
+        repo_name = os.path.basename(self.test_dir)
+        base = os.path.join(self.test_dir, 'worktrees', repo_name)
+        for name in ('busy', 'dirty'):
+            subprocess.run(['git', 'worktree', 'add', '-q', os.path.join(base, name), '-b', name],
+                           cwd=self.test_dir, check=True)
+        with open(os.path.join(base, 'dirty', 'notes.txt'), 'w') as f:
+            f.write('work in progress')
+        # Worktrees whose repo went away: an empty one, and one still holding work
+        broken, moved = os.path.join(base, 'broken'), os.path.join(base, 'moved')
+        for path in (broken, moved):
+            os.makedirs(path)
+            with open(os.path.join(path, '.git'), 'w') as f:
+                f.write(f'gitdir: {self.test_dir}/.git/worktrees/gone\n')
+        with open(os.path.join(moved, 'notes.txt'), 'w') as f:
+            f.write('work in progress')
+        # A clone kept next to the worktrees is never gc's to remove
+        clone = os.path.join(base, 'main')
+        subprocess.run(['git', 'clone', '-q', self.test_dir, clone], check=True)
+        # Past the grace period for worktrees that are still being set up
+        for name in ('feature-branch', 'busy', 'dirty', 'broken', 'moved', 'main'):
+            os.utime(os.path.join(base, name, '.git'), (time.time() - 7200,) * 2)
+
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write('#!/bin/sh\ncase "$1" in list-sessions) echo busy;; show-options) exit 1;; esac\nexit 0\n')
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        env.pop('XDG_CACHE_HOME', None)
+
+        out = subprocess.run([sys.executable, WTS_SCRIPT, '--gc', '--dry-run'], cwd=self.test_dir, env=env,
+                             check=True, capture_output=True, text=True).stdout
+        self.assertIn(f'Would remove {self.worktree_path}', out)
+        self.assertIn(f'Would remove {broken}', out)
+        self.assertIn(f"Keeping {os.path.join(base, 'dirty')}: has local changes", out)
+        self.assertIn(f"Keeping {moved}: broken .git link, has files", out)
+        self.assertNotIn(clone, out)
+        self.assertIn('Would reclaim', out)
+        self.assertTrue(os.path.exists(self.worktree_path))
+
+        out = subprocess.run([sys.executable, WTS_SCRIPT, '--gc'], cwd=self.test_dir, env=env,
+                             check=True, capture_output=True, text=True).stdout
+        self.assertIn('Reclaimed', out)
+        self.assertEqual(sorted(os.listdir(base)), ['busy', 'dirty', 'main', 'moved'])
+        self.assertTrue(os.path.isfile(os.path.join(moved, 'notes.txt')))
+        branches = subprocess.run(['git', 'branch', '--format=%(refname:short)'], cwd=self.test_dir,
+                                  capture_output=True, text=True, check=True).stdout.split()
+        self.assertNotIn('feature-branch', branches)
+        self.assertIn('busy', branches)
+        worktrees = subprocess.run(['git', 'worktree', 'list', '--porcelain'], cwd=self.test_dir,
+                                   capture_output=True, text=True, check=True).stdout
+        self.assertNotIn(self.worktree_path, worktrees)
+
+    def test_wts_gc_keeps_worktrees_it_cannot_match(self):
+        """Through a symlinked HOME worktrees still match git's list; a failed list keeps everything."""
+        repo_name = os.path.basename(self.test_dir)
+        base = os.path.join(self.test_dir, 'worktrees', repo_name)
+        os.utime(os.path.join(self.worktree_path, '.git'), (time.time() - 7200,) * 2)
+        home = self.test_dir + '-home'
+        os.symlink(self.test_dir, home)
+        self.addCleanup(os.remove, home)
+
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write('#!/bin/sh\ncase "$1" in show-options) exit 1;; esac\nexit 0\n')
+        with open(os.path.join(fake_bin, 'git'), 'w') as f:
+            f.write(f'#!/bin/sh\n[ -n "$FAIL_LIST" ] && [ "$3 $4" = "worktree list" ] && exit 128\n'
+                    f'exec {shutil.which("git")} "$@"\n')
+        for name in ('tmux', 'git'):
+            os.chmod(os.path.join(fake_bin, name), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = home
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        env.pop('XDG_CACHE_HOME', None)
+
+        out = subprocess.run([sys.executable, WTS_SCRIPT, '--gc', '--dry-run'], cwd=self.test_dir,
+                             env=dict(env, FAIL_LIST='1'), check=True, capture_output=True, text=True).stdout
+        self.assertIn('git worktree list failed', out)
+        self.assertNotIn('Would remove', out)
+
+        out = subprocess.run([sys.executable, WTS_SCRIPT, '--gc', '--dry-run'], cwd=self.test_dir, env=env,
+                             check=True, capture_output=True, text=True).stdout
+        self.assertIn('branch feature-branch', out)
+        self.assertNotIn('not a registered worktree', out)
+        self.assertEqual(os.listdir(base), ['feature-branch'])
+
+    def test_wts_daemon_serves_calls(self):
+        """With a daemon running, calls skip importing lib.wts; exec'ing tmux is left to the client."""
+        fake_bin = os.path.join(self.test_dir, 'bin')
+        os.makedirs(fake_bin)
+        tmux_log = os.path.join(self.test_dir, 'tmux.log')
+        with open(os.path.join(fake_bin, 'tmux'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$$ $@" >> {tmux_log}\ncase "$1" in list-sessions) echo "one\t1\t/";; esac\n')
+        os.chmod(os.path.join(fake_bin, 'tmux'), 0o755)
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['PATH'] = fake_bin + os.pathsep + env['PATH']
+        for name in ('TMUX', 'TMUX_PANE', 'XDG_CACHE_HOME', 'WTS_TRACE', 'WTS_NO_DAEMON'):
+            env.pop(name, None)
+        sock = os.path.join(self.test_dir, '.cache', 'wts', 'daemon.sock')
+
+        daemon = subprocess.Popen([sys.executable, WTS_SCRIPT, '--daemon'], cwd=self.test_dir, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            for _ in range(50):
+                if os.path.exists(sock):
+                    break
+                time.sleep(0.1)
+            self.assertTrue(os.path.exists(sock), "daemon should listen")
+
+            res = subprocess.run([sys.executable, '-X', 'importtime', WTS_SCRIPT, '--list'], cwd=self.test_dir,
+                                 env=env, capture_output=True, text=True)
+            self.assertEqual(res.returncode, 0, res.stderr)
+            self.assertTrue(res.stdout.startswith('one '), res.stdout)
+            self.assertNotIn('lib.wts\n', res.stderr, "the client should not import lib.wts")
+            self.assertIn('lib.wts_client', res.stderr)
+
+            client = subprocess.Popen([sys.executable, WTS_SCRIPT, '-a', 'one'], cwd=self.test_dir, env=env)
+            self.assertEqual(client.wait(timeout=10), 0)
+            with open(tmux_log) as f:
+                calls = [line.split(' ', 1) for line in f.read().splitlines()]
+            # has-session ran in the daemon; the client process itself became tmux attach-session
+            self.assertIn('has-session -t =one', [args for _, args in calls])
+            self.assertEqual([pid for pid, args in calls if args == 'attach-session -t one'], [str(client.pid)])
+            self.assertIsNone(daemon.poll(), "the daemon keeps running")
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=5)
+        self.assertFalse(os.path.exists(sock), "the socket goes with the daemon")
+
+    def test_wts_new_worktree_is_seeded_from_latest_sibling(self):
+        """A new worktree gets the cacheable directories of the sibling that touched them last."""
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from lib.wts import WtsManager
+
+        subprocess.run(['git', 'config', '--add', 'wts.seed', 'node_modules'], cwd=self.test_dir, check=True)
+        subprocess.run(['git', 'config', '--add', 'wts.seed', 'build/cache'], cwd=self.test_dir, check=True)
+        base = os.path.dirname(self.worktree_path)
+        older = os.path.join(base, 'older')
+        subprocess.run(['git', 'worktree', 'add', '-q', older, '-b', 'older'], cwd=self.test_dir, check=True)
+        for checkout, marker in ((older, 'old'), (self.worktree_path, 'new')):
+            os.makedirs(os.path.join(checkout, 'node_modules', 'pkg'))
+            with open(os.path.join(checkout, 'node_modules', 'pkg', 'index.js'), 'w') as f:
+                f.write(marker)
+            os.symlink('pkg', os.path.join(checkout, 'node_modules', 'alias'))
+        # the newer cache's top directory looks older; only what is inside it changed
+        for path in ('node_modules/pkg/index.js', 'node_modules/alias', 'node_modules/pkg', 'node_modules'):
+            os.utime(os.path.join(older, path), (time.time() - 3600,) * 2, follow_symlinks=False)
+        os.utime(os.path.join(self.worktree_path, 'node_modules'), (time.time() - 7200,) * 2)
+
+        fresh = Path(base) / 'fresh'
+        with patch.dict(os.environ, {'HOME': self.test_dir}):
+            WtsManager._create_worktree(self.test_dir, fresh, 'fresh', 'fresh')
+
+        seeded = fresh / 'node_modules' / 'pkg' / 'index.js'
+        self.assertEqual(seeded.read_text(), 'new')
+        self.assertTrue((fresh / 'node_modules' / 'alias').is_symlink())
+        self.assertFalse((fresh / 'build').exists(), "rules no sibling has are skipped")
+        self.assertEqual(subprocess.run(['git', 'status', '--porcelain'], cwd=fresh, capture_output=True,
+                                        text=True, check=True).stdout, '?? node_modules/\n')
+
+    def test_wts_share_and_repack_store(self):
+        """--share makes clones borrow from one store; --repack-store keeps every member whole."""
+        for i in range(20):
+            with open(os.path.join(self.test_dir, f'file{i}'), 'wb') as f:
+                f.write(os.urandom(4096))
+            subprocess.run(['git', 'add', f'file{i}'], cwd=self.test_dir, check=True)
+            subprocess.run(['git', 'commit', '-q', '-m', f'commit {i}'], cwd=self.test_dir, check=True)
+        clones = [os.path.join(self.test_dir, 'clones', name) for name in ('fork', 'mirror')]
+        for clone in clones:
+            subprocess.run(['git', 'clone', '-q', '--no-local', self.test_dir, clone], check=True)
+
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+
+        def wts(*args):
+            return subprocess.run([sys.executable, WTS_SCRIPT] + list(args), cwd=self.test_dir, env=env,
+                                  check=True, capture_output=True, text=True).stdout
+
+        def own_objects(repo):
+            out = subprocess.run(['git', 'count-objects', '-v'], cwd=repo, capture_output=True, text=True,
+                                 check=True).stdout
+            counts = dict(line.split(': ') for line in out.splitlines())
+            return int(counts['count']) + int(counts['in-pack'])
+
+        self.assertGreater(own_objects(clones[0]), 60)
+        wts('--share', self.test_dir, *clones)
+        stores = os.listdir(os.path.join(self.test_dir, 'worktrees', '.objects'))
+        self.assertEqual(len(stores), 1, "clones of one project should share one store")
+        for repo in [self.test_dir] + clones:
+            with open(os.path.join(repo, '.git', 'objects', 'info', 'alternates')) as f:
+                self.assertIn(stores[0], f.read())
+            self.assertEqual(own_objects(repo), 0)
+            subprocess.run(['git', 'fsck', '--no-dangling'], cwd=repo, check=True, capture_output=True)
+        # The worktree set up in setUp shares its repo's object database
+        subprocess.run(['git', 'fsck', '--no-dangling'], cwd=self.worktree_path, check=True, capture_output=True)
+
+        # New work in a member, then a member goes away
+        subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-q',
+                        '--allow-empty', '-m', 'new'], cwd=clones[0], check=True)
+        shutil.rmtree(clones[1])
+        out = wts('--repack-store')
+        self.assertIn(f'Dropping {clones[1]}', out)
+        self.assertIn('2 member(s)', out)
+        for repo in [self.test_dir, clones[0]]:
+            subprocess.run(['git', 'fsck', '--no-dangling'], cwd=repo, check=True, capture_output=True)
+        self.assertEqual(own_objects(clones[0]), 0)
+
+    def test_wts_restore_recreates_worktrees_on_first_switch(self):
+        """--restore only marks sessions; a session's worktrees come back when a client switches to it."""
+        import json
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from lib.wts import SessionIndex
+
+        second_repo = os.path.join(self.test_dir, 'second-repo')
+        subprocess.run(['git', 'init', '-q', '-b', 'main', second_repo], check=True)
+        subprocess.run(['git', '-C', second_repo, '-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+                        'commit', '-q', '--allow-empty', '-m', 'init'], check=True)
+        added = os.path.join(self.test_dir, 'worktrees', 'second-repo', 'restored')
+        subprocess.run(['git', '-C', second_repo, 'worktree', 'add', '-q', '-b', 'testuser/second-repo-restored',
+                        added], check=True)
+        SessionIndex(os.path.join(self.test_dir, '.cache', 'wts', 'index.json')).record(
+            'restored', self.worktree_path, [(self.test_dir, self.worktree_path)])
+
+        # As after a reboot: tmux-resurrect brought the session back, the worktrees are gone
+        shutil.rmtree(os.path.join(self.test_dir, 'worktrees'))
+        self.run_tmux('new-session', '-d', '-s', 'restored', '-c', self.test_dir, check=True)
+        self.run_tmux('set-option', '-t', 'restored', '@wts-added-repos',
+                      json.dumps([{'repo_root': second_repo, 'worktree': added}]), check=True)
+        # The hook's run-shell takes the server's environment
+        for name, value in (('HOME', self.test_dir), ('USER', 'testuser')):
+            self.run_tmux('set-environment', '-g', name, value, check=True)
+        self.run_tmux('set-environment', '-gu', 'XDG_CACHE_HOME', check=True)
+
+        socket = self.run_tmux('display-message', '-p', '#{socket_path}', capture_output=True, text=True,
+                               check=True).stdout.strip()
+        env = os.environ.copy()
+        env['HOME'] = self.test_dir
+        env['USER'] = 'testuser'
+        env['TMUX'] = f'{socket},0,0'
+        env.pop('TMUX_PANE', None)
+        env.pop('XDG_CACHE_HOME', None)
+        out = subprocess.run([sys.executable, WTS_SCRIPT, '--restore'], cwd=self.test_dir, env=env,
+                             check=True, capture_output=True, text=True).stdout
+        self.assertIn('2 worktree(s) in 1 session(s)', out)
+        self.assertFalse(os.path.exists(self.worktree_path))
+        hooks = self.run_tmux('show-hooks', '-g', 'client-session-changed', capture_output=True, text=True).stdout
+        self.assertIn('--restore-session', hooks)
+
+        # A terminal client (nested in a pane of the keepalive session) switches to it
+        self.run_tmux('new-session', '-d', '-s', 'viewer', '-x', '80', '-y', '24',
+                      'env -u TMUX tmux -L wts_test_socket attach-session -t keepalive', check=True)
+        client = None
+        for _ in range(20):
+            res = self.run_tmux('list-clients', '-t', 'keepalive', '-F', '#{client_name}',
+                                capture_output=True, text=True)
+            if res.stdout.strip():
+                client = res.stdout.split()[0]
+                break
+            time.sleep(0.2)
+        self.assertIsNotNone(client, "nested client should attach")
+        self.run_tmux('switch-client', '-c', client, '-t', 'restored', check=True)
+
+        for _ in range(40):
+            if all(os.path.exists(os.path.join(p, '.git')) for p in (self.worktree_path, added)):
+                break
+            time.sleep(0.25)
+        for path, branch in ((self.worktree_path, 'feature-branch'), (added, 'testuser/second-repo-restored')):
+            head = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=path,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+            self.assertEqual(head, branch)
+        for _ in range(20):
+            hooks = self.run_tmux('show-hooks', '-g', 'client-session-changed', capture_output=True,
+                                  text=True).stdout
+            if '--restore-session' not in hooks:
+                break
+            time.sleep(0.25)
+        self.assertNotIn('--restore-session', hooks, "hook should go once nothing is pending")
+        res = self.run_tmux('show-options', '-t', 'restored', '-v', '@wts-restore', capture_output=True, text=True)
+        self.assertEqual(res.stdout.strip(), '')
+
     def test_wts_done(self):
         # Start tmux session running the wts command directly
         # This avoids shell startup scripts (like airchat) interfering
@@ -212,6 +942,102 @@ class TestWtsIntegration(unittest.TestCase):
         self.assertNotEqual(ret.returncode, 0, "Tmux session should have been killed with -d")
         self.assertFalse(os.path.exists(self.worktree_path), "Worktree directory should have been removed with -d")
 
+    def test_wts_done_leaves_main_clone_alone(self):
+        """-d in a clone kept under ~/worktrees closes the session but never moves the repo."""
+        clone = os.path.join(os.path.dirname(self.worktree_path), 'main')
+        subprocess.run(['git', 'clone', '-q', self.test_dir, clone], check=True)
+
+        cmd_str = f"export HOME='{self.test_dir}'; '{sys.executable}' '{WTS_SCRIPT}' -d"
+        self.run_tmux('new-session', '-d', '-s', self.session_name, '-c', clone, cmd_str, check=True)
+        for _ in range(20):
+            ret = self.run_tmux('has-session', '-t', self.session_name, stderr=subprocess.DEVNULL)
+            if ret.returncode != 0:
+                break
+            time.sleep(0.5)
+        self.assertNotEqual(ret.returncode, 0, "Session should have been killed")
+        self.assertTrue(os.path.isdir(os.path.join(clone, '.git')))
+
+        # Nor when it reaches removal some other way, e.g. a bad @wts-added-repos entry
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from lib.wts import WtsManager
+        with patch.dict(os.environ, {'HOME': self.test_dir}):
+            self.assertFalse(WtsManager._remove_worktrees([(clone, clone)]))
+        self.assertTrue(os.path.isdir(os.path.join(clone, '.git')))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'worktrees', '.trash')))
+
+    def test_wts_failed_move_to_trash_leaves_no_slot(self):
+        """A worktree that cannot be renamed into the trash leaves nothing behind there."""
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from lib.wts import WtsManager
+
+        with patch.dict(os.environ, {'HOME': self.test_dir}):
+            trash = WtsManager._trash_dir()
+            self.assertFalse(WtsManager._move_to_trash(os.path.join(self.test_dir, 'gone')))
+            self.assertEqual(os.listdir(trash), [])
+            self.assertTrue(WtsManager._move_to_trash(self.worktree_path))
+            self.assertEqual(len(os.listdir(trash)), 1)
+
+    def test_wts_done_trashes_worktree_and_purges_in_background(self):
+        """--done detaches the worktree at once and deletes its files afterwards."""
+        # Something slow to delete, to show the session does not wait for it
+        bulk = os.path.join(self.worktree_path, 'node_modules')
+        for i in range(200):
+            os.makedirs(os.path.join(bulk, f'pkg{i}'))
+            with open(os.path.join(bulk, f'pkg{i}', 'index.js'), 'w') as f:
+                f.write('x' * 1024)
+
+        cmd_str = f"export HOME='{self.test_dir}'; '{sys.executable}' '{WTS_SCRIPT}' --done"
+        self.run_tmux('new-session', '-d', '-s', self.session_name, '-c', self.worktree_path, cmd_str, check=True)
+
+        for _ in range(20):
+            ret = self.run_tmux('has-session', '-t', self.session_name, stderr=subprocess.DEVNULL)
+            if ret.returncode != 0:
+                break
+            time.sleep(0.5)
+        self.assertNotEqual(ret.returncode, 0, "Session should have been killed")
+        self.assertFalse(os.path.exists(self.worktree_path))
+
+        # Pruned before the session closed: the branch is free for a new worktree right away
+        listing = subprocess.run(['git', 'worktree', 'list', '--porcelain'], cwd=self.test_dir,
+                                 capture_output=True, text=True, check=True).stdout
+        self.assertNotIn(self.worktree_path, listing)
+        again = os.path.join(self.test_dir, 'again')
+        subprocess.run(['git', 'worktree', 'add', again, 'feature-branch'], cwd=self.test_dir,
+                       check=True, capture_output=True)
+
+        trash = os.path.join(self.test_dir, 'worktrees', '.trash')
+        for _ in range(20):
+            if not os.path.exists(trash):
+                break
+            time.sleep(0.25)
+        self.assertFalse(os.path.exists(trash), "background purge should empty and remove the trash")
+
+    def test_wts_done_uses_one_tmux_process(self):
+        """--done runs every tmux command over a single control-mode client."""
+        wrapper_dir = os.path.join(self.test_dir, 'bin')
+        os.makedirs(wrapper_dir)
+        tmux_log = os.path.join(self.test_dir, 'tmux_done.log')
+        with open(os.path.join(wrapper_dir, 'tmux'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {tmux_log}\nexec {shutil.which("tmux")} "$@"\n')
+        os.chmod(os.path.join(wrapper_dir, 'tmux'), 0o755)
+
+        cmd_str = (f"export HOME='{self.test_dir}'; export PATH='{wrapper_dir}':$PATH; "
+                   f"'{sys.executable}' '{WTS_SCRIPT}' --done")
+        self.run_tmux('new-session', '-d', '-s', self.session_name, '-c', self.worktree_path, cmd_str, check=True)
+
+        for _ in range(20):
+            ret = self.run_tmux('has-session', '-t', self.session_name, stderr=subprocess.DEVNULL)
+            if ret.returncode != 0:
+                break
+            time.sleep(0.5)
+        self.assertNotEqual(ret.returncode, 0, "Session should have been killed")
+        self.assertFalse(os.path.exists(self.worktree_path), "Worktree directory should have been removed")
+
+        with open(tmux_log) as f:
+            calls = f.read().splitlines()
+        self.assertEqual(len(calls), 1, f"expected one tmux process, got: {calls}")
+        self.assertIn('-C', calls[0])
+
     def test_wts_add(self):
         """Tests that wts --add creates a worktree for a second repo with the correct branch prefix."""
         import json
@@ -239,10 +1065,10 @@ class TestWtsIntegration(unittest.TestCase):
         )
         self.run_tmux('send-keys', '-t', self.session_name, cmd_str, 'Enter', check=True)
 
-        # Poll for the worktree to appear
+        # Poll for the worktree to appear (its .git file is written after the directory)
         max_retries = 20
         for _ in range(max_retries):
-            if os.path.exists(expected_worktree):
+            if os.path.exists(os.path.join(expected_worktree, '.git')):
                 break
             time.sleep(0.5)
 
@@ -271,6 +1097,62 @@ class TestWtsIntegration(unittest.TestCase):
             "State should record the added worktree path",
         )
 
+    def test_wts_add_many_repos(self):
+        """wts --add takes several repos and records them all in one option write."""
+        import json
+
+        repos = []
+        for name in ('repo-a', 'repo-b', 'repo-c'):
+            path = os.path.join(self.test_dir, name)
+            os.makedirs(path)
+            subprocess.run(['git', 'init'], cwd=path, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            subprocess.run(['git', '-c', 'user.email=t@example.com', '-c', 'user.name=T', 'commit',
+                            '--allow-empty', '-m', 'Initial commit'], cwd=path, check=True, stdout=subprocess.DEVNULL)
+            repos.append(path)
+
+        wrapper_dir = os.path.join(self.test_dir, 'bin')
+        os.makedirs(wrapper_dir)
+        tmux_log = os.path.join(self.test_dir, 'tmux_add_many.log')
+        with open(os.path.join(wrapper_dir, 'tmux'), 'w') as f:
+            f.write(f'#!/bin/sh\necho "$@" >> {tmux_log}\nexec {shutil.which("tmux")} "$@"\n')
+        os.chmod(os.path.join(wrapper_dir, 'tmux'), 0o755)
+
+        # Pre-existing entry: must survive the update
+        self.run_tmux('new-session', '-d', '-s', self.session_name, '-c', self.test_dir, check=True)
+        existing = {"repo_root": "/elsewhere", "worktree": "/elsewhere/wt"}
+        self.run_tmux('set-option', '-t', self.session_name, '@wts-added-repos', json.dumps([existing]), check=True)
+
+        done_marker = os.path.join(self.test_dir, 'add_many.done')
+        quoted = ' '.join(f"'{r}'" for r in repos + [repos[0]])
+        cmd_str = (
+            f"export HOME='{self.test_dir}'; export USER=testuser; export PATH='{wrapper_dir}':$PATH; "
+            f"'{sys.executable}' '{WTS_SCRIPT}' --add {quoted}; touch '{done_marker}'"
+        )
+        self.run_tmux('send-keys', '-t', self.session_name, cmd_str, 'Enter', check=True)
+
+        for _ in range(40):
+            if os.path.exists(done_marker):
+                break
+            time.sleep(0.25)
+        self.assertTrue(os.path.exists(done_marker), "wts --add should finish")
+
+        for name in ('repo-a', 'repo-b', 'repo-c'):
+            worktree = os.path.join(self.test_dir, 'worktrees', name, self.session_name)
+            branch = subprocess.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=worktree,
+                                    capture_output=True, text=True, check=True).stdout.strip()
+            self.assertEqual(branch, f'testuser/{name}-{self.session_name}')
+
+        res = self.run_tmux('show-options', '-t', self.session_name, '-v', '@wts-added-repos',
+                            capture_output=True, text=True)
+        entries = json.loads(res.stdout.strip())
+        self.assertEqual(entries[0], existing)
+        self.assertEqual(sorted(os.path.basename(os.path.dirname(e['worktree'])) for e in entries[1:]),
+                         ['repo-a', 'repo-b', 'repo-c'])
+
+        with open(tmux_log) as f:
+            calls = f.read().splitlines()
+        self.assertEqual(len(calls), 1, f"expected one tmux process, got: {calls}")
+
     def test_wts_done_removes_added_repos(self):
         """Tests that wts --done also removes worktrees recorded in @wts-added-repos."""
         import json
@@ -493,8 +1375,39 @@ class TestWtsIntegration(unittest.TestCase):
         branch_name2 = "save-feature-2"
         subprocess.run(['git', 'branch', branch_name2], cwd=self.test_dir, check=True)
         subprocess.run([sys.executable, WTS_SCRIPT, branch_name2], cwd=self.test_dir, env=env, check=True)
+        # The save runs in a detached saver after a short quiet period
+        for _ in range(20):
+            if os.path.exists(sentinel):
+                break
+            time.sleep(0.25)
         self.assertTrue(os.path.exists(sentinel), "resurrect save script should be invoked on create")
 
+    def test_wts_resurrect_saves_are_coalesced(self):
+        """A burst of save requests produces one save.sh run, after the burst."""
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from lib.wts import TmuxClient, WtsManager
+
+        save_script = self._write_fake_resurrect()
+        saves = os.path.join(self.test_dir, 'saves.log')
+        with open(save_script, 'w') as f:
+            f.write(f'#!/bin/sh\necho saved >> "{saves}"\n')
+        with patch.dict(os.environ, {'HOME': self.test_dir, 'XDG_CACHE_HOME': ''}), TmuxClient() as tmux:
+            script = WtsManager._resurrect_save_script(tmux)
+            self.assertEqual(str(script), save_script)
+            for _ in range(5):
+                WtsManager._save_resurrect_state(script)
+                time.sleep(0.1)
+
+        for _ in range(20):
+            if os.path.exists(saves):
+                break
+            time.sleep(0.25)
+        time.sleep(WtsManager._RESURRECT_QUIET + 0.5)
+        with open(saves) as f:
+            self.assertEqual(f.read().splitlines(), ['saved'])
+        with open(os.path.join(self.test_dir, '.cache', 'wts', 'resurrect-save-script')) as f:
+            self.assertEqual(f.read().strip(), save_script)
+
     def test_wts_create_no_resurrect_is_graceful(self):
         """When resurrect is not installed, creating a session still succeeds and skips the save."""
         branch_name = "nosave-feature"
@@ -611,6 +1524,85 @@ class TestWtsIntegration(unittest.TestCase):
             "resurrect save must not be triggered when the session already existed",
         )
 
+class TestGitRepo(unittest.TestCase):
+    """GitRepo answers ref questions from the git dir without running git."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp(prefix='wts_gitrepo_')
+        self.repo = os.path.join(self.test_dir, 'repo')
+        subprocess.run(['git', 'init', '-q', '-b', 'main', self.repo], check=True)
+        self.git('config', 'user.email', 'test@example.com')
+        self.git('config', 'user.name', 'Test User')
+        self.git('commit', '-q', '--allow-empty', '-m', 'Initial commit')
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from lib.wts import GitRepo
+        self.GitRepo = GitRepo
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def git(self, *args, cwd=None):
+        subprocess.run(['git'] + list(args), cwd=cwd or self.repo, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def discover(self, path):
+        with patch('subprocess.run', side_effect=AssertionError('git was run')), \
+                patch('subprocess.Popen', side_effect=AssertionError('git was run')):
+            return self.GitRepo.discover(path)
+
+    def test_outside_repo(self):
+        self.assertIsNone(self.discover(self.test_dir))
+
+    def test_main_worktree_from_subdirectory(self):
+        sub = os.path.join(self.repo, 'a', 'b')
+        os.makedirs(sub)
+        repo = self.discover(sub)
+        self.assertEqual(str(repo.repo_root), self.repo)
+        self.assertEqual(str(repo.worktree), self.repo)
+        self.assertEqual(repo.head_branch(), 'main')
+
+    def test_loose_and_packed_refs(self):
+        self.git('branch', 'loose')
+        self.git('branch', 'packed')
+        self.git('pack-refs', '--all')
+        self.git('branch', 'loose-after-pack')
+        repo = self.discover(self.repo)
+        self.assertTrue(repo.branch_exists('packed'))
+        self.assertFalse(os.path.exists(os.path.join(self.repo, '.git', 'refs', 'heads', 'packed')))
+        self.assertTrue(repo.branch_exists('loose-after-pack'))
+        self.assertFalse(repo.branch_exists('missing'))
+        self.git('branch', 'user/nested')
+        self.assertFalse(repo.branch_exists('user'))
+        self.assertTrue(repo.branch_exists('user/nested'))
+
+    def test_linked_worktree_uses_commondir(self):
+        wt = os.path.join(self.test_dir, 'wt')
+        self.git('worktree', 'add', '-q', wt, '-b', 'linked')
+        repo = self.discover(wt)
+        self.assertEqual(str(repo.repo_root), self.repo)
+        self.assertEqual(str(repo.worktree), wt)
+        self.assertEqual(repo.head_branch(), 'linked')
+        self.assertTrue(repo.branch_exists('main'))
+
+    def test_detached_head(self):
+        self.git('checkout', '-q', '--detach')
+        self.assertEqual(self.discover(self.repo).head_branch(), 'HEAD')
+
+    def test_inside_git_dir_is_not_a_worktree(self):
+        repo = self.discover(os.path.join(self.repo, '.git', 'refs'))
+        self.assertIsNone(repo.worktree)
+        self.assertEqual(str(repo.repo_root), self.repo)
+
+    def test_config_values_match_git(self):
+        self.git('config', '--add', 'wts.sparse', 'services/api')
+        self.git('config', '--add', 'wts.sparse', 'libs common')
+        self.git('config', 'other.sparse', 'ignored')
+        repo = self.discover(self.repo)
+        self.assertEqual(repo.config_values('wts.sparse'), ['services/api', 'libs common'])
+        self.assertEqual(repo.config_values('WTS.Sparse'), ['services/api', 'libs common'])
+        self.assertEqual(repo.config_values('wts.missing'), [])
+
+
 if __name__ == '__main__':
     # Verify dependencies
     if shutil.which('tmux') is None: